@@ -4,6 +4,12 @@ WhatShouldICite - 科研写作引用建议 Agent
 
 __version__ = "0.1.0"
 
-from .agent import CitationAgent
-
 __all__ = ["CitationAgent"]
+
+
+def __getattr__(name):
+    # 延迟导入：常驻服务客户端等轻量入口只 import 包本身，不加载分析器
+    if name == "CitationAgent":
+        from .agent import CitationAgent
+        return CitationAgent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,271 @@
 """
-Agent 命令行测试入口
-实际使用时，编辑器会调用 whatshouldicite.CitationAgent
+Agent 入口 - 处理编辑器传入的选中文本，返回引用建议
 """
 
-from whatshouldicite import CitationAgent
+from typing import Optional, Dict, Any, Iterable, List
+from .analyzer import TextAnalyzer
+from .intent import CitationIntentClassifier
+from .planner import CitationTypePlanner
+from .keywords import KeywordGenerator
+from .utils import format_output
+from . import tracing
+
+
+class CitationAgent:
+    """
+    引用建议 Agent
+
+    核心职责：
+    - 接收编辑器传入的 selection text
+    - 调用核心分析逻辑
+    - 返回适合浮窗显示的结果
+    """
+
+    def __init__(
+        self,
+        llm_client: Optional[Any] = None,
+        max_concurrency: int = 4,
+        single_call: bool = False,
+        batch_size: int = 1
+    ):
+        """
+        Args:
+            llm_client: LLM 客户端（可选，如果为 None 则使用规则判断）
+            max_concurrency: analyze_many 在 LLM 模式下的最大并发数
+            single_call: LLM 模式下用一次结构化（JSON）调用代替
+                分类 → 规划 → 关键词三次串行调用
+            batch_size: 单次调用模式下，analyze_many 每个请求打包的句子数
+                （1 表示逐句请求）
+        """
+        if llm_client is not None:
+            # 规则模式不导入 LLM 相关模块
+            from .llm_client import as_unified_client
+            llm_client = as_unified_client(llm_client)
+
+        # 各模块共享同一个 UnifiedLLMClient（连接池与结果缓存）
+        self.llm_client = llm_client
+        self.max_concurrency = max_concurrency
+        self.single_call = single_call
+        self.batch_size = batch_size
+        self.analyzer = TextAnalyzer()
+        self.intent_classifier = CitationIntentClassifier(self.llm_client)
+        self.planner = CitationTypePlanner(self.llm_client)
+        self.keyword_generator = KeywordGenerator(self.llm_client)
+
+    def analyze(self, selected_text: str) -> str:
+        """
+        分析选中文本，返回格式化建议
+
+        Args:
+            selected_text: 用户选中的文本（1-5 句话）
+
+        Returns:
+            格式化后的引用建议字符串，适合在浮窗中显示
+        """
+        if not selected_text or not selected_text.strip():
+            return self._empty_result()
+
+        with tracing.span("agent.analyze", mode="llm" if self.llm_client else "rule",
+                          single_call=self.single_call):
+            result = self.analyze_structured(selected_text)
+            with tracing.span("agent.format"):
+                return format_output(
+                    needs_citation=result["needs_citation"],
+                    reason=result["reason"],
+                    citation_types=result["citation_types"],
+                    keywords=result["keywords"]
+                )
+
+    def analyze_structured(self, selected_text: str) -> Dict[str, Any]:
+        """
+        分析选中文本，返回结构化结果
+
+        Args:
+            selected_text: 用户选中的文本
+
+        Returns:
+            包含 text / needs_citation / intent / confidence / reason /
+            citation_types / keywords 的字典
+        """
+        if not selected_text or not selected_text.strip():
+            return {
+                "text": "",
+                "needs_citation": "No",
+                "intent": "unknown",
+                "confidence": 1.0,
+                "reason": "未选中文本",
+                "citation_types": [],
+                "keywords": []
+            }
+
+        # 每段文本只构建一次上下文，各阶段共享
+        with tracing.span("analyzer.build_context"):
+            context = self.analyzer.build_context(selected_text)
+
+        if self.llm_client and self.single_call:
+            return self._analyze_single_call(context)
+
+        # 1. 判断引用意图
+        with tracing.span("intent.classify") as span:
+            intent_result = self.intent_classifier.classify(context)
+            span.set("intent", intent_result.get("intent"))
+        needs_citation = intent_result.get("needs_citation", "Optional")
+        intent = intent_result.get("intent", "unknown")
+        reason = self._generate_reason(intent, needs_citation)
+
+        # 2. 规划引用类型 & 3. 生成检索关键词
+        if needs_citation != "No":
+            with tracing.span("planner.plan"):
+                citation_types = self.planner.plan(context, intent_result)
+            with tracing.span("keywords.generate"):
+                keywords = self.keyword_generator.generate(context, citation_types)
+        else:
+            citation_types = []
+            keywords = []
+
+        return {
+            "text": context.text,
+            "needs_citation": needs_citation,
+            "intent": intent,
+            "confidence": intent_result.get("confidence", 0.5),
+            "reason": reason,
+            "citation_types": citation_types,
+            "keywords": keywords
+        }
+
+    def _analyze_single_call(self, context) -> Dict[str, Any]:
+        """LLM 单次结构化调用"""
+        with tracing.span("llm.analyze_structured"):
+            result = self.llm_client.analyze_structured(context.text)
+        result["text"] = context.text
+        return result
+
+    def analyze_many(
+        self,
+        texts: Iterable[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        批量分析多段文本
+
+        规则模式下顺序执行，复用同一套已编译的匹配器；LLM 模式下在线程池中
+        并发调用，并发数受 max_concurrency 限制。结果顺序与输入一致，
+        单条失败不会影响其他条目（失败条目带 "error" 字段）。
+
+        Args:
+            texts: 待分析的文本列表
+            max_concurrency: 覆盖构造时设置的并发上限（可选）
+
+        Returns:
+            结构化结果列表，与 texts 一一对应
+        """
+        texts = list(texts)
+
+        if not self.llm_client:
+            return [self.analyze_isolated(text) for text in texts]
+
+        if self.single_call and self.batch_size > 1:
+            return self._analyze_batched(texts, max_concurrency)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = max(1, min(max_concurrency or self.max_concurrency, len(texts) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.analyze_isolated, texts))
+
+    def _analyze_batched(
+        self,
+        texts: List[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """每 batch_size 句打包成一次 LLM 请求，各批次并发发送"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        pending = []
+        for index, text in enumerate(texts):
+            if text and text.strip():
+                pending.append((index, self.analyzer.build_context(text).text))
+            else:
+                results[index] = self.analyze_structured(text)
+
+        chunks = [pending[i:i + self.batch_size]
+                  for i in range(0, len(pending), self.batch_size)]
+
+        def run(chunk):
+            chunk_texts = [text for _, text in chunk]
+            try:
+                chunk_results = self.llm_client.analyze_batch(
+                    chunk_texts, max_batch=self.batch_size
+                )
+            except Exception as e:
+                chunk_results = [self._failure_result(text, e) for text in chunk_texts]
+            for (index, text), result in zip(chunk, chunk_results):
+                result["text"] = text
+                results[index] = result
+
+        if chunks:
+            from concurrent.futures import ThreadPoolExecutor
+
+            workers = max(1, min(max_concurrency or self.max_concurrency, len(chunks)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(run, chunks))
+        return results
+
+    def analyze_isolated(self, text: str) -> Dict[str, Any]:
+        """
+        分析单条文本，把异常转为结果中的 error 字段（不抛出）
+
+        供逐句扫描等需要单条失败不中断整体流程的调用方使用。
+
+        Args:
+            text: 待分析的文本
+
+        Returns:
+            与 analyze_structured 相同的结构化结果；失败时带 "error" 字段
+        """
+        try:
+            return self.analyze_structured(text)
+        except Exception as e:
+            return self._failure_result(text, e)
+
+    def _failure_result(self, text: str, error: Exception) -> Dict[str, Any]:
+        """分析失败时的结果"""
+        return {
+            "text": text,
+            "needs_citation": "Optional",
+            "intent": "unknown",
+            "confidence": 0.0,
+            "reason": f"分析失败: {error}",
+            "citation_types": [],
+            "keywords": [],
+            "error": str(error)
+        }
+
+    def _generate_reason(self, intent: str, needs_citation: str) -> str:
+        """生成原因说明"""
+        reason_map = {
+            "common_knowledge": "这是常识性陈述，通常不需要引用",
+            "method_technique": "提到了具体方法或技术，需要引用相关研究",
+            "comparison": "进行了比较或评估，需要引用被比较的工作",
+            "factual_claim": "这是事实性陈述，需要引用支持性研究",
+            "survey_review": "提到了综述性工作，建议引用相关综述",
+            "foundational_work": "提到了基础性工作，建议引用原始文献",
+            "recent_advance": "提到了最新进展，需要引用相关研究",
+            "unknown": "建议检查是否需要引用相关研究"
+        }
+
+        return reason_map.get(intent, {
+            "No": "不需要引用",
+            "Optional": "可能需要引用，取决于上下文"
+        }.get(needs_citation, "需要引用相关研究"))
+
+    def _empty_result(self) -> str:
+        """返回空结果"""
+        return format_output(
+            needs_citation="No",
+            reason="未选中文本",
+            citation_types=[],
+            keywords=[]
+        )
 
 
 def main():
@@ -12,7 +274,7 @@ def main():
     实际使用时，编辑器会调用 agent.analyze(selected_text)
     """
     agent = CitationAgent()
-    
+
     # 测试用例
     test_cases = [
         "Deep learning has revolutionized computer vision in recent years.",
@@ -20,11 +282,11 @@ def main():
         "Our method outperforms previous approaches by 5% on the benchmark dataset.",
         "The transformer architecture was introduced in 2017.",
     ]
-    
+
     print("=" * 60)
     print("WhatShouldICite Agent - 测试")
     print("=" * 60)
-    
+
     for i, text in enumerate(test_cases, 1):
         print(f"\n【测试用例 {i}】")
         print(f"选中文本: {text}")
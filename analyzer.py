@@ -2,123 +2,253 @@
 Text Analyzer - 分析选中文本的基本特征
 """
 
-from typing import Dict, Any
+import re
+import threading
+from typing import Dict, Any, List, Tuple, Optional, FrozenSet, Union
 from .utils import clean_text
 
 
+# 学术关键词库（扩展）：类别 -> 关键词
+KEYWORD_VOCABULARIES: Dict[str, Tuple[str, ...]] = {
+    # 方法/技术关键词
+    "method": (
+        'method', 'approach', 'algorithm', 'technique', 'framework',
+        'model', 'architecture', 'system', 'mechanism', 'strategy',
+        'procedure', 'protocol', 'scheme', 'design', 'implementation',
+        'deep learning', 'neural network', 'transformer', 'cnn', 'rnn',
+        'optimization', 'gradient', 'backpropagation', 'training',
+        'inference', 'prediction', 'classification', 'regression'
+    ),
+    # 比较/评估关键词
+    "comparison": (
+        'compared', 'comparison', 'compare', 'versus', 'vs', 'v.s.',
+        'better', 'worse', 'superior', 'inferior', 'outperforms',
+        'outperformed', 'exceeds', 'surpasses', 'beats', 'than',
+        'benchmark', 'evaluation', 'evaluate', 'performance',
+        'accuracy', 'precision', 'recall', 'f1', 'f-score',
+        'improvement', 'improved', 'enhancement', 'enhanced'
+    ),
+    # 事实性陈述关键词
+    "factual": (
+        'shows', 'show', 'demonstrates', 'demonstrate', 'proves', 'prove',
+        'indicates', 'indicate', 'suggests', 'suggest', 'reveals', 'reveal',
+        'finds', 'find', 'found', 'discovered', 'discover',
+        'observed', 'observe', 'exhibits', 'exhibit', 'presents', 'present',
+        'confirms', 'confirm', 'validates', 'validate', 'verifies', 'verify',
+        'establishes', 'establish', 'evidence', 'empirical', 'experiment',
+        'study', 'studies', 'research', 'paper', 'work', 'works'
+    ),
+    # 统计/数据关键词
+    "statistical": (
+        'statistical', 'statistics', 'significant', 'significance',
+        'p-value', 'p value', 'correlation', 'regression', 'analysis',
+        'dataset', 'data', 'sample', 'population', 'mean', 'median',
+        'variance', 'standard deviation', 'confidence interval'
+    ),
+    # 理论/概念关键词
+    "theoretical": (
+        'theory', 'theoretical', 'theorem', 'proof', 'prove',
+        'concept', 'conceptual', 'principle', 'framework', 'paradigm',
+        'hypothesis', 'hypotheses', 'assumption', 'assumptions',
+        'definition', 'formal', 'mathematical', 'mathematically'
+    ),
+    # 综述/相关工作关键词
+    "survey": (
+        'survey', 'review', 'overview', 'state-of-the-art', 'sota',
+        'related work', 'related works', 'literature', 'previous',
+        'prior', 'existing', 'recent', 'recently', 'latest'
+    ),
+    # 基础性工作关键词
+    "foundational": (
+        'foundational', 'foundation', 'pioneering', 'seminal',
+        'original', 'first', 'introduced', 'proposed', 'propose',
+        'established', 'establish', 'classic', 'landmark'
+    ),
+    # 时间相关关键词（最新进展）
+    "temporal": (
+        'recent', 'recently', 'latest', 'new', 'novel', 'newly',
+        'current', 'contemporary', 'modern', 'state-of-the-art',
+        '2020', '2021', '2022', '2023', '2024', '2025'
+    ),
+}
+
+
+def _trie_regex(phrases) -> str:
+    """
+    把关键词集合编译为按前缀因式分解的正则（如 recent(?:ly)?）
+
+    Python 的 re 不会优化大规模交替分支；按字典树展开后每个位置只需按首字符
+    分派，且贪婪匹配天然优先最长关键词
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [re.escape(ch) + build(child)
+                    for ch, child in sorted(node.items()) if ch != ""]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """
+    多模式关键词匹配器
+
+    将所有词表编译为一个带词首边界的交替正则，一次扫描即可得到
+    全部类别标记和匹配位置。关键词按词首匹配，因此 "models"、
+    "networks" 这类屈折形式仍能命中，而 "network" 不会再误命中 "work"。
+    """
+
+    def __init__(self, vocabularies: Dict[str, Tuple[str, ...]]):
+        """
+        Args:
+            vocabularies: 类别 -> 关键词列表
+        """
+        self.categories = tuple(vocabularies)
+
+        phrase_categories: Dict[str, set] = {}
+        for category, phrases in vocabularies.items():
+            for phrase in phrases:
+                phrase_categories.setdefault(phrase.lower(), set()).add(category)
+
+        # 交替正则只报告最长的非重叠匹配；把嵌套在长短语内部（词首对齐）
+        # 的短关键词的类别并入长短语，例如 "related work" 同时带上 "work" 的类别
+        phrases = sorted(phrase_categories, key=len, reverse=True)
+        expanded: Dict[str, FrozenSet[str]] = {}
+        for phrase in phrases:
+            categories = set(phrase_categories[phrase])
+            for other in phrases:
+                if other != phrase and len(other) < len(phrase) and \
+                        re.search(r"(?<!\w)" + re.escape(other), phrase):
+                    categories |= phrase_categories[other]
+            expanded[phrase] = frozenset(categories)
+        self._phrase_categories = expanded
+
+        self._pattern = re.compile(r"(?<!\w)" + _trie_regex(phrases))
+
+    def scan(self, text_lower: str) -> Tuple[FrozenSet[str], List[Tuple[int, int, str]]]:
+        """
+        单次扫描文本
+
+        Args:
+            text_lower: 已转为小写的文本
+
+        Returns:
+            (命中的类别集合, [(起始偏移, 结束偏移, 关键词), ...])
+        """
+        matches = [(m.start(), m.end(), m.group())
+                   for m in self._pattern.finditer(text_lower)]
+        phrase_categories = self._phrase_categories
+        found = frozenset().union(
+            *(phrase_categories[phrase] for phrase in {m[2] for m in matches})
+        )
+        return found, matches
+
+
+_default_matcher: Optional[KeywordMatcher] = None
+_matcher_lock = threading.Lock()
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+    """获取默认关键词匹配器（首次使用时编译，之后复用）"""
+    global _default_matcher
+    if _default_matcher is None:
+        with _matcher_lock:
+            if _default_matcher is None:
+                _default_matcher = KeywordMatcher(KEYWORD_VOCABULARIES)
+    return _default_matcher
+
+
+class AnalysisContext:
+    """
+    单段文本的分析上下文
+
+    每段文本只构建一次，依次传给 classify → plan → keywords，
+    避免各阶段重复清理、转小写和分词。规则特征（features）在首次访问时
+    才计算，LLM 路径不会为其付出开销。
+    """
+
+    def __init__(self, text: str, analyzer: Optional["TextAnalyzer"] = None):
+        """
+        Args:
+            text: 原始选中文本
+            analyzer: 用于计算规则特征的分析器（可选）
+        """
+        self.text = clean_text(text)
+        self.text_lower = self.text.lower()
+        self.tokens = self.text_lower.split()
+        self._analyzer = analyzer
+        self._features: Optional[Dict[str, Any]] = None
+
+    @property
+    def features(self) -> Dict[str, Any]:
+        """规则特征字典（与 TextAnalyzer.analyze 的返回值相同）"""
+        if self._features is None:
+            analyzer = self._analyzer or TextAnalyzer()
+            self._features = analyzer.extract_features(self)
+        return self._features
+
+
 class TextAnalyzer:
     """文本分析器 - 提取文本特征"""
-    
+
     def __init__(self):
-        pass
-    
-    def analyze(self, text: str) -> Dict[str, Any]:
+        self.matcher = get_keyword_matcher()
+
+    def build_context(self, text: Union[str, AnalysisContext]) -> AnalysisContext:
+        """
+        构建分析上下文；如果传入的已经是上下文则原样返回
+
+        Args:
+            text: 选中的文本或已构建的上下文
+        """
+        if isinstance(text, AnalysisContext):
+            return text
+        return AnalysisContext(text, self)
+
+    def analyze(self, text: Union[str, AnalysisContext]) -> Dict[str, Any]:
         """
         分析文本特征
-        
+
         Args:
-            text: 选中的文本
-        
+            text: 选中的文本（或已构建的上下文）
+
         Returns:
-            包含文本特征的字典
+            包含文本特征的字典，keyword_matches 为 (起始, 结束, 关键词) 列表，
+            偏移相对于小写后的文本
         """
-        cleaned = clean_text(text)
-        
+        return self.build_context(text).features
+
+    def extract_features(self, context: AnalysisContext) -> Dict[str, Any]:
+        """从上下文计算规则特征"""
+        cleaned = context.text
+
         # 基本统计
-        word_count = len(cleaned.split())
+        word_count = len(context.tokens)
         sentence_count = cleaned.count('.') + cleaned.count('!') + cleaned.count('?')
-        
-        # 检测关键词模式（扩展的学术关键词库）
-        text_lower = cleaned.lower()
-        
-        # 方法/技术关键词（扩展）
-        method_keywords = [
-            'method', 'approach', 'algorithm', 'technique', 'framework',
-            'model', 'architecture', 'system', 'mechanism', 'strategy',
-            'procedure', 'protocol', 'scheme', 'design', 'implementation',
-            'deep learning', 'neural network', 'transformer', 'cnn', 'rnn',
-            'optimization', 'gradient', 'backpropagation', 'training',
-            'inference', 'prediction', 'classification', 'regression'
-        ]
-        has_method_keywords = any(kw in text_lower for kw in method_keywords)
-        
-        # 比较/评估关键词（扩展）
-        comparison_keywords = [
-            'compared', 'comparison', 'compare', 'versus', 'vs', 'v.s.',
-            'better', 'worse', 'superior', 'inferior', 'outperforms',
-            'outperformed', 'exceeds', 'surpasses', 'beats', 'than',
-            'benchmark', 'evaluation', 'evaluate', 'performance',
-            'accuracy', 'precision', 'recall', 'f1', 'f-score',
-            'improvement', 'improved', 'enhancement', 'enhanced'
-        ]
-        has_comparison_keywords = any(kw in text_lower for kw in comparison_keywords)
-        
-        # 事实性陈述关键词（扩展）
-        factual_keywords = [
-            'shows', 'show', 'demonstrates', 'demonstrate', 'proves', 'prove',
-            'indicates', 'indicate', 'suggests', 'suggest', 'reveals', 'reveal',
-            'finds', 'find', 'found', 'discovered', 'discover',
-            'observed', 'observe', 'exhibits', 'exhibit', 'presents', 'present',
-            'confirms', 'confirm', 'validates', 'validate', 'verifies', 'verify',
-            'establishes', 'establish', 'evidence', 'empirical', 'experiment',
-            'study', 'studies', 'research', 'paper', 'work', 'works'
-        ]
-        has_factual_keywords = any(kw in text_lower for kw in factual_keywords)
-        
-        # 统计/数据关键词
-        statistical_keywords = [
-            'statistical', 'statistics', 'significant', 'significance',
-            'p-value', 'p value', 'correlation', 'regression', 'analysis',
-            'dataset', 'data', 'sample', 'population', 'mean', 'median',
-            'variance', 'standard deviation', 'confidence interval'
-        ]
-        has_statistical_keywords = any(kw in text_lower for kw in statistical_keywords)
-        
-        # 理论/概念关键词
-        theoretical_keywords = [
-            'theory', 'theoretical', 'theorem', 'proof', 'prove',
-            'concept', 'conceptual', 'principle', 'framework', 'paradigm',
-            'hypothesis', 'hypotheses', 'assumption', 'assumptions',
-            'definition', 'formal', 'mathematical', 'mathematically'
-        ]
-        has_theoretical_keywords = any(kw in text_lower for kw in theoretical_keywords)
-        
-        # 综述/相关工作关键词
-        survey_keywords = [
-            'survey', 'review', 'overview', 'state-of-the-art', 'sota',
-            'related work', 'related works', 'literature', 'previous',
-            'prior', 'existing', 'recent', 'recently', 'latest'
-        ]
-        has_survey_keywords = any(kw in text_lower for kw in survey_keywords)
-        
-        # 基础性工作关键词
-        foundational_keywords = [
-            'foundational', 'foundation', 'pioneering', 'seminal',
-            'original', 'first', 'introduced', 'proposed', 'propose',
-            'established', 'establish', 'classic', 'landmark'
-        ]
-        has_foundational_keywords = any(kw in text_lower for kw in foundational_keywords)
-        
-        # 时间相关关键词（最新进展）
-        temporal_keywords = [
-            'recent', 'recently', 'latest', 'new', 'novel', 'newly',
-            'current', 'contemporary', 'modern', 'state-of-the-art',
-            '2020', '2021', '2022', '2023', '2024', '2025'
-        ]
-        has_temporal_keywords = any(kw in text_lower for kw in temporal_keywords)
-        
-        return {
+
+        # 检测关键词模式（单次扫描）
+        found, matches = self.matcher.scan(context.text_lower)
+
+        result = {
             "text": cleaned,
             "word_count": word_count,
             "sentence_count": sentence_count,
-            "has_method_keywords": has_method_keywords,
-            "has_comparison_keywords": has_comparison_keywords,
-            "has_factual_keywords": has_factual_keywords,
-            "has_statistical_keywords": has_statistical_keywords,
-            "has_theoretical_keywords": has_theoretical_keywords,
-            "has_survey_keywords": has_survey_keywords,
-            "has_foundational_keywords": has_foundational_keywords,
-            "has_temporal_keywords": has_temporal_keywords,
-            "is_short": word_count < 20,
-            "is_long": word_count > 100
         }
+        for category in self.matcher.categories:
+            result[f"has_{category}_keywords"] = category in found
+        result["is_short"] = word_count < 20
+        result["is_long"] = word_count > 100
+        result["keyword_matches"] = matches
+        return result
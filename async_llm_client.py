@@ -0,0 +1,325 @@
+"""
+异步 LLM 客户端 - 基于 asyncio，单个事件循环内即可保持大量并发请求
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from typing import Dict, Any, Optional, List, Iterable
+
+from .cache import LRUCache
+from . import usage
+from .llm_client import LLMClient, LLMResponseParser, wrap_sdk_error
+
+
+class AsyncLLMClient(ABC):
+    """异步 LLM 客户端抽象基类"""
+
+    @abstractmethod
+    async def complete(self, prompt: str, **kwargs) -> str:
+        """
+        完成文本生成
+
+        参数与 LLMClient.complete 相同（temperature、max_tokens、json_mode）
+        """
+        pass
+
+    async def aclose(self):
+        """释放底层连接"""
+        pass
+
+
+class AsyncOpenAIClient(AsyncLLMClient):
+    """OpenAI 异步客户端"""
+
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+        """
+        Args:
+            api_key: OpenAI API key
+            model: 模型名称，默认 gpt-3.5-turbo
+        """
+        try:
+            from openai import AsyncOpenAI
+        except ImportError:
+            raise ImportError(
+                "OpenAI SDK 未安装。请运行: pip install openai"
+            )
+
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+
+    async def complete(self, prompt: str, **kwargs) -> str:
+        """调用 OpenAI API"""
+        extra = {}
+        if kwargs.get("json_mode"):
+            extra["response_format"] = {"type": "json_object"}
+        if kwargs.get("timeout") is not None:
+            extra["timeout"] = kwargs["timeout"]
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful research assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=kwargs.get("temperature", 0.3),
+                max_tokens=kwargs.get("max_tokens", 500),
+                **extra
+            )
+            usage.report_sdk_usage("openai", self.model, getattr(response, "usage", None))
+            return response.choices[0].message.content.strip()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise wrap_sdk_error("OpenAI", e) from e
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class AsyncAnthropicClient(AsyncLLMClient):
+    """Anthropic Claude 异步客户端"""
+
+    def __init__(self, api_key: str, model: str = "claude-3-haiku-20240307"):
+        """
+        Args:
+            api_key: Anthropic API key
+            model: 模型名称，默认 claude-3-haiku-20240307
+        """
+        try:
+            import anthropic
+        except ImportError:
+            raise ImportError(
+                "Anthropic SDK 未安装。请运行: pip install anthropic"
+            )
+
+        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        self.model = model
+
+    async def complete(self, prompt: str, **kwargs) -> str:
+        """调用 Anthropic API"""
+        messages = [{"role": "user", "content": prompt}]
+        prefill = ""
+        if kwargs.get("json_mode"):
+            prefill = "{"
+            messages.append({"role": "assistant", "content": prefill})
+        extra = {}
+        if kwargs.get("timeout") is not None:
+            extra["timeout"] = kwargs["timeout"]
+        try:
+            response = await self.client.messages.create(
+                model=self.model,
+                max_tokens=kwargs.get("max_tokens", 500),
+                temperature=kwargs.get("temperature", 0.3),
+                messages=messages,
+                **extra
+            )
+            usage.report_sdk_usage("anthropic", self.model, getattr(response, "usage", None))
+            return (prefill + response.content[0].text).strip()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise wrap_sdk_error("Anthropic", e) from e
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class ThreadedAsyncClient(AsyncLLMClient):
+    """把同步 LLMClient 放到线程池中执行，供异步接口使用"""
+
+    def __init__(self, client: LLMClient, executor: Optional[Executor] = None):
+        """
+        Args:
+            client: 同步 LLM 客户端（如 CachedLLMClient）
+            executor: 线程池（默认使用事件循环的默认线程池）
+        """
+        self.client = client
+        self.executor = executor
+
+    @property
+    def model(self) -> str:
+        return getattr(self.client, "model", type(self.client).__name__)
+
+    async def complete(self, prompt: str, **kwargs) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, lambda: self.client.complete(prompt, **kwargs)
+        )
+
+
+class AsyncUnifiedLLMClient(LLMResponseParser):
+    """
+    异步统一 LLM 客户端
+
+    - 信号量限制同时在途的请求数
+    - 每次调用有超时，超时按失败处理（返回 Optional 结果，带 error 字段）
+    - 取消调用方任务会取消在途请求
+    """
+
+    def __init__(
+        self,
+        client: AsyncLLMClient,
+        max_concurrency: int = 8,
+        timeout: Optional[float] = 30.0,
+        cache: Optional[LRUCache] = None,
+        use_cache: bool = True
+    ):
+        """
+        Args:
+            client: 异步 LLM 客户端（同步客户端会自动用 ThreadedAsyncClient 包装）
+            max_concurrency: 最大在途请求数
+            timeout: 默认单次调用超时（秒），None 表示不限
+            cache: 结果缓存（可选，默认创建 256 条、1 小时过期的 LRU 缓存）
+            use_cache: 是否缓存成功的 LLM 结果
+        """
+        if isinstance(client, LLMClient):
+            client = ThreadedAsyncClient(client)
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency 必须大于 0")
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = self._make_cache(cache, use_cache)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """信号量绑定到当前事件循环（兼容 Python 3.8/3.9）"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _complete(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        template: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """在并发限制和超时约束下调用 LLM（template 为用量账本中的模板名）"""
+        timeout = self.timeout if timeout is None else timeout
+        async with self._get_semaphore():
+            with usage.track(template, prompt, getattr(self.client, "model", None)) as tracked:
+                response = await asyncio.wait_for(self.client.complete(prompt, **kwargs), timeout)
+                tracked.response_chars = len(response)
+                return response
+
+    async def analyze_citation(self, text: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """使用 LLM 分析引用需求（见 UnifiedLLMClient.analyze_citation）"""
+        from .prompts import ANALYZE_PROMPT
+
+        prompt = ANALYZE_PROMPT.format(selected_text=text)
+        key = self._cache_key("analyze_citation", ANALYZE_PROMPT, text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._complete(prompt, timeout, "analyze_citation")
+            result = self._parse_analysis_response(response, text)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            return self._analysis_fallback(e)
+
+    async def analyze_structured(self, text: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """单次结构化分析（见 UnifiedLLMClient.analyze_structured）"""
+        from .prompts import STRUCTURED_ANALYZE_PROMPT, JSON_REPAIR_PROMPT
+
+        prompt = STRUCTURED_ANALYZE_PROMPT.format(text=text)
+        key = self._cache_key("analyze_structured", STRUCTURED_ANALYZE_PROMPT, text, max_tokens=400)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._complete(prompt, timeout, "analyze_structured", max_tokens=400, json_mode=True)
+            try:
+                result = self._parse_structured_response(response)
+            except ValueError:
+                repair_prompt = JSON_REPAIR_PROMPT.format(response=response)
+                repaired = await self._complete(repair_prompt, timeout, "json_repair", max_tokens=400, json_mode=True)
+                result = self._parse_structured_response(repaired)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            return self._structured_fallback(e)
+
+    async def classify_intent(self, text: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """使用 LLM 分类引用意图"""
+        from .prompts import INTENT_CLASSIFY_PROMPT
+
+        prompt = INTENT_CLASSIFY_PROMPT.format(text=text)
+        key = self._cache_key("classify_intent", INTENT_CLASSIFY_PROMPT, text, max_tokens=50)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._complete(prompt, timeout, "classify_intent", max_tokens=50)
+            result = self._intent_result(response)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            return self._intent_fallback(e)
+
+    async def plan_citation_types(self, text: str, intent: str, timeout: Optional[float] = None) -> List[str]:
+        """使用 LLM 规划引用类型"""
+        from .prompts import PLANNER_PROMPT
+
+        prompt = PLANNER_PROMPT.format(text=text, intent=intent)
+        key = self._cache_key("plan_citation_types", PLANNER_PROMPT, text, intent, max_tokens=200)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._complete(prompt, timeout, "plan_citation_types", max_tokens=200)
+            result = self._parse_citation_types(response)
+            self._cache_put(key, result)
+            return result
+        except Exception:
+            return []
+
+    async def generate_keywords(
+        self,
+        text: str,
+        citation_types: List[str],
+        timeout: Optional[float] = None
+    ) -> List[str]:
+        """使用 LLM 生成关键词"""
+        from .prompts import KEYWORD_PROMPT
+
+        citation_type_str = self._citation_type_str(citation_types)
+        prompt = KEYWORD_PROMPT.format(text=text, citation_type=citation_type_str)
+        key = self._cache_key("generate_keywords", KEYWORD_PROMPT, text, citation_type_str, max_tokens=150)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self._complete(prompt, timeout, "generate_keywords", max_tokens=150)
+            result = self._parse_keywords(response)
+            self._cache_put(key, result)
+            return result
+        except Exception:
+            return []
+
+    async def analyze_many(self, texts: Iterable[str], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        并发分析多段文本（每段一次结构化调用）
+
+        在途请求数受 max_concurrency 限制；结果顺序与输入一致。
+        """
+        texts = list(texts)
+        results = await asyncio.gather(*(self.analyze_structured(t, timeout) for t in texts))
+        for text, result in zip(texts, results):
+            result["text"] = text
+        return list(results)
+
+    async def aclose(self):
+        """释放底层连接"""
+        await self.client.aclose()
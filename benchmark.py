@@ -0,0 +1,586 @@
+"""
+基准测试 - 规则引擎、LLM 响应解析和端到端路径的吞吐量与延迟百分位
+
+用法：
+    python -m whatshouldicite.benchmark --out results.json
+    python -m whatshouldicite.benchmark --out new.json --compare results.json
+"""
+
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .bench_corpus import generate_corpus
+
+
+SCHEMA_VERSION = 1
+
+# 冷启动预算：编辑器插件每次调用都新起进程，规则路径的导入耗时应远小于分析本身
+# （包本身按需导入子模块，几乎不耗时，因此以 from whatshouldicite import CitationAgent
+# 实际导入的 agent 模块计时）
+STARTUP_BUDGET_MS = {"startup.import_agent": 50.0, "startup.import_global_agent": 80.0}
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """已排序序列的第 p 百分位（最近秩法）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies_ns: List[int], wall_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    汇总单次调用延迟
+
+    Args:
+        latencies_ns: 每次调用的耗时（纳秒）
+        wall_seconds: 总墙钟时间（并发测试时用它计算吞吐量，默认为各次耗时之和）
+    """
+    values = sorted(latencies_ns)
+    total = wall_seconds if wall_seconds is not None else sum(values) / 1e9
+    return {
+        "n": len(values),
+        "total_s": round(total, 6),
+        "ops_per_s": round(len(values) / total, 1) if total > 0 else None,
+        "mean_us": round(sum(values) / len(values) / 1e3, 2) if values else None,
+        "p50_us": round(percentile(values, 50) / 1e3, 2),
+        "p95_us": round(percentile(values, 95) / 1e3, 2),
+        "p99_us": round(percentile(values, 99) / 1e3, 2),
+    }
+
+
+def measure(func: Callable[[Any], Any], inputs: Iterable[Any], repeat: int = 1) -> Dict[str, Any]:
+    """逐次计时调用 func(item)"""
+    inputs = list(inputs)
+    timer = time.perf_counter_ns
+    latencies = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = timer()
+            func(item)
+            latencies.append(timer() - start)
+    return summarize(latencies)
+
+
+def measure_concurrent(func: Callable[[Any], Any], inputs: Iterable[Any], workers: int) -> Dict[str, Any]:
+    """在线程池中并发调用，吞吐量按墙钟时间计算"""
+    inputs = list(inputs)
+    timer = time.perf_counter_ns
+
+    def timed(item):
+        start = timer()
+        func(item)
+        return timer() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(timed, inputs))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def measure_server(manager, texts: Iterable[str], clients: int = 16, workers: int = 8) -> Dict[str, Any]:
+    """
+    启动 HTTP 分析服务，用 clients 个并发客户端持续请求 POST /analyze
+
+    每个客户端线程保持一条 keep-alive 连接；吞吐量按墙钟时间计算。
+
+    Args:
+        manager: 服务使用的 ModeManager
+        texts: 请求文本
+        clients: 并发客户端数
+        workers: 服务端工作线程数
+    """
+    import http.client
+    import threading
+    from .server import AnalysisServer
+
+    app = AnalysisServer(port=0, manager=manager, workers=workers, max_queue=clients * 2)
+    app.bind()
+    thread = threading.Thread(target=app.serve_forever, daemon=True)
+    thread.start()
+    local = threading.local()
+
+    def post(text):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", app.port, timeout=60)
+        conn.request("POST", "/analyze", body=json.dumps({"text": text}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+
+    try:
+        return measure_concurrent(post, texts, workers=clients)
+    finally:
+        app.shutdown()
+        thread.join(5)
+
+
+def measure_hotkey(llm_client, texts: List[str], burst: int = 20, interval: float = 0.01) -> Dict[str, Any]:
+    """
+    模拟连续快速按快捷键：每轮 burst 次触发、间隔 interval 秒，轮与轮之间等待处理完毕
+
+    延迟记录每轮最后一次触发到浮窗首次显示的时间（界面由独立线程执行 UI 队列，
+    浮窗只记录调用时间，不创建窗口）。
+
+    Args:
+        llm_client: 模拟的 LLM 客户端（LLM 模式，流式显示）
+        texts: 各次触发时“选中”的文本
+        burst: 每轮触发次数
+        interval: 触发间隔（秒）
+    """
+    import threading
+    from .global_agent import GlobalCitationAgent
+    from .mode_selector import AnalysisMode
+
+    class RecordingPopup:
+        def __init__(self):
+            self.shown: List[int] = []
+
+        def show(self, content):
+            self.shown.append(time.perf_counter_ns())
+
+        update_content = show
+
+        def hide(self):
+            pass
+
+    popup = RecordingPopup()
+    source = iter(texts)
+    agent = GlobalCitationAgent(llm_client=llm_client, default_mode=AnalysisMode.LLM_BASED,
+                                select_mode=False, popup=popup, text_source=lambda: next(source))
+    stop = threading.Event()
+
+    def ui_loop():
+        while not stop.is_set():
+            agent.ui.run_pending(timeout=0.005)
+
+    ui_thread = threading.Thread(target=ui_loop, daemon=True)
+    ui_thread.start()
+    latencies: List[int] = []
+    trigger_ns: List[int] = []
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(len(texts) // burst):
+                for _ in range(burst):
+                    before = time.perf_counter_ns()
+                    agent._on_hotkey_triggered()
+                    last = time.perf_counter_ns()
+                    trigger_ns.append(last - before)
+                    time.sleep(interval)
+                agent.worker.wait_idle(timeout=60)
+                time.sleep(0.01)  # 等 UI 线程执行完队列
+                latencies.append(min(t for t in popup.shown if t >= last) - last)
+    finally:
+        stop.set()
+        ui_thread.join(5)
+        agent.worker.stop()
+    stats = summarize(latencies, time.perf_counter() - start)
+    stats.update(agent.worker.stats())
+    trigger_ns.sort()
+    stats["trigger_p99_us"] = round(percentile(trigger_ns, 99) / 1e3, 2)
+    stats["frames_shown"] = len(popup.shown)
+    return stats
+
+
+def _rss_kb() -> int:
+    """当前进程常驻内存（KB；没有 /proc 时退回峰值）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_popup(triggers: int = 300, rebuild: bool = False) -> Dict[str, Any]:
+    """
+    在 UI 线程中反复显示、隐藏浮窗，记录每次显示（含布局和重绘前的空闲任务）的耗时和内存增长
+
+    需要图形界面。
+
+    Args:
+        triggers: 显示次数
+        rebuild: 每次隐藏时销毁窗口、下次重新创建（旧的实现方式，作为对照）
+    """
+    import threading
+    from .dispatch import TkUIThread
+    from .popup_window import SimplePopupWindow
+
+    ui = TkUIThread().start()
+    popup = SimplePopupWindow(ui)
+    content = SAMPLE_ANALYSIS_RESPONSE * 3
+    latencies: List[int] = []
+
+    def trigger(i, done):
+        start = time.perf_counter_ns()
+        popup._show(f"#{i}\n{content}")
+        ui.root.update_idletasks()
+        latencies.append(time.perf_counter_ns() - start)
+        if rebuild:
+            popup._destroy()
+        else:
+            popup._hide()
+        ui.root.update_idletasks()
+        done.set()
+
+    def run(n):
+        for i in range(n):
+            done = threading.Event()
+            ui.call(trigger, i, done)
+            done.wait(10)
+
+    try:
+        run(20)  # 预热：首次创建窗口、加载字体
+        latencies.clear()
+        before = _rss_kb()
+        start = time.perf_counter()
+        run(triggers)
+        wall = time.perf_counter() - start
+        growth = _rss_kb() - before
+    finally:
+        ui.stop()
+    stats = summarize(latencies, wall)
+    stats["rss_growth_kb"] = growth
+    stats["rss_growth_kb_per_trigger"] = round(growth / triggers, 3)
+    return stats
+
+
+def import_time(module: str, runs: int = 5) -> Dict[str, Any]:
+    """
+    用 python -X importtime 测量在新进程中导入 module 的累计耗时
+
+    Args:
+        module: 模块名
+        runs: 重复次数（每次一个新进程）
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+    latencies = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=env, timeout=60
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"导入 {module} 失败: {proc.stderr.strip().splitlines()[-1:]}")
+        for line in proc.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                latencies.append(int(parts[1]) * 1000)
+                break
+    return summarize(latencies)
+
+
+# ---------------------------------------------------------------------------
+# 模拟 LLM 响应
+# ---------------------------------------------------------------------------
+
+def _prefix(template: str) -> str:
+    return template.split("{")[0]
+
+
+def simulated_response(prompt: str) -> str:
+    """
+    按提示词模板生成格式合理的模拟响应（用于解析器和端到端基准）
+    """
+    from . import prompts
+
+    if prompt.startswith(_prefix(prompts.BATCH_ANALYZE_PROMPT)):
+        items = re.findall(r"^(\d+)\. ", prompt, re.M)
+        return json.dumps({"results": [
+            {"id": int(n), "needs_citation": "Yes", "reason": "提到了具体方法",
+             "intent": "method_technique", "citation_types": ["Foundational works on the method"],
+             "keywords": ["method benchmark", "baseline comparison"]}
+            for n in items
+        ]})
+    if prompt.startswith(_prefix(prompts.STRUCTURED_ANALYZE_PROMPT)):
+        return SAMPLE_STRUCTURED_RESPONSE
+    if prompt.startswith(_prefix(prompts.INTENT_CLASSIFY_PROMPT)):
+        return "Method/Technique"
+    if prompt.startswith(_prefix(prompts.PLANNER_PROMPT)):
+        return "- Foundational works on the method\n- Recent methods for the task"
+    if prompt.startswith(_prefix(prompts.KEYWORD_PROMPT)):
+        return '"method architecture"\n"task benchmark"\n"baseline comparison"'
+    return SAMPLE_ANALYSIS_RESPONSE
+
+
+SAMPLE_ANALYSIS_RESPONSE = """【Do I need a citation?】
+Yes
+
+【Why】
+- 提到了具体方法，需要引用原始工作
+
+【What to cite】
+- Foundational works on transformer architectures
+- Recent methods for efficient attention
+- Surveys on sequence modeling
+
+【Search keywords】
+- "transformer architecture"
+- "efficient attention mechanism"
+- "sequence modeling survey"
+"""
+
+
+SAMPLE_STRUCTURED_RESPONSE = json.dumps({
+    "needs_citation": "Yes", "reason": "提到了具体方法，需要引用原始工作",
+    "intent": "method_technique",
+    "citation_types": ["Foundational works on the method", "Recent methods for the task"],
+    "keywords": ["method architecture", "task benchmark", "baseline comparison"]
+}, ensure_ascii=False, indent=2)  # 分行输出，流式回放时逐行到达
+
+
+def simulated_llm(latency: str = "lognormal:0.02,0.5", error_rate: float = 0.0, seed: int = 0):
+    """带合成延迟的模拟 LLM 客户端"""
+    from .replay import ReplayLLMClient
+
+    return ReplayLLMClient(
+        None, latency=latency, error_rate=error_rate, seed=seed,
+        default=simulated_response
+    )
+
+
+# ---------------------------------------------------------------------------
+# 基准项
+# ---------------------------------------------------------------------------
+
+def run_benchmarks(
+    corpus_size: int = 3000,
+    llm_calls: int = 100,
+    latency: str = "lognormal:0.02,0.5",
+    only: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    运行全部基准
+
+    Args:
+        corpus_size: 规则引擎和解析器使用的句子数
+        llm_calls: 端到端 LLM 基准的调用次数
+        latency: 模拟 LLM 的延迟分布
+        only: 只运行名称包含该子串的基准
+
+    Returns:
+        {"meta": {...}, "results": {名称: 统计}}
+    """
+    from .agent import CitationAgent
+    from .analyzer import TextAnalyzer
+    from .intent import CitationIntentClassifier
+    from .keywords import KeywordGenerator
+    from .llm_client import UnifiedLLMClient
+    from .planner import CitationTypePlanner
+    from .streaming import SectionStreamParser
+    from .utils import format_output
+
+    corpus = generate_corpus(corpus_size)
+    llm_texts = corpus[:llm_calls]
+    results: Dict[str, Any] = {}
+
+    def bench(name: str, run: Callable[[], Dict[str, Any]]):
+        if only and only not in name:
+            return
+        results[name] = run()
+        stats = results[name]
+        print(f"  {name:<36} {stats['ops_per_s'] or 0:>12,.1f} ops/s   "
+              f"p50 {stats['p50_us']:>10.2f} µs   p95 {stats['p95_us']:>10.2f} µs   "
+              f"p99 {stats['p99_us']:>10.2f} µs")
+
+    # 冷启动（新进程中的导入耗时）
+    package = __package__ or "whatshouldicite"
+    bench("startup.import_agent", lambda: import_time(f"{package}.agent"))
+    bench("startup.import_global_agent", lambda: import_time(f"{package}.global_agent"))
+
+    # 规则引擎
+    analyzer = TextAnalyzer()
+    classifier = CitationIntentClassifier()
+    planner = CitationTypePlanner()
+    keyword_generator = KeywordGenerator()
+    planned = [(text, planner.plan(text)) for text in corpus]
+    rule_results = [CitationAgent().analyze_structured(text) for text in corpus[:500]]
+
+    bench("analyzer.analyze", lambda: measure(analyzer.analyze, corpus))
+    bench("intent.classify", lambda: measure(classifier.classify, corpus))
+    bench("planner.plan", lambda: measure(planner.plan, corpus))
+    bench("keywords.generate", lambda: measure(lambda item: keyword_generator.generate(*item), planned))
+    bench("utils.format_output", lambda: measure(
+        lambda r: format_output(r["needs_citation"], r["reason"], r["citation_types"], r["keywords"]),
+        rule_results, repeat=max(1, corpus_size // 500)
+    ))
+
+    # LLM 响应解析
+    parser = UnifiedLLMClient(simulated_llm(), use_cache=False)
+    analysis = [SAMPLE_ANALYSIS_RESPONSE] * 1000
+    structured = [SAMPLE_STRUCTURED_RESPONSE] * 1000
+    bench("parse._extract_citation_need", lambda: measure(parser._extract_citation_need, analysis))
+    bench("parse._extract_reason", lambda: measure(parser._extract_reason, analysis))
+    bench("parse._extract_citation_types", lambda: measure(parser._extract_citation_types, analysis))
+    bench("parse._extract_keywords", lambda: measure(parser._extract_keywords, analysis))
+    bench("parse._infer_intent_from_response", lambda: measure(parser._infer_intent_from_response, analysis))
+    bench("parse._parse_analysis_response",
+          lambda: measure(lambda r: parser._parse_analysis_response(r, ""), analysis))
+    bench("parse._parse_structured_response", lambda: measure(parser._parse_structured_response, structured))
+
+    def stream_parse(response):
+        section_parser = SectionStreamParser()
+        for i in range(0, len(response), 8):
+            section_parser.feed(response[i:i + 8])
+        section_parser.close()
+
+    bench("parse.section_stream", lambda: measure(stream_parse, analysis))
+
+    # 端到端
+    bench("e2e.rule_agent", lambda: measure(CitationAgent().analyze, corpus))
+
+    def llm_agent(**kwargs):
+        client = UnifiedLLMClient(simulated_llm(latency), use_cache=False)
+        return CitationAgent(llm_client=client, **kwargs)
+
+    bench("e2e.llm_pipeline", lambda: measure(llm_agent().analyze, llm_texts))
+    bench("e2e.llm_single_call", lambda: measure(llm_agent(single_call=True).analyze, llm_texts))
+    bench("e2e.llm_single_call_x8",
+          lambda: measure_concurrent(llm_agent(single_call=True).analyze, llm_texts, workers=8))
+
+    def batched():
+        agent = llm_agent(single_call=True, batch_size=16)
+        start = time.perf_counter()
+        agent.analyze_many(llm_texts)
+        wall = time.perf_counter() - start
+        # 批量模式下单句没有独立延迟，按平均值记录
+        per_item = int(wall / max(1, len(llm_texts)) * 1e9)
+        return summarize([per_item] * len(llm_texts), wall)
+
+    bench("e2e.llm_batched_16", batched)
+
+    # HTTP 服务（16 个并发客户端，8 个工作线程）
+    from .mode_selector import AnalysisMode, ModeManager
+
+    def llm_manager():
+        manager = ModeManager(default_mode=AnalysisMode.LLM_BASED)
+        manager.set_llm_client(UnifiedLLMClient(simulated_llm(latency), use_cache=False))
+        return manager
+
+    bench("server.rule_x16", lambda: measure_server(ModeManager(), corpus[:2000]))
+    bench("server.llm_x16", lambda: measure_server(llm_manager(), llm_texts))
+
+    # 浮窗显示（需要图形界面）：复用窗口 vs 每次重建
+    if os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY") or sys.platform in ("win32", "darwin"):
+        bench("ui.popup_show_reused", lambda: measure_popup())
+        bench("ui.popup_show_rebuilt", lambda: measure_popup(rebuild=True))
+
+    # 快捷键连续触发（最新一次取代进行中的分析）
+    bench("hotkey.rapid_triggers", lambda: measure_hotkey(
+        UnifiedLLMClient(simulated_llm("fixed:0.2"), use_cache=False), llm_texts
+    ))
+
+    return {"meta": environment(corpus_size, llm_calls, latency), "results": results}
+
+
+def environment(corpus_size: int, llm_calls: int, latency: str) -> Dict[str, Any]:
+    """运行环境信息（用于比较不同提交的结果）"""
+    commit = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return {
+        "schema": SCHEMA_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_size": corpus_size,
+        "llm_calls": llm_calls,
+        "llm_latency": latency,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    比较两次结果的 p50 延迟
+
+    Returns:
+        每个共有基准项的 {"name", "old_p50_us", "new_p50_us", "change", "regression"}
+    """
+    rows = []
+    old_results = baseline.get("results", {})
+    for name, new in current.get("results", {}).items():
+        old = old_results.get(name)
+        if not old or not old.get("p50_us"):
+            continue
+        change = new["p50_us"] / old["p50_us"] - 1
+        rows.append({
+            "name": name,
+            "old_p50_us": old["p50_us"],
+            "new_p50_us": new["p50_us"],
+            "change": round(change, 4),
+            "regression": change > threshold,
+        })
+    return rows
+
+
+def main():
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite 基准测试")
+    parser.add_argument("--out", help="结果 JSON 输出路径")
+    parser.add_argument("--compare", help="与之比较的历史结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 变慢超过该比例视为回归")
+    parser.add_argument("--corpus-size", type=int, default=3000)
+    parser.add_argument("--llm-calls", type=int, default=100)
+    parser.add_argument("--latency", default="lognormal:0.02,0.5", help="模拟 LLM 的延迟分布")
+    parser.add_argument("--only", help="只运行名称包含该子串的基准")
+    parser.add_argument("--quick", action="store_true", help="小规模快速运行")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.corpus_size, args.llm_calls, args.latency = 300, 20, "fixed:0.001"
+
+    print(f"语料 {args.corpus_size} 句，LLM 调用 {args.llm_calls} 次（延迟 {args.latency}）")
+    report = run_benchmarks(args.corpus_size, args.llm_calls, args.latency, args.only)
+
+    over_budget = []
+    for name, budget in STARTUP_BUDGET_MS.items():
+        stats = report["results"].get(name)
+        if stats and stats["p50_us"] / 1000 > budget:
+            over_budget.append(name)
+            print(f"\n⚠️  {name} p50 {stats['p50_us'] / 1000:.1f} ms 超出预算 {budget:.0f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, args.threshold)
+        print(f"\n与 {args.compare}（{baseline.get('meta', {}).get('commit')}）比较 p50：")
+        for row in rows:
+            flag = "  ⚠️ 回归" if row["regression"] else ""
+            print(f"  {row['name']:<36} {row['old_p50_us']:>10.2f} → {row['new_p50_us']:>10.2f} µs "
+                  f"({row['change']:+.1%}){flag}")
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
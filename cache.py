@@ -0,0 +1,277 @@
+"""
+缓存工具 - LLM 结果的内存缓存与持久化缓存
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+from .utils import user_data_dir
+
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=64)
+def template_fingerprint(template: str) -> str:
+    """提示词模板指纹（模板内容变化后旧缓存自然失效）"""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(*parts: Any, **params: Any) -> str:
+    """
+    由若干组成部分和生成参数构造缓存键
+
+    Args:
+        parts: 归一化文本、模板指纹、模型名等
+        params: 生成参数（如 max_tokens），按键名排序后参与哈希
+    """
+    payload = json.dumps([parts, sorted(params.items())], ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，支持 TTL 过期和命中统计
+
+    超过 maxsize 时淘汰最久未使用的条目；条目写入超过 ttl 秒后视为过期。
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: Optional[float] = 3600,
+        timer: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            maxsize: 最大条目数
+            ttl: 过期时间（秒），None 表示永不过期
+            timer: 时钟函数（便于测试）
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize 必须大于 0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """读取缓存，未命中或已过期时返回 default"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and self._timer() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        """写入缓存"""
+        expires_at = self._timer() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存（保留统计）"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def prompts_fingerprint() -> str:
+    """prompts.py 中全部模板的联合指纹，任一模板改动都会改变该值"""
+    from . import prompts
+
+    templates = sorted(
+        (name, value) for name, value in vars(prompts).items()
+        if name.isupper() and isinstance(value, str)
+    )
+    payload = "\0".join(f"{name}={value}" for name, value in templates)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class DiskCache:
+    """
+    基于 SQLite 的持久化缓存
+
+    - 按最近访问时间淘汰，总大小不超过 max_bytes
+    - 可选 zlib 压缩
+    - 打开时清除与当前提示词模板版本不一致的条目
+    - WAL 模式 + 忙等待，常驻服务与批处理命令行可同时读写
+    """
+
+    _CHECK_EVERY = 16  # 每写入若干次检查一次总大小
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        compress: bool = True,
+        version: Optional[str] = None
+    ):
+        """
+        Args:
+            path: 数据库文件路径（默认位于用户数据目录下的 llm_cache.sqlite3）
+            max_bytes: 缓存值的总大小上限（字节）
+            compress: 是否用 zlib 压缩缓存值
+            version: 缓存版本（默认取 prompts.py 的模板指纹）
+        """
+        self.path = path or os.path.join(user_data_dir(), "llm_cache.sqlite3")
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.version = version or prompts_fingerprint()
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value BLOB NOT NULL,"
+                " compressed INTEGER NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " version TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # 模板变化后旧结果失效
+            conn.execute("DELETE FROM entries WHERE version != ?", (self.version,))
+
+    def _conn(self):
+        """每个线程一个连接（sqlite3 连接不可跨线程共享）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存值，未命中返回 None"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, compressed FROM entries WHERE key = ? AND version = ?",
+            (key, self.version)
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        with self._lock:
+            self.hits += 1
+        value, compressed = row
+        if compressed:
+            value = zlib.decompress(value)
+        return bytes(value).decode("utf-8")
+
+    def put(self, key: str, value: str):
+        """写入缓存值"""
+        data = value.encode("utf-8")
+        compressed = 0
+        if self.compress and len(data) > 64:
+            packed = zlib.compress(data, 6)
+            if len(packed) < len(data):
+                data, compressed = packed, 1
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, compressed, size, version, created, accessed)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, data, compressed, len(data), self.version, now, now)
+        )
+        with self._lock:
+            self._writes += 1
+            check = self._writes % self._CHECK_EVERY == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """按最近访问时间淘汰，直到总大小不超过上限"""
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            excess = total - self.max_bytes
+            freed = 0
+            doomed = []
+            for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                doomed.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        """清空缓存"""
+        self._conn().execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        count, total = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            "path": self.path,
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "version": self.version
+        }
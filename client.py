@@ -0,0 +1,309 @@
+"""
+常驻服务的轻量客户端
+
+通过 Unix 域套接字与 daemon.py 启动的常驻服务通信，避免每次调用都重新
+import 整个包、重建分析器和 LLM 客户端。服务未运行时自动在后台启动。
+
+协议：每帧为 4 字节大端长度 + UTF-8 JSON。
+    请求  {"id": 1, "method": "analyze", "params": {"text": "...", "mode": "rule"}}
+    响应  {"id": 1, "result": {...}} 或 {"id": 1, "error": {"type": "...", "message": "..."}}
+
+本模块只依赖标准库，且不 import 包内其他模块，保证客户端启动足够快。
+
+用法：
+    python -m whatshouldicite.client "Deep learning has achieved remarkable success."
+    echo "..." | python -m whatshouldicite.client --mode hybrid --json
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME = 16 * 1024 * 1024  # 单帧上限，防止异常长度导致一次性分配过多内存
+
+
+class DaemonError(Exception):
+    """常驻服务返回的错误"""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(f"{kind}: {message}")
+        self.kind = kind
+        self.message = message
+
+
+def default_socket_path() -> str:
+    """
+    默认套接字路径
+
+    优先使用 WHATSHOULDICITE_SOCKET，其次 $XDG_RUNTIME_DIR，最后是临时目录
+    （文件名带用户 ID，避免多用户共用同一个服务）。
+    """
+    override = os.environ.get("WHATSHOULDICITE_SOCKET")
+    if override:
+        return override
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "whatshouldicite.sock")
+    import tempfile
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return os.path.join(tempfile.gettempdir(), f"whatshouldicite-{uid}.sock")
+
+
+def send_frame(sock: socket.socket, message: Dict[str, Any]):
+    """发送一帧 JSON 消息"""
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    if len(payload) > MAX_FRAME:
+        raise ValueError(f"消息过大: {len(payload)} 字节")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """
+    接收一帧 JSON 消息
+
+    Returns:
+        解析后的消息；对端在帧边界处关闭连接时返回 None
+
+    Raises:
+        ConnectionError: 连接在帧中途断开
+        ValueError: 帧长度超过上限
+    """
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ValueError(f"帧长度超过上限: {size} 字节")
+    payload = _recv_exact(sock, size)
+    if payload is None:
+        raise ConnectionError("连接在读取消息时断开")
+    return json.loads(payload.decode("utf-8"))
+
+
+class DaemonClient:
+    """
+    常驻服务客户端（保持一条连接，可重复调用）
+
+    示例：
+        with DaemonClient() as client:
+            print(client.analyze("Recent studies have shown ...")["formatted"])
+    """
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        autostart: bool = True,
+        timeout: Optional[float] = 60.0,
+        start_timeout: float = 10.0,
+        daemon_args: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            socket_path: 套接字路径（None 则使用 default_socket_path()）
+            autostart: 服务未运行时是否自动启动
+            timeout: 单次请求超时（秒），LLM 模式需留足时间
+            start_timeout: 自动启动后等待服务就绪的最长时间（秒）
+            daemon_args: 自动启动时附加给 daemon 的参数（如 ["--llm"]）
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.autostart = autostart
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.daemon_args = list(daemon_args or [])
+        self._sock: Optional[socket.socket] = None
+        self._next_id = 0
+
+    def _try_connect(self) -> Optional[socket.socket]:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            return None
+        sock.settimeout(self.timeout)
+        return sock
+
+    def connect(self) -> "DaemonClient":
+        """连接服务，必要时自动启动"""
+        if self._sock is not None:
+            return self
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError("当前平台不支持 Unix 域套接字")
+        sock = self._try_connect()
+        if sock is None:
+            if not self.autostart:
+                raise ConnectionError(f"常驻服务未运行: {self.socket_path}")
+            sock = self._spawn_and_connect()
+        self._sock = sock
+        return self
+
+    def _spawn_and_connect(self) -> socket.socket:
+        """在后台启动服务并等待套接字可连接"""
+        import subprocess
+
+        command = [
+            sys.executable, "-m", "whatshouldicite.daemon", "serve",
+            "--socket", self.socket_path,
+        ] + self.daemon_args
+        env = dict(os.environ)
+        # 子进程需要能 import 本包（与当前进程使用同样的搜索路径）
+        env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+        log_path = self.socket_path + ".log"
+        with open(log_path, "ab") as log:
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                env=env,
+                start_new_session=True,  # 与当前终端脱离，客户端退出后继续运行
+            )
+
+        deadline = time.monotonic() + self.start_timeout
+        delay = 0.005
+        while time.monotonic() < deadline:
+            sock = self._try_connect()
+            if sock is not None:
+                return sock
+            if process.poll() is not None:
+                # 启动失败，或另一个客户端同时启动的服务抢先占用了套接字
+                sock = self._try_connect()
+                if sock is not None:
+                    return sock
+                raise RuntimeError(f"常驻服务启动失败，详见日志: {log_path}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        raise TimeoutError(f"等待常驻服务启动超时（{self.start_timeout}s）")
+
+    def call(self, method: str, **params) -> Any:
+        """
+        发送一次请求并等待结果
+
+        Raises:
+            DaemonError: 服务端处理失败
+            ConnectionError: 连接断开
+        """
+        self.connect()
+        self._next_id += 1
+        request_id = self._next_id
+        try:
+            send_frame(self._sock, {"id": request_id, "method": method, "params": params})
+            response = recv_frame(self._sock)
+        except (OSError, ValueError):
+            self.close()
+            raise
+        if response is None:
+            self.close()
+            raise ConnectionError("常驻服务关闭了连接")
+        error = response.get("error")
+        if error:
+            raise DaemonError(error.get("type", "Error"), error.get("message", ""))
+        return response.get("result")
+
+    def ping(self) -> Dict[str, Any]:
+        """检查服务状态（进程号、运行时长等）"""
+        return self.call("ping")
+
+    def analyze(self, text: str, mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        分析单段文本
+
+        Args:
+            text: 待分析文本
+            mode: "rule" / "llm" / "hybrid"（None 则使用服务端默认模式）
+
+        Returns:
+            结构化结果，另含 formatted（与 CitationAgent.analyze 相同的文本输出）
+        """
+        return self.call("analyze", text=text, mode=mode)
+
+    def analyze_many(self, texts: List[str], mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """批量分析，结果与 texts 一一对应"""
+        return self.call("analyze_many", texts=list(texts), mode=mode)
+
+    def stats(self) -> Dict[str, Any]:
+        """服务端统计（请求数、延迟分位数等）"""
+        return self.call("stats")
+
+    def shutdown(self):
+        """请求服务退出"""
+        try:
+            self.call("shutdown")
+        finally:
+            self.close()
+
+    def close(self):
+        """关闭连接（不影响服务本身）"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def __enter__(self) -> "DaemonClient":
+        return self.connect()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite 常驻服务客户端")
+    parser.add_argument("text", nargs="*", help="待分析文本（省略则从标准输入读取）")
+    parser.add_argument("--mode", choices=["rule", "llm", "hybrid"], help="分析模式")
+    parser.add_argument("--json", action="store_true", help="输出结构化 JSON")
+    parser.add_argument("--socket", help="套接字路径")
+    parser.add_argument("--no-autostart", action="store_true", help="服务未运行时不自动启动")
+    parser.add_argument("--llm", action="store_true", help="自动启动服务时启用 LLM（读取 config.py）")
+    parser.add_argument("--ping", action="store_true", help="只检查服务状态")
+    parser.add_argument("--stop", action="store_true", help="停止常驻服务")
+    args = parser.parse_args(argv)
+
+    client = DaemonClient(
+        socket_path=args.socket,
+        autostart=not (args.no_autostart or args.stop),
+        daemon_args=["--llm"] if args.llm else None,
+    )
+    try:
+        if args.stop:
+            client.shutdown()
+            return
+        if args.ping:
+            print(json.dumps(client.ping(), ensure_ascii=False))
+            return
+        text = " ".join(args.text) if args.text else sys.stdin.read()
+        result = client.analyze(text, mode=args.mode)
+    except (ConnectionError, DaemonError, RuntimeError, TimeoutError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        client.close()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print(result["formatted"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+常驻分析服务 - 在内存中保持已预热的 Agent、已编译的规则表、LLM 连接和缓存
+
+命令行或编辑器每次调用都要重新 import 整个包并重建分析器、规划器和 LLM 客户端；
+常驻服务只做一次，之后通过 Unix 域套接字处理请求（协议见 client.py）。
+
+用法：
+    python -m whatshouldicite.daemon serve              # 前台运行（规则模式）
+    python -m whatshouldicite.daemon serve --llm        # 启用 LLM（读取环境变量或 config.py）
+    python -m whatshouldicite.client "..."              # 客户端，服务未运行时自动启动
+"""
+
+import os
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from . import usage
+from .client import default_socket_path, recv_frame, send_frame
+from .mode_selector import AnalysisMode, ModeManager
+from .utils import format_result
+
+DEFAULT_IDLE_TIMEOUT = 30 * 60.0  # 自动启动的服务空闲 30 分钟后退出
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """一个连接一个线程；连接保持打开，可连续发送多个请求"""
+
+    def handle(self):
+        daemon: "CitationDaemon" = self.server.daemon
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            send_frame(self.request, daemon.dispatch(request))
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class CitationDaemon:
+    """常驻分析服务"""
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        manager: Optional[ModeManager] = None,
+        idle_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            socket_path: 套接字路径（None 则使用 default_socket_path()）
+            manager: 共享的 ModeManager（None 则创建规则模式的 ModeManager）
+            idle_timeout: 无请求多少秒后自动退出（None 表示一直运行）
+        """
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise RuntimeError("当前平台不支持 Unix 域套接字")
+        self.socket_path = socket_path or default_socket_path()
+        self.manager = manager or ModeManager()
+        self.idle_timeout = idle_timeout
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.latency_us = usage.Histogram()
+        self._last_activity = time.monotonic()
+        self._stats_lock = threading.Lock()
+        self._server: Optional[_Server] = None
+        self._lock_file = None
+        self._methods: Dict[str, Callable[..., Any]] = {
+            "ping": self.ping,
+            "analyze": self.analyze,
+            "analyze_many": self.analyze_many,
+            "stats": self.stats,
+            "shutdown": self.shutdown,
+        }
+
+    # ---- 请求处理 ----
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """处理一条请求，返回响应消息（异常转换为 error 字段，不会中断连接）"""
+        start = time.perf_counter()
+        request_id = request.get("id")
+        method = self._methods.get(request.get("method"))
+        try:
+            if method is None:
+                raise ValueError(f"未知方法: {request.get('method')}")
+            response = {"id": request_id, "result": method(**(request.get("params") or {}))}
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            response = {"id": request_id, "error": {"type": type(e).__name__, "message": str(e)}}
+        with self._stats_lock:
+            self.requests += 1
+            self.latency_us.record((time.perf_counter() - start) * 1e6)
+            self._last_activity = time.monotonic()
+        return response
+
+    @staticmethod
+    def _mode(mode: Optional[str]) -> Optional[AnalysisMode]:
+        return AnalysisMode(mode) if mode else None
+
+    def _analyze(self, text: str, mode: Optional[AnalysisMode]) -> Dict[str, Any]:
+        result = self.manager.analyze_structured(text, mode)
+        result["formatted"] = format_result(result)
+        return result
+
+    def ping(self) -> Dict[str, Any]:
+        from . import __version__
+
+        return {
+            "pid": os.getpid(),
+            "version": __version__,
+            "uptime_s": round(time.time() - self.started, 3),
+            "llm": self.manager.llm_client is not None,
+            "mode": self.manager.current_mode.value,
+        }
+
+    def analyze(self, text: str, mode: Optional[str] = None) -> Dict[str, Any]:
+        return self._analyze(text, self._mode(mode))
+
+    def analyze_many(self, texts, mode: Optional[str] = None):
+        return self.manager.analyze_many(texts, self._mode(mode))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "latency_us": {
+                    "p50": self.latency_us.percentile(50),
+                    "p99": self.latency_us.percentile(99),
+                    "max": self.latency_us.max,
+                },
+            }
+        if self.manager.llm_client is not None:
+            stats["llm"] = self.manager.llm_client.latency_stats()
+        return stats
+
+    def shutdown(self) -> bool:
+        # serve_forever 所在线程之外调用 server.shutdown()，否则会互相等待
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+        return True
+
+    # ---- 生命周期 ----
+
+    def _acquire_lock(self):
+        """
+        持有 <socket>.lock 的排他锁直到退出
+
+        多个客户端同时自动启动服务时，只有拿到锁的进程继续，其余直接退出，
+        避免后来者删除先行者已绑定的套接字。
+        """
+        import fcntl
+
+        self._lock_file = open(self.socket_path + ".lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(f"常驻服务已在运行: {self.socket_path}")
+
+    def bind(self):
+        """创建套接字（仅当前用户可访问），不开始处理请求"""
+        self._acquire_lock()
+        # 持有锁说明没有其他服务在运行，残留的套接字文件可以安全删除
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        old_umask = os.umask(0o177)
+        try:
+            self._server = _Server(self.socket_path, _Handler)
+        finally:
+            os.umask(old_umask)
+        self._server.daemon = self
+
+    def _watch_idle(self, server: _Server):
+        while self._server is server:
+            time.sleep(min(self.idle_timeout, 1.0))
+            if time.monotonic() - self._last_activity >= self.idle_timeout:
+                server.shutdown()
+                return
+
+    def serve_forever(self):
+        """预热后开始处理请求，直到 shutdown 或空闲超时"""
+        if self._server is None:
+            self.bind()
+        self.manager.warmup()
+        if self.idle_timeout:
+            threading.Thread(target=self._watch_idle, args=(self._server,), daemon=True).start()
+        try:
+            self._server.serve_forever(poll_interval=0.5)
+        finally:
+            self.close()
+
+    def close(self):
+        """关闭套接字并删除套接字文件"""
+        server, self._server = self._server, None
+        if server is not None:
+            server.server_close()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def build_manager(use_llm: bool = False, mode: Optional[str] = None) -> ModeManager:
+    """
+    创建服务共享的 ModeManager
+
+    Args:
+        use_llm: 是否启用 LLM（读取环境变量或 config.py，并记录用量账本）
+        mode: 默认分析模式（None 时启用了 LLM 则为 hybrid，否则 rule）
+    """
+    manager = ModeManager()
+    if use_llm:
+        from .run_with_llm import enable_usage_ledger, get_llm_client
+
+        llm_client = get_llm_client()
+        if llm_client:
+            manager.set_llm_client(llm_client)
+            manager.current_mode = AnalysisMode.HYBRID
+            enable_usage_ledger()
+    if mode:
+        manager.current_mode = AnalysisMode(mode)
+    return manager
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite 常驻分析服务")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="运行服务")
+    serve.add_argument("--socket", help="套接字路径（默认 $XDG_RUNTIME_DIR/whatshouldicite.sock）")
+    serve.add_argument("--llm", action="store_true", help="启用 LLM（读取环境变量或 config.py）")
+    serve.add_argument("--mode", choices=[m.value for m in AnalysisMode],
+                       help="默认分析模式（启用 LLM 时默认 hybrid，否则 rule）")
+    serve.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                       help="空闲多少秒后退出，0 表示一直运行（默认 1800）")
+    args = parser.parse_args(argv)
+
+    daemon = CitationDaemon(args.socket, build_manager(args.llm, args.mode), idle_timeout=args.idle_timeout or None)
+    try:
+        daemon.bind()
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+    print(f"常驻服务已启动: {daemon.socket_path}（pid {os.getpid()}）", flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
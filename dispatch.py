@@ -0,0 +1,313 @@
+"""
+线程调度 - 快捷键路径的后台工作线程、UI 消息队列与 Tk UI 线程
+
+快捷键钩子线程和 Tk 回调只负责投递任务，耗时的取词和分析（包括阻塞的 LLM 调用）
+在专用工作线程中执行；结果通过消息队列交回唯一的 UI 线程显示。
+"""
+
+import contextvars
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+if TYPE_CHECKING:
+    import tkinter as tk
+
+
+class LatestWinsWorker:
+    """
+    最新请求优先的工作线程
+
+    等待队列只有一个位置：新任务取代尚未开始的旧任务，并取消正在执行的任务。
+    任务函数的最后一个参数是取消事件，应在各阶段之间检查它并尽早返回；
+    无法中断的阻塞调用结束后，其结果也应在检查取消后丢弃。
+    """
+
+    def __init__(self, name: str = "whatshouldicite-worker"):
+        """
+        Args:
+            name: 线程名
+        """
+        self.submitted = 0
+        self.superseded = 0  # 尚未开始就被新任务取代
+        self.cancelled = 0   # 执行中被取消
+        self.completed = 0
+        self.running = True
+        self._pending: Optional[Tuple[Callable[..., Any], tuple, threading.Event]] = None
+        self._current: Optional[threading.Event] = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable[..., Any], *args) -> threading.Event:
+        """
+        提交任务 fn(*args, cancel)，立即返回（可在任意线程调用）
+
+        Returns:
+            该任务的取消事件
+        """
+        cancel = threading.Event()
+        with self._cond:
+            self.submitted += 1
+            if self._pending is not None:
+                self._pending[2].set()
+                self.superseded += 1
+            if self._current is not None:
+                self._current.set()
+            self._pending = (fn, args, cancel)
+            self._cond.notify_all()
+        return cancel
+
+    def cancel(self) -> bool:
+        """取消正在执行和等待中的任务，返回是否确有任务被取消"""
+        with self._cond:
+            cancelled = False
+            if self._pending is not None:
+                self._pending[2].set()
+                self._pending = None
+                self.superseded += 1
+                cancelled = True
+            if self._current is not None and not self._current.is_set():
+                self._current.set()
+                cancelled = True
+            self._cond.notify_all()
+            return cancelled
+
+    @property
+    def busy(self) -> bool:
+        with self._cond:
+            return self._pending is not None or self._current is not None
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """等待所有任务结束，返回是否在超时前空闲"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and self._current is None, timeout
+            )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self.running)
+                if not self.running:
+                    return
+                fn, args, cancel = self._pending
+                self._pending = None
+                self._current = cancel
+            try:
+                fn(*args, cancel)
+            except Exception as e:
+                print(f"⚠️  后台任务失败: {e}")
+            finally:
+                with self._cond:
+                    if cancel.is_set():
+                        self.cancelled += 1
+                    else:
+                        self.completed += 1
+                    self._current = None
+                    self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "submitted": self.submitted,
+                "superseded": self.superseded,
+                "cancelled": self.cancelled,
+                "completed": self.completed,
+            }
+
+    def stop(self):
+        """取消所有任务并结束线程"""
+        self.cancel()
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+
+
+_DONE = object()
+
+
+def iter_cancellable(items: Iterable[Any], cancel: threading.Event, poll: float = 0.01) -> Iterator[Any]:
+    """
+    在后台线程中迭代 items，取消后立即停止产出（不必等阻塞中的下一项返回）
+
+    后台线程在拿到下一项后发现已取消，会关闭 items（生成器的 finally 随之执行，
+    例如取消在途的 LLM 请求）。迭代中的异常原样抛给调用方。后台线程继承调用方的
+    上下文（用量标签、追踪等）。
+
+    Args:
+        items: 可能阻塞的可迭代对象（如流式分析结果）
+        cancel: 取消事件
+        poll: 检查取消的间隔（秒）
+    """
+    results: "queue.Queue[Tuple[Any, Optional[BaseException]]]" = queue.Queue()
+
+    def feed():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if cancel.is_set():
+                    break
+                results.put((item, None))
+        except BaseException as e:
+            results.put((_DONE, e))
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+        results.put((_DONE, None))
+
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(feed,), name="whatshouldicite-stream", daemon=True).start()
+    while not cancel.is_set():
+        try:
+            item, error = results.get(timeout=poll)
+        except queue.Empty:
+            continue
+        if error is not None:
+            raise error
+        if item is _DONE:
+            return
+        yield item
+
+
+class UIQueue:
+    """
+    交给 UI 线程执行的消息队列
+
+    其他线程用 call() 投递，UI 线程循环调用 run_pending() 执行。
+    Tk 对象只能在创建它的线程中使用，所有界面操作都应经由这里。
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Tuple[Callable[..., Any], tuple]]" = queue.Queue()
+
+    def call(self, fn: Callable[..., Any], *args):
+        """投递 fn(*args)，立即返回"""
+        self._queue.put((fn, args))
+
+    def run_pending(self, timeout: float = 0.0) -> int:
+        """
+        执行已投递的任务（在 UI 线程中调用）
+
+        Args:
+            timeout: 队列为空时最多等待多久（秒）
+
+        Returns:
+            执行的任务数
+        """
+        count = 0
+        wait = timeout
+        while True:
+            try:
+                fn, args = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return count
+            wait = 0
+            count += 1
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"⚠️  界面更新失败: {e}")
+
+
+class TkUIThread(UIQueue):
+    """
+    唯一的 UI 线程：持有唯一的 Tk 根窗口，在 Tk 事件循环中定时执行队列中的调用
+
+    浮窗和模式选择窗口都挂在这个根窗口下。在 UI 线程内调用 call() 直接执行，
+    其他线程的调用排队等待下一次轮询。
+    """
+
+    def __init__(self, poll_ms: int = 10):
+        """
+        Args:
+            poll_ms: 检查消息队列的间隔（毫秒）
+        """
+        super().__init__()
+        self.poll_ms = poll_ms
+        self.root: Optional["tk.Tk"] = None  # 只能在 UI 线程中使用
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._interrupted = False
+
+    def in_ui_thread(self) -> bool:
+        return self._thread is threading.current_thread()
+
+    def call(self, fn: Callable[..., Any], *args):
+        """在 UI 线程中执行 fn(*args)（当前就在 UI 线程时立即执行）"""
+        if self.in_ui_thread() and self.root is not None:
+            fn(*args)
+        else:
+            super().call(fn, *args)
+
+    def run(self):
+        """在当前线程中创建根窗口并运行事件循环，直到 stop()（阻塞）"""
+        import tkinter as tk
+
+        self._thread = threading.current_thread()
+        self.root = tk.Tk()
+        self.root.withdraw()
+        self.root.report_callback_exception = self._report
+        self.root.after(0, self._poll)
+        self._ready.set()
+        try:
+            self.root.mainloop()
+        finally:
+            self.root.destroy()
+            self.root = None
+            self._thread = None
+        if self._interrupted:
+            raise KeyboardInterrupt
+
+    def start(self, timeout: float = 10.0) -> "TkUIThread":
+        """在后台线程中运行（供没有自己事件循环的调用方使用）"""
+        errors = []
+
+        def run():
+            try:
+                self.run()
+            except Exception as e:
+                errors.append(e)
+                self._ready.set()
+
+        threading.Thread(target=run, name="whatshouldicite-ui", daemon=True).start()
+        self._ready.wait(timeout)
+        if errors:
+            raise errors[0]
+        return self
+
+    def stop(self):
+        """结束事件循环（可在任意线程调用）"""
+        super().call(self._quit)
+
+    def _quit(self):
+        if self.root is not None:
+            self.root.quit()
+
+    def _poll(self):
+        self.run_pending()
+        if self.root is not None:
+            self.root.after(self.poll_ms, self._poll)
+
+    def _report(self, kind, value, traceback):
+        # Tk 回调中的 Ctrl+C 会被 tkinter 吞掉，这里结束事件循环后由 run() 重新抛出
+        if issubclass(kind, KeyboardInterrupt):
+            self._interrupted = True
+            self._quit()
+        else:
+            print(f"⚠️  界面回调失败: {value}")
+
+
+_default_ui: Optional[TkUIThread] = None
+_default_ui_lock = threading.Lock()
+
+
+def default_ui() -> TkUIThread:
+    """进程内共享的 UI 线程（第一次使用时在后台启动）"""
+    global _default_ui
+    with _default_ui_lock:
+        if _default_ui is None or _default_ui.root is None:
+            _default_ui = TkUIThread().start()
+        return _default_ui
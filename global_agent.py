@@ -3,34 +3,64 @@
 """
 
 import sys
-from typing import Optional
+import threading
+import time
+from functools import partial
+from typing import Callable, Optional
+from . import tracing, usage
 from .agent import CitationAgent
-from .global_service import GlobalHotkeyService, get_selected_text_windows
+from .dispatch import LatestWinsWorker, TkUIThread, iter_cancellable
+from .global_service import GlobalHotkeyService, get_selected_text
 from .popup_window import SimplePopupWindow
 from .mode_selector import ModeManager, AnalysisMode
 
 
 class GlobalCitationAgent:
-    """全局引用建议 Agent"""
+    """
+    全局引用建议 Agent
     
-    def __init__(self, hotkey: str = "ctrl+shift+c", llm_client=None, default_mode: AnalysisMode = AnalysisMode.RULE_BASED):
+    线程分工：快捷键钩子线程只投递任务；取词和分析在专用工作线程中执行，
+    新的触发取代尚未完成的旧任务（只显示最后一次的结果），Esc 取消；
+    主线程作为唯一的 UI 线程，浮窗和模式选择窗口只创建一次并反复显示。
+    """
+    
+    def __init__(
+        self,
+        hotkey: str = "ctrl+shift+c",
+        llm_client=None,
+        default_mode: AnalysisMode = AnalysisMode.RULE_BASED,
+        select_mode: bool = True,
+        popup=None,
+        text_source: Optional[Callable[[], Optional[str]]] = None
+    ):
         """
         Args:
             hotkey: 全局快捷键，默认 "ctrl+shift+c"
             llm_client: LLM 客户端（可选）
             default_mode: 默认分析模式
+            select_mode: 每次触发是否弹出模式选择窗口（False 时直接使用当前模式）
+            popup: 结果浮窗（默认 SimplePopupWindow）
+            text_source: 获取选中文本的函数（默认读取当前选区，Tk 读取方式使用本 Agent 的 UI 线程）
         """
         self.mode_manager = ModeManager(default_mode=default_mode)
         if llm_client:
             self.mode_manager.set_llm_client(llm_client)
+        self.ui = TkUIThread()
+        self.mode_manager.selector.callback = self._on_mode_selected
+        self.mode_manager.selector.ui = self.ui
         
         self.hotkey_service = GlobalHotkeyService(hotkey, self._on_hotkey_triggered)
-        self.popup = SimplePopupWindow()
+        self.hotkey_service.add_hotkey("esc", self.cancel)
+        self.popup = popup or SimplePopupWindow(self.ui)
+        self.select_mode = select_mode
+        self.text_source = text_source or partial(get_selected_text, self.ui)
+        self.worker = LatestWinsWorker()
         self.running = False
-        self.pending_text: Optional[str] = None  # 待分析的文本
+        self.pending_text: Optional[str] = None  # 等待选择模式的文本（只在 UI 线程读写）
+        self.keeper = None  # LLM 连接空闲保活
     
     def start(self):
-        """启动全局服务"""
+        """启动全局服务（阻塞，主线程作为 UI 线程）"""
         print("=" * 60)
         print("WhatShouldICite - 全局 Agent 服务")
         print("=" * 60)
@@ -43,79 +73,158 @@ class GlobalCitationAgent:
         print("     [2] LLM 判断（更准确，需要 API key）")
         print("     [3] 混合模式（先规则，不确定时用 LLM）")
         print("  4. 查看浮窗中的引用建议")
-        print("  5. 按 ESC 关闭浮窗")
+        print("  5. 按 ESC 取消分析 / 关闭浮窗")
         print("=" * 60)
         print()
         
+        try:
+            if tracing.enable_from_env():
+                print("📈 已开启分阶段追踪（WHATSHOULDICITE_TRACE）")
+        except Exception as e:
+            print(f"⚠️  追踪不可用: {e}")
+        
         self.running = True
         self.hotkey_service.start()
+        self._warmup()
         
-        # 保持程序运行
+        # 主线程运行 Tk 事件循环，执行其他线程投递的窗口操作
         try:
-            import keyboard
-            keyboard.wait()  # 等待直到程序退出
+            self.ui.run()
         except KeyboardInterrupt:
             self.stop()
         except Exception as e:
             print(f"运行错误: {e}")
             self.stop()
     
+    def _warmup(self):
+        """后台预热 LLM 连接，并在空闲时保持连接，避免第一次快捷键请求承担握手开销"""
+        from .llm_client import ConnectionKeeper
+        
+        def run():
+            start = time.perf_counter()
+            warmed = self.mode_manager.warmup()
+            if warmed:
+                print(f"🔥 LLM 连接已预热（{(time.perf_counter() - start) * 1000:.0f} ms）")
+        
+        threading.Thread(target=run, daemon=True).start()
+        if self.mode_manager.llm_client:
+            self.keeper = ConnectionKeeper(self.mode_manager.llm_client)
+            self.keeper.start()
+    
     def _on_hotkey_triggered(self):
-        """快捷键触发时的处理"""
+        """快捷键触发时的处理（快捷键钩子线程，只投递任务，立即返回）"""
         print("\n[快捷键触发] 正在获取选中文本...")
-        
-        # 获取选中文本
-        selected_text = get_selected_text_windows()
+        self.worker.submit(self._capture)
+    
+    def cancel(self):
+        """取消进行中的取词 / 分析（Esc），并关闭浮窗"""
+        if self.worker.cancel():
+            print("  ❌ 已取消")
+            self.ui.call(self.popup.hide)
+    
+    def _capture(self, cancel: threading.Event):
+        """获取选中文本（工作线程）"""
+        # Linux 读取 PRIMARY 选区，其他平台模拟复制并恢复剪贴板
+        start = time.perf_counter()
+        with tracing.span("selection.capture"):
+            selected_text = self.text_source()
+        print(f"  ⏱  获取选中文本 {(time.perf_counter() - start) * 1000:.0f} ms")
+        if cancel.is_set():
+            return
         
         if not selected_text:
             print("  ⚠️ 未检测到选中的文本")
-            self.popup.show("⚠️ 未检测到选中的文本\n\n请先选中一段文本，然后按快捷键。")
+            self.ui.call(self.popup.show, "⚠️ 未检测到选中的文本\n\n请先选中一段文本，然后按快捷键。")
             return
         
         print(f"  选中文本: {selected_text[:50]}...")
-        
-        # 保存待分析的文本
+        if self.select_mode:
+            self.ui.call(self._ask_mode, selected_text)
+        else:
+            self._analyze(selected_text, self.mode_manager.current_mode, cancel)
+    
+    def _ask_mode(self, selected_text: str):
+        """保存待分析的文本并显示模式选择窗口（UI 线程）"""
         self.pending_text = selected_text
-        
-        # 显示模式选择窗口
         print("  显示模式选择窗口...")
-        self.mode_manager.selector.callback = self._on_mode_selected
         self.mode_manager.show_selector()
     
     def _on_mode_selected(self, mode: Optional[AnalysisMode]):
-        """模式选择后的处理"""
+        """模式选择后的处理（UI 线程，分析交给工作线程）"""
         if not self.pending_text:
             return
         
+        selected_text = self.pending_text
+        self.pending_text = None
+        
         if mode is None:
             print("  ❌ 已取消")
             return
         
-        selected_text = self.pending_text
-        self.pending_text = None
-        
+        self.mode_manager.current_mode = mode
         print(f"  已选择模式: {mode.value}")
-        print("  正在分析...")
+        self.worker.submit(self._analyze, selected_text, mode)
+    
+    def _analyze(self, selected_text: str, mode: AnalysisMode, cancel: threading.Event):
+        """
+        按选择的模式分析文本（工作线程）
+        
+        LLM 结果流式显示：先出判断，再补全其余部分。取消后立即返回，不等在途的
+        下一帧；流随后被关闭（同时取消在途的 LLM 请求），已投递的旧帧由 UI 线程丢弃。
+        """
+        from .streaming import render_partial
         
-        # 根据选择的模式分析文本
+        print("  正在分析...")
+        start = time.perf_counter()
+        first_output = None
+        stream = self.mode_manager.stream_structured(selected_text, mode)
         try:
-            result = self.mode_manager.analyze_with_mode(selected_text)
-            print("  ✅ 分析完成，显示浮窗")
-            
-            # 显示结果浮窗
-            self.popup.show(result)
-            
+            with tracing.span("hotkey.analyze", mode=mode.value) as span, usage.labels(mode=mode.value):
+                for update in iter_cancellable(stream, cancel):
+                    first = first_output is None
+                    if first:
+                        first_output = time.perf_counter() - start
+                        span.set("first_output_ms", round(first_output * 1000, 1))
+                    self.ui.call(self._show_result, render_partial(update), first, cancel)
         except Exception as e:
+            if cancel.is_set():
+                return
             error_msg = f"❌ 分析失败\n\n错误信息：{str(e)}"
             print(f"  {error_msg}")
-            self.popup.show(error_msg)
+            self.ui.call(self._show_result, error_msg, True, cancel)
+            return
+        
+        if cancel.is_set():
+            return
+        print("  ✅ 分析完成，显示浮窗")
+        if first_output is not None:
+            print(f"  ⏱  首次显示 {first_output * 1000:.0f} ms，"
+                  f"全部完成 {(time.perf_counter() - start) * 1000:.0f} ms")
+        if self.mode_manager.llm_client:
+            stats = self.mode_manager.llm_client.latency_stats()
+            print(f"  ⏱  LLM 延迟: 本次 {stats['last_call_ms']} ms，"
+                  f"首个 token {stats['first_token_ms']} ms，"
+                  f"首次 {stats['first_call_ms']} ms，预热 {stats['warmup_ms']} ms")
+    
+    def _show_result(self, content: str, first: bool, cancel: threading.Event):
+        """显示分析结果（UI 线程）；任务已被取代或取消时丢弃"""
+        if cancel.is_set():
+            return
+        if first:
+            self.popup.show(content)
+        else:
+            self.popup.update_content(content)
     
     def stop(self):
         """停止服务"""
         print("\n正在停止服务...")
         self.running = False
         self.hotkey_service.stop()
+        self.worker.stop()
+        if self.keeper:
+            self.keeper.stop()
         self.popup.hide()
+        self.ui.stop()
         print("服务已停止")
 
 
@@ -129,11 +238,19 @@ def main():
         default="ctrl+shift+c",
         help="全局快捷键（默认: ctrl+shift+c）"
     )
+    parser.add_argument(
+        "--mode",
+        choices=[m.value for m in AnalysisMode],
+        help="固定使用该分析模式，触发后不再弹出模式选择窗口"
+    )
     
     args = parser.parse_args()
     
     try:
-        agent = GlobalCitationAgent(hotkey=args.hotkey)
+        if args.mode:
+            agent = GlobalCitationAgent(hotkey=args.hotkey, default_mode=AnalysisMode(args.mode), select_mode=False)
+        else:
+            agent = GlobalCitationAgent(hotkey=args.hotkey)
         agent.start()
     except KeyboardInterrupt:
         print("\n\n程序已退出")
@@ -2,22 +2,21 @@
 全局服务模块 - 实现跨应用的全局快捷键和浮窗
 """
 
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
 import threading
 import time
-from typing import Optional, Callable
-import sys
+from typing import Any, Callable, List, Optional
 
-try:
-    import keyboard
-    KEYBOARD_AVAILABLE = True
-except ImportError:
-    KEYBOARD_AVAILABLE = False
+from . import tracing
+from .dispatch import TkUIThread, default_ui
 
-try:
-    import pyperclip
-    CLIPBOARD_AVAILABLE = True
-except ImportError:
-    CLIPBOARD_AVAILABLE = False
+# 只检查是否安装，真正的导入推迟到第一次使用（keyboard 导入时会启动平台钩子）
+KEYBOARD_AVAILABLE = importlib.util.find_spec("keyboard") is not None
+CLIPBOARD_AVAILABLE = importlib.util.find_spec("pyperclip") is not None
 
 
 class GlobalHotkeyService:
@@ -33,6 +32,16 @@ class GlobalHotkeyService:
         self.callback = callback
         self.running = False
         self.hotkey_thread = None
+        self.extra_hotkeys: List[tuple] = []  # (组合键, 回调)，如 Esc 取消
+    
+    def add_hotkey(self, combo: str, callback: Callable):
+        """
+        注册附加的全局按键（不拦截按键，原应用照常收到）；服务已启动时立即生效
+        """
+        self.extra_hotkeys.append((combo, callback))
+        if self.running:
+            import keyboard
+            keyboard.add_hotkey(combo, callback, suppress=False)
     
     def start(self):
         """启动全局快捷键监听"""
@@ -45,11 +54,15 @@ class GlobalHotkeyService:
         if self.running:
             return
         
+        import keyboard
+        
         self.running = True
         
         def on_hotkey():
             try:
                 keyboard.add_hotkey(self.hotkey, self._on_triggered)
+                for combo, callback in self.extra_hotkeys:
+                    keyboard.add_hotkey(combo, callback, suppress=False)
                 keyboard.wait()  # 阻塞直到程序退出
             except Exception as e:
                 print(f"快捷键注册失败: {e}")
@@ -73,106 +86,282 @@ class GlobalHotkeyService:
         self.running = False
         if KEYBOARD_AVAILABLE:
             try:
+                import keyboard
                 keyboard.unhook_all()
             except:
                 pass
 
 
+def poll(
+    read: Callable[[], Any],
+    done: Callable[[Any], bool],
+    timeout: float = 0.5,
+    interval: float = 0.005,
+    max_interval: float = 0.05
+) -> Optional[Any]:
+    """
+    按指数退避轮询，直到 done(read()) 为真
+
+    剪贴板通常在几毫秒内更新，先密集轮询再逐步放慢，
+    比固定等待 100 ms 更快，也不会在慢的应用上过早放弃。
+
+    Returns:
+        满足条件时读到的值；超时返回 None
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        value = read()
+        if done(value):
+            return value
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+
+
+def send_copy_keystroke():
+    """模拟复制快捷键（macOS 为 Command+C，其他平台为 Ctrl+C）"""
+    try:
+        import pyautogui
+    except ImportError:
+        raise ImportError("pyautogui 模块未安装。请运行: pip install pyautogui")
+    pyautogui.hotkey("command" if sys.platform == "darwin" else "ctrl", "c")
+
+
+class PrimarySelectionReader:
+    """
+    读取 X11 / Wayland 的 PRIMARY 选区
+
+    在 Linux 桌面上，鼠标选中文本即写入 PRIMARY 选区，直接读取即可：
+    不模拟按键、不等待、不改动剪贴板。依次尝试 wl-paste（Wayland）、
+    xclip、xsel，都没有安装时在共享 UI 线程的根窗口上调用 Tk 的 selection_get。
+    """
+
+    def __init__(self, timeout: float = 0.5, ui: Optional[TkUIThread] = None):
+        """
+        Args:
+            timeout: 读取选区的超时（秒），选区所有者无响应时放弃
+            ui: Tk 读取方式所用的 UI 线程（None 则使用进程内共享的 UI 线程）
+        """
+        self.timeout = timeout
+        self.ui = ui
+        self.command = self._find_command()
+        self.backend = self.command[0] if self.command else "tk"
+
+    @staticmethod
+    def available() -> bool:
+        """当前是否在有 PRIMARY 选区的桌面会话中（且有可用的读取方式）"""
+        if sys.platform in ("win32", "darwin"):
+            return False
+        if not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+            return False
+        return PrimarySelectionReader._find_command() is not None or \
+            (bool(os.environ.get("DISPLAY")) and importlib.util.find_spec("tkinter") is not None)
+
+    @staticmethod
+    def _find_command() -> Optional[List[str]]:
+        if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-paste"):
+            return ["wl-paste", "--primary", "--no-newline"]
+        if os.environ.get("DISPLAY"):
+            if shutil.which("xclip"):
+                return ["xclip", "-o", "-selection", "primary"]
+            if shutil.which("xsel"):
+                return ["xsel", "--primary", "--output"]
+        return None
+
+    def read(self) -> Optional[str]:
+        """
+        读取当前选区
+
+        Returns:
+            选中的文本（去除首尾空白）；没有选区时返回 None
+        """
+        text = self._read_command() if self.command else self._read_tk()
+        text = text.strip() if text else ""
+        return text or None
+
+    def _read_command(self) -> Optional[str]:
+        try:
+            proc = subprocess.run(self.command, capture_output=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if proc.returncode != 0:
+            return None  # 没有选区所有者
+        return proc.stdout.decode("utf-8", errors="replace")
+
+    def _read_tk(self) -> Optional[str]:
+        # 不另建 Tk 根窗口：在 UI 线程中读取，其他线程投递后等待结果
+        if self.ui is None:
+            self.ui = default_ui()
+        if self.ui.in_ui_thread():
+            return self._selection_get(self.ui)
+        box: List[Optional[str]] = []
+        done = threading.Event()
+
+        def read():
+            try:
+                box.append(self._selection_get(self.ui))
+            finally:
+                done.set()
+
+        self.ui.call(read)
+        if not done.wait(self.timeout) or not box:
+            return None
+        return box[0]
+
+    @staticmethod
+    def _selection_get(ui: TkUIThread) -> Optional[str]:
+        import tkinter as tk
+
+        if ui.root is None:
+            return None
+        for kind in ("UTF8_STRING", "STRING"):
+            try:
+                return ui.root.selection_get(selection="PRIMARY", type=kind)
+            except tk.TclError:
+                continue
+        return None
+
+
 class ClipboardTextGetter:
-    """通过剪贴板获取选中文本"""
+    """
+    通过剪贴板获取选中文本（没有 PRIMARY 选区的平台使用）
+
+    先把剪贴板换成探测值，模拟复制按键后轮询剪贴板变化，读取后恢复原内容。
+    只能恢复文本内容（图片等其他格式会丢失）。
+    """
     
-    def __init__(self):
-        if not CLIPBOARD_AVAILABLE:
-            raise ImportError(
-                "pyperclip 模块未安装。请运行: pip install pyperclip"
-            )
+    def __init__(
+        self,
+        paste: Optional[Callable[[], str]] = None,
+        copy: Optional[Callable[[str], None]] = None,
+        send_keys: Optional[Callable[[], None]] = None,
+        timeout: float = 0.5
+    ):
+        """
+        Args:
+            paste / copy: 读写剪贴板（默认使用 pyperclip）
+            send_keys: 模拟复制按键（默认使用 pyautogui）
+            timeout: 等待剪贴板更新的最长时间（秒）
+        """
+        if paste is None or copy is None:
+            if not CLIPBOARD_AVAILABLE:
+                raise ImportError(
+                    "pyperclip 模块未安装。请运行: pip install pyperclip"
+                )
+            import pyperclip
+            paste = paste or pyperclip.paste
+            copy = copy or pyperclip.copy
+        self.paste = paste
+        self.copy = copy
+        self.send_keys = send_keys or send_copy_keystroke
+        self.timeout = timeout
     
     def get_selected_text(self) -> Optional[str]:
         """
         获取当前选中的文本
         
-        方法：模拟 Ctrl+C，然后从剪贴板读取
-        注意：这会覆盖剪贴板内容
+        方法：模拟复制按键，轮询剪贴板直到内容变化，然后恢复原剪贴板
         
         Returns:
             选中的文本，如果没有选中则返回 None
         """
         try:
-            # 保存当前剪贴板内容
-            old_clipboard = pyperclip.paste()
-            
-            # 模拟 Ctrl+C
+            old_clipboard = self.paste()
+            # 探测值保证“选中内容恰好与原剪贴板相同”时也能检测到复制
+            probe = f"whatshouldicite-probe-{time.monotonic_ns()}"
+            self.copy(probe)
             try:
-                import pyautogui
-                pyautogui.hotkey('ctrl', 'c')
-            except ImportError:
-                raise ImportError("pyautogui 模块未安装。请运行: pip install pyautogui")
-            
-            # 等待剪贴板更新
-            time.sleep(0.1)
-            
-            # 读取剪贴板
-            selected_text = pyperclip.paste()
-            
-            # 如果内容没变，说明没有选中文本
-            if selected_text == old_clipboard:
-                return None
-            
-            # 恢复剪贴板（可选）
-            # pyperclip.copy(old_clipboard)
-            
-            return selected_text.strip() if selected_text else None
+                self.send_keys()
+                selected_text = poll(self.paste, lambda value: value != probe, self.timeout)
+            finally:
+                self.copy(old_clipboard or "")
+            return selected_text.strip() if selected_text and selected_text.strip() else None
             
         except Exception as e:
             print(f"获取选中文本失败: {e}")
             return None
 
 
+def _win_read_text() -> Optional[str]:
+    import win32clipboard
+    import win32con
+    
+    win32clipboard.OpenClipboard()
+    try:
+        if win32clipboard.IsClipboardFormatAvailable(win32con.CF_UNICODETEXT):
+            return win32clipboard.GetClipboardData(win32con.CF_UNICODETEXT)
+        return None
+    finally:
+        win32clipboard.CloseClipboard()
+
+
+def _win_write_text(text: str):
+    import win32clipboard
+    import win32con
+    
+    win32clipboard.OpenClipboard()
+    try:
+        win32clipboard.EmptyClipboard()
+        win32clipboard.SetClipboardData(win32con.CF_UNICODETEXT, text)
+    finally:
+        win32clipboard.CloseClipboard()
+
+
 def get_selected_text_windows() -> Optional[str]:
     """
-    Windows 专用：使用 Windows API 获取选中文本（不依赖剪贴板）
+    Windows 专用：模拟 Ctrl+C，按剪贴板序列号判断复制是否完成，读取后恢复原剪贴板
     
-    需要 pywin32
+    需要 pywin32（未安装时改用 ClipboardTextGetter）
     """
     try:
         import win32clipboard
-        import win32con
-        
-        # 保存当前剪贴板
-        win32clipboard.OpenClipboard()
-        try:
-            old_data = win32clipboard.GetClipboardData()
-        except:
-            old_data = None
-        win32clipboard.CloseClipboard()
-        
-        # 模拟 Ctrl+C
-        try:
-            import pyautogui
-            pyautogui.hotkey('ctrl', 'c')
-        except ImportError:
-            # 如果没有 pyautogui，使用 pyperclip 方法
-            getter = ClipboardTextGetter()
-            return getter.get_selected_text()
-        
-        time.sleep(0.1)
-        
-        # 读取剪贴板
-        win32clipboard.OpenClipboard()
-        try:
-            text = win32clipboard.GetClipboardData(win32con.CF_UNICODETEXT)
-        except:
-            text = None
-        win32clipboard.CloseClipboard()
-        
-        if text and text != old_data:
-            return text.strip()
-        return None
-        
     except ImportError:
-        # 如果没有 pywin32，使用 pyperclip
-        getter = ClipboardTextGetter()
-        return getter.get_selected_text()
+        return ClipboardTextGetter().get_selected_text()
+    
+    try:
+        old_text = _win_read_text()
+        sequence = win32clipboard.GetClipboardSequenceNumber()
+        send_copy_keystroke()
+        # 序列号变化说明目标程序已写入剪贴板，无需探测值
+        if poll(win32clipboard.GetClipboardSequenceNumber, lambda value: value != sequence) is None:
+            return None
+        text = poll(_win_read_text, lambda value: value is not None, timeout=0.1)
+        if old_text is not None:
+            _win_write_text(old_text)
+        return text.strip() if text and text.strip() else None
+        
     except Exception as e:
         print(f"获取选中文本失败: {e}")
         return None
+
+
+_primary_reader: Optional[PrimarySelectionReader] = None
+
+
+def get_selected_text(ui: Optional[TkUIThread] = None) -> Optional[str]:
+    """
+    获取当前选中的文本
+
+    Linux 桌面直接读取 PRIMARY 选区；Windows / macOS（或没有可用的选区读取方式时）
+    模拟复制按键，读取后恢复剪贴板。所用方式记录在当前追踪 span 的 backend 属性中。
+
+    Args:
+        ui: PRIMARY 选区 Tk 读取方式所用的 UI 线程（None 则使用进程内共享的 UI 线程）
+    """
+    global _primary_reader
+    
+    span = tracing.current_span()
+    if PrimarySelectionReader.available():
+        if _primary_reader is None:
+            _primary_reader = PrimarySelectionReader(ui=ui)
+        elif ui is not None:
+            _primary_reader.ui = ui
+        span.set("backend", f"primary:{_primary_reader.backend}")
+        return _primary_reader.read()
+    if sys.platform == "win32":
+        span.set("backend", "clipboard:win32")
+        return get_selected_text_windows()
+    span.set("backend", "clipboard")
+    return ClipboardTextGetter().get_selected_text()
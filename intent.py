@@ -2,8 +2,20 @@
 Citation Intent Classifier - 分类引用意图
 """
 
-from typing import Dict, Any, Optional
-from .analyzer import TextAnalyzer
+from typing import Dict, Any, Optional, Union
+from .analyzer import TextAnalyzer, AnalysisContext
+
+
+# 常识判断模式（不需要引用）
+COMMON_KNOWLEDGE_PATTERNS = (
+    "it is well known", "it is well-known", "well known that",
+    "as we all know", "as everyone knows", "as is known",
+    "obviously", "clearly", "it is clear that", "it is clear",
+    "it is obvious", "it is evident", "evidently",
+    "common sense", "common knowledge", "widely known",
+    "universally accepted", "generally accepted",
+    "water boils at", "the sun rises", "gravity", "earth is round"
+)
 
 
 class CitationIntentClassifier:
@@ -14,44 +26,40 @@ class CitationIntentClassifier:
         Args:
             llm_client: LLM 客户端（可选，如果为 None 则使用规则判断）
         """
+        if llm_client is not None:
+            from .llm_client import as_unified_client
+            
+            # 只包装一次，各次调用共享同一个客户端及其结果缓存
+            llm_client = as_unified_client(llm_client)
         self.llm_client = llm_client
         self.analyzer = TextAnalyzer()
     
-    def classify(self, text: str) -> Dict[str, Any]:
+    def classify(self, text: Union[str, AnalysisContext]) -> Dict[str, Any]:
         """
         分类引用意图
         
         Args:
-            text: 选中的文本
+            text: 选中的文本（或已构建的分析上下文）
         
         Returns:
             包含分类结果的字典
         """
-        analysis = self.analyzer.analyze(text)
+        context = self.analyzer.build_context(text)
         
-        # 如果提供了 LLM 客户端，使用 LLM 分类
+        # 如果提供了 LLM 客户端，使用 LLM 分类（不计算规则特征）
         if self.llm_client:
-            return self._classify_with_llm(text)
+            return self._classify_with_llm(context.text)
         
         # 否则使用规则判断
-        return self._classify_with_rules(analysis)
+        return self._classify_with_rules(context)
     
-    def _classify_with_rules(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    def _classify_with_rules(self, context: AnalysisContext) -> Dict[str, Any]:
         """基于规则的分类（增强版，更专业更学术）"""
-        text = analysis["text"].lower()
+        text = context.text_lower
+        analysis = context.features
         
         # 1. 常识判断（不需要引用）- 扩展模式
-        common_knowledge_patterns = [
-            "it is well known", "it is well-known", "well known that",
-            "as we all know", "as everyone knows", "as is known",
-            "obviously", "clearly", "it is clear that", "it is clear",
-            "it is obvious", "it is evident", "evidently",
-            "common sense", "common knowledge", "widely known",
-            "universally accepted", "generally accepted",
-            "water boils at", "the sun rises", "gravity", "earth is round"
-        ]
-        
-        if any(pattern in text for pattern in common_knowledge_patterns):
+        if any(pattern in text for pattern in COMMON_KNOWLEDGE_PATTERNS):
             return {
                 "intent": "common_knowledge",
                 "needs_citation": "No",
@@ -138,12 +146,4 @@ class CitationIntentClassifier:
     
     def _classify_with_llm(self, text: str) -> Dict[str, Any]:
         """使用 LLM 分类"""
-        from .llm_client import UnifiedLLMClient
-        
-        if not isinstance(self.llm_client, UnifiedLLMClient):
-            # 如果不是 UnifiedLLMClient，尝试包装
-            unified_client = UnifiedLLMClient(self.llm_client)
-        else:
-            unified_client = self.llm_client
-        
-        return unified_client.classify_intent(text)
+        return self.llm_client.classify_intent(text)
@@ -2,10 +2,9 @@
 Keyword Generator - 生成检索关键词
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 import re
-from .analyzer import TextAnalyzer
-from .planner import CitationTypePlanner
+from .analyzer import TextAnalyzer, AnalysisContext
 
 
 class KeywordGenerator:
@@ -16,35 +15,38 @@ class KeywordGenerator:
         Args:
             llm_client: LLM 客户端（可选）
         """
+        if llm_client is not None:
+            from .llm_client import as_unified_client
+            llm_client = as_unified_client(llm_client)
         self.llm_client = llm_client
         self.analyzer = TextAnalyzer()
-        self.planner = CitationTypePlanner(llm_client)
     
-    def generate(self, text: str, citation_types: List[str]) -> List[str]:
+    def generate(self, text: Union[str, AnalysisContext], citation_types: List[str]) -> List[str]:
         """
         生成检索关键词
         
         Args:
-            text: 选中的文本
+            text: 选中的文本（或已构建的分析上下文）
             citation_types: 引用类型列表
         
         Returns:
             关键词列表
         """
+        context = self.analyzer.build_context(text)
+        
         # 如果提供了 LLM 客户端，使用 LLM 生成
         if self.llm_client:
-            return self._generate_with_llm(text, citation_types)
+            return self._generate_with_llm(context.text, citation_types)
         
         # 否则使用规则生成
-        return self._generate_with_rules(text, citation_types)
+        return self._generate_with_rules(context, citation_types)
     
-    def _generate_with_rules(self, text: str, citation_types: List[str]) -> List[str]:
+    def _generate_with_rules(self, context: AnalysisContext, citation_types: List[str]) -> List[str]:
         """基于规则的关键词生成"""
-        analysis = self.analyzer.analyze(text)
         keywords = []
         
         # 提取名词短语（简单规则）
-        words = text.lower().split()
+        words = context.tokens
         
         # 移除停用词
         stop_words = {
@@ -89,7 +91,7 @@ class KeywordGenerator:
                 keywords.extend(["reinforcement learning", "rl algorithms"])
         
         # 基于文本内容提取领域关键词
-        text_lower = text.lower()
+        text_lower = context.text_lower
         domain_keywords_map = {
             "machine learning": ["machine learning", "ml methods"],
             "artificial intelligence": ["artificial intelligence", "ai methods"],
@@ -112,11 +114,4 @@ class KeywordGenerator:
     
     def _generate_with_llm(self, text: str, citation_types: List[str]) -> List[str]:
         """使用 LLM 生成"""
-        from .llm_client import UnifiedLLMClient
-        
-        if not isinstance(self.llm_client, UnifiedLLMClient):
-            unified_client = UnifiedLLMClient(self.llm_client)
-        else:
-            unified_client = self.llm_client
-        
-        return unified_client.generate_keywords(text, citation_types)
+        return self.llm_client.generate_keywords(text, citation_types)
@@ -2,10 +2,104 @@
 LLM 客户端抽象层 - 支持多种大模型
 """
 
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Iterator
 from abc import ABC, abstractmethod
+import copy
 import json
 import re
+import threading
+import time
+from .cache import LRUCache, DiskCache, make_cache_key, template_fingerprint
+from .utils import clean_text
+from . import tracing, usage
+
+
+BATCH_ITEM_TOKENS = 150  # 批量分析中每句结果预留的输出 token 数
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（约 4 个字符 1 个 token，不依赖分词器）"""
+    return len(text) // 4 + 1
+
+
+def pack_batches(texts: List[str], max_batch: int, token_budget: int) -> List[List[int]]:
+    """
+    按句子数和 token 预算把文本分组
+    
+    Returns:
+        每组为 texts 中的下标列表；单句超出预算时独占一组
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_batch or used + tokens > token_budget):
+            batches.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+HTTP_KEEPALIVE = 300.0  # 空闲连接保留时间（秒）；SDK 默认 5 秒即关闭
+
+
+def pooled_http_client():
+    """
+    创建长连接 HTTP 会话，供 SDK 客户端复用（httpx 不可用时返回 None，使用 SDK 默认值）
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=20,
+            max_keepalive_connections=10,
+            keepalive_expiry=HTTP_KEEPALIVE
+        ),
+        timeout=httpx.Timeout(60.0, connect=10.0)
+    )
+
+
+class LLMError(Exception):
+    """LLM 调用失败"""
+
+
+class RetryableLLMError(LLMError):
+    """可重试的 LLM 调用失败（限流、服务端错误、连接中断、超时）"""
+
+
+class LLMTimeoutError(RetryableLLMError):
+    """LLM 调用超时或截止时间耗尽"""
+
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+_RETRYABLE_ERRORS = {"APIConnectionError", "RateLimitError", "InternalServerError", "OverloadedError"}
+
+
+def wrap_sdk_error(provider: str, error: Exception) -> LLMError:
+    """
+    把 SDK 抛出的异常转换为带类型的 LLMError
+    
+    Args:
+        provider: 提供方名称（用于错误信息）
+        error: SDK 异常
+    """
+    if isinstance(error, LLMError):
+        return error
+    message = f"{provider} API 调用失败: {error}"
+    name = type(error).__name__
+    if "Timeout" in name or isinstance(error, TimeoutError):
+        return LLMTimeoutError(message)
+    if (name in _RETRYABLE_ERRORS
+            or getattr(error, "status_code", None) in _RETRYABLE_STATUS
+            or isinstance(error, ConnectionError)):
+        return RetryableLLMError(message)
+    return LLMError(message)
 
 
 class LLMClient(ABC):
@@ -13,18 +107,50 @@ class LLMClient(ABC):
     
     @abstractmethod
     def complete(self, prompt: str, **kwargs) -> str:
-        """完成文本生成"""
+        """
+        完成文本生成
+        
+        常用参数：temperature、max_tokens、timeout（秒）；json_mode=True 时要求模型只输出 JSON 对象
+        
+        Raises:
+            LLMError: 调用失败；RetryableLLMError 表示可以重试
+        """
         pass
+    
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """
+        流式生成，逐段产出 token
+        
+        默认实现一次性返回完整结果；支持流式的客户端应覆盖此方法。
+        """
+        yield self.complete(prompt, **kwargs)
+    
+    def warmup(self) -> bool:
+        """
+        预热连接（完成 DNS、TLS 握手），不消耗 token
+        
+        Returns:
+            是否成功预热（默认实现无需预热，返回 False）
+        """
+        return False
 
 
 class OpenAIClient(LLMClient):
     """OpenAI API 客户端"""
     
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-3.5-turbo",
+        max_retries: int = 2,
+        base_url: Optional[str] = None
+    ):
         """
         Args:
             api_key: OpenAI API key
             model: 模型名称，默认 gpt-3.5-turbo
+            max_retries: SDK 内置重试次数（外层使用 ResilientLLMClient 时设为 0）
+            base_url: OpenAI 兼容服务地址（如本地回放服务），默认官方 API
         """
         try:
             from openai import OpenAI
@@ -33,11 +159,30 @@ class OpenAIClient(LLMClient):
                 "OpenAI SDK 未安装。请运行: pip install openai"
             )
         
-        self.client = OpenAI(api_key=api_key)
+        http_client = pooled_http_client()
+        if http_client is not None:
+            self.client = OpenAI(api_key=api_key, max_retries=max_retries,
+                                 base_url=base_url, http_client=http_client)
+        else:
+            self.client = OpenAI(api_key=api_key, max_retries=max_retries, base_url=base_url)
         self.model = model
     
+    def warmup(self) -> bool:
+        """请求模型信息接口，建立并保持到 API 的连接"""
+        try:
+            self.client.models.retrieve(self.model)
+            return True
+        except Exception:
+            return False
+    
     def complete(self, prompt: str, **kwargs) -> str:
         """调用 OpenAI API"""
+        extra = {}
+        if kwargs.get("json_mode"):
+            # JSON 模式：服务端保证输出为合法 JSON 对象
+            extra["response_format"] = {"type": "json_object"}
+        if kwargs.get("timeout") is not None:
+            extra["timeout"] = kwargs["timeout"]
         try:
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -46,21 +191,57 @@ class OpenAIClient(LLMClient):
                     {"role": "user", "content": prompt}
                 ],
                 temperature=kwargs.get("temperature", 0.3),
-                max_tokens=kwargs.get("max_tokens", 500)
+                max_tokens=kwargs.get("max_tokens", 500),
+                **extra
             )
+            usage.report_sdk_usage("openai", self.model, getattr(response, "usage", None))
             return response.choices[0].message.content.strip()
         except Exception as e:
-            raise Exception(f"OpenAI API 调用失败: {e}")
+            raise wrap_sdk_error("OpenAI", e) from e
+    
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """流式调用 OpenAI API"""
+        extra = {}
+        if kwargs.get("json_mode"):
+            extra["response_format"] = {"type": "json_object"}
+        if kwargs.get("timeout") is not None:
+            extra["timeout"] = kwargs["timeout"]
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful research assistant."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=kwargs.get("temperature", 0.3),
+                max_tokens=kwargs.get("max_tokens", 500),
+                stream=True,
+                # 最后一个 chunk 带本次请求的 usage
+                stream_options={"include_usage": True},
+                **extra
+            )
+            try:
+                for chunk in response:
+                    if getattr(chunk, "usage", None) is not None:
+                        usage.report_sdk_usage("openai", self.model, chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # 调用方提前停止读取（如取消）时关闭连接
+                response.close()
+        except Exception as e:
+            raise wrap_sdk_error("OpenAI", e) from e
 
 
 class AnthropicClient(LLMClient):
     """Anthropic Claude API 客户端"""
     
-    def __init__(self, api_key: str, model: str = "claude-3-haiku-20240307"):
+    def __init__(self, api_key: str, model: str = "claude-3-haiku-20240307", max_retries: int = 2):
         """
         Args:
             api_key: Anthropic API key
             model: 模型名称，默认 claude-3-haiku-20240307
+            max_retries: SDK 内置重试次数（外层使用 ResilientLLMClient 时设为 0）
         """
         try:
             import anthropic
@@ -69,110 +250,264 @@ class AnthropicClient(LLMClient):
                 "Anthropic SDK 未安装。请运行: pip install anthropic"
             )
         
-        self.client = anthropic.Anthropic(api_key=api_key)
+        http_client = pooled_http_client()
+        if http_client is not None:
+            self.client = anthropic.Anthropic(api_key=api_key, max_retries=max_retries, http_client=http_client)
+        else:
+            self.client = anthropic.Anthropic(api_key=api_key, max_retries=max_retries)
         self.model = model
     
+    def warmup(self) -> bool:
+        """请求模型信息接口，建立并保持到 API 的连接"""
+        models = getattr(self.client, "models", None)
+        if models is None:
+            return False
+        try:
+            models.retrieve(self.model)
+            return True
+        except Exception:
+            return False
+    
     def complete(self, prompt: str, **kwargs) -> str:
         """调用 Anthropic API"""
+        messages = [{"role": "user", "content": prompt}]
+        prefill = ""
+        if kwargs.get("json_mode"):
+            # JSON 模式：预填充助手回复的开头，迫使模型直接输出 JSON 对象
+            prefill = "{"
+            messages.append({"role": "assistant", "content": prefill})
+        extra = {}
+        if kwargs.get("timeout") is not None:
+            extra["timeout"] = kwargs["timeout"]
         try:
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=kwargs.get("max_tokens", 500),
                 temperature=kwargs.get("temperature", 0.3),
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                messages=messages,
+                **extra
             )
-            return response.content[0].text.strip()
+            usage.report_sdk_usage("anthropic", self.model, getattr(response, "usage", None))
+            return (prefill + response.content[0].text).strip()
         except Exception as e:
-            raise Exception(f"Anthropic API 调用失败: {e}")
+            raise wrap_sdk_error("Anthropic", e) from e
+    
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """流式调用 Anthropic API"""
+        messages = [{"role": "user", "content": prompt}]
+        prefill = ""
+        if kwargs.get("json_mode"):
+            # 与 complete 相同：预填充 "{"，并把它作为第一段输出
+            prefill = "{"
+            messages.append({"role": "assistant", "content": prefill})
+        extra = {}
+        if kwargs.get("timeout") is not None:
+            extra["timeout"] = kwargs["timeout"]
+        try:
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=kwargs.get("max_tokens", 500),
+                temperature=kwargs.get("temperature", 0.3),
+                messages=messages,
+                **extra
+            ) as response:
+                if prefill:
+                    yield prefill
+                for text in response.text_stream:
+                    yield text
+                usage.report_sdk_usage("anthropic", self.model, response.get_final_message().usage)
+        except Exception as e:
+            raise wrap_sdk_error("Anthropic", e) from e
 
 
-class UnifiedLLMClient:
-    """统一的 LLM 客户端接口"""
+class CachedLLMClient(LLMClient):
+    """
+    带持久化缓存的 LLM 客户端包装器
+
+    complete 的结果按 (提示词, 模型, 生成参数) 的哈希存入磁盘缓存，
+    服务重启后仍可复用。
+    """
     
-    def __init__(self, client: LLMClient):
+    def __init__(self, client: LLMClient, cache: Optional[DiskCache] = None):
         """
         Args:
-            client: LLM 客户端实例（OpenAIClient 或 AnthropicClient）
+            client: 被包装的 LLM 客户端
+            cache: 磁盘缓存（默认使用用户数据目录下的缓存文件）
         """
         self.client = client
+        self.cache = cache if cache is not None else DiskCache()
     
-    def analyze_citation(self, text: str) -> Dict[str, Any]:
-        """
-        使用 LLM 分析引用需求
-        
-        Returns:
-            包含分析结果的字典
-        """
-        from .prompts import ANALYZE_PROMPT
-        
-        prompt = ANALYZE_PROMPT.format(selected_text=text)
-        
-        try:
-            response = self.client.complete(prompt)
-            return self._parse_analysis_response(response, text)
-        except Exception as e:
-            # 如果 LLM 调用失败，返回错误信息
-            return {
-                "needs_citation": "Optional",
-                "reason": f"LLM 分析失败: {str(e)}",
-                "citation_types": [],
-                "keywords": [],
-                "intent": "unknown",
-                "error": str(e)
-            }
+    @property
+    def model(self) -> str:
+        return getattr(self.client, "model", type(self.client).__name__)
     
-    def classify_intent(self, text: str) -> Dict[str, Any]:
-        """使用 LLM 分类引用意图"""
-        from .prompts import INTENT_CLASSIFY_PROMPT
-        
-        prompt = INTENT_CLASSIFY_PROMPT.format(text=text)
-        
-        try:
-            response = self.client.complete(prompt, max_tokens=50)
-            intent = self._parse_intent(response)
-            
-            # 根据意图判断是否需要引用
-            needs_citation = self._intent_to_citation_need(intent)
-            
-            return {
-                "intent": intent,
-                "needs_citation": needs_citation,
-                "confidence": 0.9  # LLM 判断置信度较高
-            }
-        except Exception as e:
-            return {
-                "intent": "unknown",
-                "needs_citation": "Optional",
-                "confidence": 0.5,
-                "error": str(e)
-            }
+    def _key(self, prompt: str, kwargs: Dict[str, Any]) -> str:
+        # 超时、截止时间不影响输出内容，不参与缓存键
+        params = {k: v for k, v in kwargs.items() if k not in ("timeout", "deadline")}
+        return make_cache_key(prompt, self.model, **params)
     
-    def plan_citation_types(self, text: str, intent: str) -> List[str]:
-        """使用 LLM 规划引用类型"""
-        from .prompts import PLANNER_PROMPT
+    def complete(self, prompt: str, **kwargs) -> str:
+        """优先读取缓存，未命中时调用被包装的客户端"""
+        key = self._key(prompt, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            usage.report_cache_hit()
+            return cached
         
-        prompt = PLANNER_PROMPT.format(text=text, intent=intent)
+        response = self.client.complete(prompt, **kwargs)
+        self.cache.put(key, response)
+        return response
+    
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """命中缓存时一次性返回，否则边转发边累积，完整结束后写入缓存"""
+        key = self._key(prompt, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            usage.report_cache_hit()
+            yield cached
+            return
         
-        try:
-            response = self.client.complete(prompt, max_tokens=200)
-            return self._parse_citation_types(response)
-        except Exception as e:
-            return []
+        chunks = []
+        for chunk in self.client.stream(prompt, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        self.cache.put(key, "".join(chunks).strip())
     
-    def generate_keywords(self, text: str, citation_types: List[str]) -> List[str]:
-        """使用 LLM 生成关键词"""
-        from .prompts import KEYWORD_PROMPT
+    def warmup(self) -> bool:
+        return self.client.warmup()
+
+
+_SHARED_CLIENTS: Dict[tuple, LLMClient] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_client(
+    provider: str,
+    api_key: str,
+    model: Optional[str] = None,
+    max_retries: int = 2
+) -> LLMClient:
+    """
+    获取进程内共享的 LLM 客户端（同一 provider / key / 模型只创建一次）
+    
+    SDK 客户端本身是线程安全的，共享后所有调用复用同一个连接池。
+    
+    Args:
+        provider: "openai" 或 "anthropic"
+        api_key: API key
+        model: 模型名称（默认使用各客户端的默认模型）
+        max_retries: SDK 内置重试次数
+    """
+    key = (provider, api_key, model, max_retries)
+    with _SHARED_LOCK:
+        client = _SHARED_CLIENTS.get(key)
+        if client is None:
+            classes = {"openai": OpenAIClient, "anthropic": AnthropicClient}
+            if provider not in classes:
+                raise ValueError(f"未知的 LLM provider: {provider}")
+            kwargs = {"model": model} if model else {}
+            client = classes[provider](api_key=api_key, max_retries=max_retries, **kwargs)
+            _SHARED_CLIENTS[key] = client
+        return client
+
+
+def as_unified_client(client: Optional[Any]) -> Optional["UnifiedLLMClient"]:
+    """把 LLM 客户端包装为 UnifiedLLMClient（已是则原样返回）"""
+    if client is None or isinstance(client, UnifiedLLMClient):
+        return client
+    return UnifiedLLMClient(client)
+
+
+class LLMResponseParser:
+    """
+    LLM 响应解析与结果缓存
+    
+    同步 UnifiedLLMClient 与异步 AsyncUnifiedLLMClient 共用；子类需设置 self.client 和 self.cache。
+    """
+    
+    # 支持的意图类型
+    INTENTS = (
+        "factual_claim", "method_technique", "comparison", "survey_review",
+        "foundational_work", "recent_advance", "theoretical_claim",
+        "common_knowledge", "unknown"
+    )
+    
+    client: Any = None
+    cache: Optional[LRUCache] = None
+    
+    @staticmethod
+    def _make_cache(cache: Optional[LRUCache], use_cache: bool) -> Optional[LRUCache]:
+        """默认创建 256 条、1 小时过期的 LRU 缓存"""
+        if not use_cache:
+            return None
+        return cache if cache is not None else LRUCache(maxsize=256, ttl=3600)
+    
+    def _cache_key(self, operation: str, template: str, *inputs: Any, **params: Any) -> str:
+        """缓存键：操作名 + 归一化输入 + 模板指纹 + 模型名 + 生成参数"""
+        model = getattr(self.client, "model", type(self.client).__name__)
+        normalized = [clean_text(x) if isinstance(x, str) else x for x in inputs]
+        return make_cache_key(operation, template_fingerprint(template), model, *normalized, **params)
+    
+    def _cache_get(self, key: str) -> Any:
+        if self.cache is None:
+            return None
+        value = self.cache.get(key)
+        tracing.current_span().set("cache_hit", value is not None)
+        # 返回副本，避免调用方修改缓存内容
+        return copy.deepcopy(value) if value is not None else None
+    
+    def _cache_put(self, key: str, value: Any):
+        if self.cache is not None:
+            self.cache.put(key, copy.deepcopy(value))
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def _citation_type_str(self, citation_types: List[str]) -> str:
+        """关键词提示词中的引用类型描述"""
+        return "\n".join(citation_types) if citation_types else "General research"
+    
+    def _intent_result(self, response: str) -> Dict[str, Any]:
+        """把意图分类响应转为结果字典"""
+        intent = self._parse_intent(response)
         
-        citation_type_str = "\n".join(citation_types) if citation_types else "General research"
-        prompt = KEYWORD_PROMPT.format(text=text, citation_type=citation_type_str)
+        # 根据意图判断是否需要引用
+        needs_citation = self._intent_to_citation_need(intent)
         
-        try:
-            response = self.client.complete(prompt, max_tokens=150)
-            return self._parse_keywords(response)
-        except Exception as e:
-            return []
+        return {
+            "intent": intent,
+            "needs_citation": needs_citation,
+            "confidence": 0.9  # LLM 判断置信度较高
+        }
+    
+    def _intent_fallback(self, error: BaseException) -> Dict[str, Any]:
+        """意图分类失败时的结果"""
+        return {
+            "intent": "unknown",
+            "needs_citation": "Optional",
+            "confidence": 0.5,
+            "error": str(error),
+            "error_type": type(error).__name__
+        }
+    
+    def _analysis_fallback(self, error: BaseException) -> Dict[str, Any]:
+        """完整分析失败时的结果"""
+        return {
+            "needs_citation": "Optional",
+            "reason": f"LLM 分析失败: {str(error)}",
+            "citation_types": [],
+            "keywords": [],
+            "intent": "unknown",
+            "error": str(error),
+            "error_type": type(error).__name__
+        }
+    
+    def _structured_fallback(self, error: BaseException) -> Dict[str, Any]:
+        """结构化分析失败时的结果"""
+        result = self._analysis_fallback(error)
+        result["confidence"] = 0.5
+        return result
     
     def _parse_analysis_response(self, response: str, text: str) -> Dict[str, Any]:
         """解析完整的分析响应"""
@@ -191,6 +526,86 @@ class UnifiedLLMClient:
             "intent": intent
         }
     
+    def _parse_structured_response(self, response: str) -> Dict[str, Any]:
+        """
+        解析 JSON 格式的完整分析响应
+        
+        Raises:
+            ValueError: 响应中没有合法的 JSON 对象
+        """
+        body = response.strip()
+        # 兼容 ```json ... ``` 包裹和前后多余文字
+        start = body.find("{")
+        end = body.rfind("}")
+        if start == -1 or end <= start:
+            raise ValueError("响应中没有 JSON 对象")
+        data = json.loads(body[start:end + 1])
+        if not isinstance(data, dict):
+            raise ValueError("JSON 顶层不是对象")
+        return self._structured_from_dict(data)
+    
+    def _structured_from_dict(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """把模型输出的 JSON 对象规范化为结构化结果"""
+        needs_citation = str(data.get("needs_citation", "Optional")).strip().capitalize()
+        if needs_citation not in ("Yes", "No", "Optional"):
+            needs_citation = "Optional"
+        
+        intent = str(data.get("intent", "unknown")).strip().lower().replace(" ", "_")
+        if intent not in self.INTENTS:
+            intent = self._parse_intent(intent)
+        
+        def as_list(value: Any) -> List[str]:
+            if isinstance(value, str):
+                value = [value]
+            if not isinstance(value, list):
+                return []
+            return [str(v).strip().strip('"') for v in value if str(v).strip()][:5]
+        
+        citation_types = as_list(data.get("citation_types"))
+        keywords = as_list(data.get("keywords"))
+        if needs_citation == "No":
+            citation_types, keywords = [], []
+        
+        return {
+            "needs_citation": needs_citation,
+            "reason": str(data.get("reason") or "需要进一步分析").strip(),
+            "intent": intent,
+            "confidence": 0.9,  # LLM 判断置信度较高
+            "citation_types": citation_types,
+            "keywords": keywords
+        }
+    
+    def _parse_batch_response(self, response: str) -> Dict[int, Dict[str, Any]]:
+        """
+        解析批量分析响应
+        
+        Returns:
+            句子编号 -> 结构化结果；缺失的编号（如输出被截断）不在其中
+        
+        Raises:
+            ValueError: 响应不是合法的 JSON（通常意味着输出被截断）
+        """
+        body = response.strip()
+        start = body.find("{")
+        end = body.rfind("}")
+        if start == -1 or end <= start:
+            raise ValueError("响应中没有 JSON 对象")
+        data = json.loads(body[start:end + 1])
+        items = data.get("results") if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            raise ValueError("JSON 中没有 results 数组")
+        
+        results = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                item_id = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            results[item_id] = self._structured_from_dict(item)
+        return results
+    
     def _extract_citation_need(self, response: str) -> str:
         """提取是否需要引用"""
         response_lower = response.lower()
@@ -296,6 +711,8 @@ class UnifiedLLMClient:
             "review": "survey_review",
             "foundational": "foundational_work",
             "recent": "recent_advance",
+            "theoretical": "theoretical_claim",
+            "theory": "theoretical_claim",
             "common": "common_knowledge",
             "knowledge": "common_knowledge"
         }
@@ -310,7 +727,7 @@ class UnifiedLLMClient:
         """将意图转换为引用需求"""
         if intent == "common_knowledge":
             return "No"
-        elif intent in ["method_technique", "comparison", "factual_claim", "survey_review", "foundational_work", "recent_advance"]:
+        elif intent in ["method_technique", "comparison", "factual_claim", "survey_review", "foundational_work", "recent_advance", "theoretical_claim"]:
             return "Yes"
         else:
             return "Optional"
@@ -359,3 +776,454 @@ class UnifiedLLMClient:
             return "common_knowledge"
         else:
             return "factual_claim"
+
+
+class UnifiedLLMClient(LLMResponseParser):
+    """统一的 LLM 客户端接口"""
+    
+    def __init__(self, client: LLMClient, cache: Optional[LRUCache] = None, use_cache: bool = True):
+        """
+        Args:
+            client: LLM 客户端实例（OpenAIClient 或 AnthropicClient）
+            cache: 结果缓存（可选，默认创建 256 条、1 小时过期的 LRU 缓存）
+            use_cache: 是否缓存成功的 LLM 结果
+        """
+        self.client = client
+        self.cache = self._make_cache(cache, use_cache)
+        self._latency_lock = threading.Lock()
+        self._warmup_seconds: Optional[float] = None
+        self._first_call_seconds: Optional[float] = None
+        self._last_call_seconds: Optional[float] = None
+        self._first_token_seconds: Optional[float] = None
+        self._calls = 0
+        self._total_seconds = 0.0
+        self.last_activity = time.monotonic()
+    
+    def _complete(self, prompt: str, template: Optional[str] = None, **kwargs) -> str:
+        """
+        调用底层客户端并记录延迟和用量
+        
+        Args:
+            template: 提示词模板（操作）名，用量账本按它分组
+        """
+        model = getattr(self.client, "model", None)
+        with tracing.span("llm.call", model=model, template=template,
+                          prompt_tokens_est=estimate_tokens(prompt)) as span:
+            start = time.perf_counter()
+            try:
+                with usage.track(template, prompt, model) as tracked:
+                    response = self.client.complete(prompt, **kwargs)
+                    tracked.response_chars = len(response)
+                span.set("completion_tokens_est", estimate_tokens(response))
+                return response
+            finally:
+                self._record_call(time.perf_counter() - start)
+    
+    def _stream(self, prompt: str, template: Optional[str] = None, **kwargs) -> Iterator[str]:
+        """流式调用底层客户端，记录首个 token 延迟、总延迟和用量"""
+        stream = getattr(self.client, "stream", None)
+        if stream is None:
+            yield self._complete(prompt, template=template, **kwargs)
+            return
+        model = getattr(self.client, "model", None)
+        # 不用 with：生成器跨越 yield，span 不能成为调用方的活动 span
+        span = tracing.span("llm.stream", model=model, template=template,
+                            prompt_tokens_est=estimate_tokens(prompt))
+        start = time.perf_counter()
+        first = True
+        chars = 0
+        error = None
+        try:
+            with usage.track(template, prompt, model) as tracked:
+                for chunk in stream(prompt, **kwargs):
+                    if first:
+                        first = False
+                        with self._latency_lock:
+                            self._first_token_seconds = time.perf_counter() - start
+                        span.set("first_token_ms", round(self._first_token_seconds * 1000, 1))
+                    chars += len(chunk)
+                    tracked.response_chars = chars
+                    yield chunk
+        except GeneratorExit:
+            # 调用方提前关闭（如推测调用被取消）
+            span.set("cancelled", True)
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._record_call(time.perf_counter() - start)
+            span.set("completion_tokens_est", chars // 4 + 1)
+            span.end(error)
+    
+    def _record_call(self, elapsed: float):
+        with self._latency_lock:
+            if self._first_call_seconds is None:
+                self._first_call_seconds = elapsed
+            self._last_call_seconds = elapsed
+            self._calls += 1
+            self._total_seconds += elapsed
+            self.last_activity = time.monotonic()
+    
+    def warmup(self) -> bool:
+        """预热底层连接，耗时记入 latency_stats()["warmup_ms"]"""
+        warm = getattr(self.client, "warmup", None)
+        if warm is None:
+            return False
+        start = time.perf_counter()
+        ok = warm()
+        with self._latency_lock:
+            self._warmup_seconds = time.perf_counter() - start
+            self.last_activity = time.monotonic()
+        return ok
+    
+    def latency_stats(self) -> Dict[str, Any]:
+        """
+        LLM 调用延迟统计（毫秒）
+        
+        first_call_ms 为服务启动后第一次真实请求的延迟，与预热前后对比可以看出
+        连接建立的开销。
+        """
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 1) if seconds is not None else None
+        
+        with self._latency_lock:
+            return {
+                "warmup_ms": ms(self._warmup_seconds),
+                "first_call_ms": ms(self._first_call_seconds),
+                "last_call_ms": ms(self._last_call_seconds),
+                "first_token_ms": ms(self._first_token_seconds),
+                "mean_ms": ms(self._total_seconds / self._calls) if self._calls else None,
+                "calls": self._calls
+            }
+    
+    def analyze_citation(self, text: str) -> Dict[str, Any]:
+        """
+        使用 LLM 分析引用需求
+        
+        Returns:
+            包含分析结果的字典
+        """
+        from .prompts import ANALYZE_PROMPT
+        
+        prompt = ANALYZE_PROMPT.format(selected_text=text)
+        key = self._cache_key("analyze_citation", ANALYZE_PROMPT, text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._complete(prompt, template="analyze_citation")
+            with tracing.span("llm.parse"):
+                result = self._parse_analysis_response(response, text)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            # 如果 LLM 调用失败，返回错误信息
+            return self._analysis_fallback(e)
+    
+    def stream_analysis(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        流式分析引用需求（与 analyze_citation 使用同一提示词）
+        
+        每当一个分段完成（或列表多出一项）就产出一次当前的部分结果，
+        最后一次产出的结果带 done=True，字段与 analyze_citation 相同。
+        判断（needs_citation）通常在第一行完成后就能给出。
+        """
+        from .prompts import ANALYZE_PROMPT
+        from .streaming import SectionStreamParser
+        
+        key = self._cache_key("analyze_citation", ANALYZE_PROMPT, text)
+        cached = self._cache_get(key)
+        if cached is not None:
+            cached["done"] = True
+            yield cached
+            return
+        
+        parser = SectionStreamParser()
+        try:
+            for chunk in self._stream(ANALYZE_PROMPT.format(selected_text=text), template="analyze_citation"):
+                if parser.feed(chunk):
+                    yield dict(parser.result, done=False)
+            parser.close()
+        except Exception as e:
+            result = self._analysis_fallback(e)
+            result["done"] = True
+            yield result
+            return
+        
+        response = parser.text
+        if parser.saw_sections:
+            result = dict(parser.result)
+            if result["needs_citation"] is None:
+                result["needs_citation"] = self._extract_citation_need(response)
+            if result["reason"] is None:
+                result["reason"] = self._extract_reason(response)
+            result["intent"] = self._infer_intent_from_response(response)
+        else:
+            # 模型没有按分段格式输出：按完整响应解析
+            result = self._parse_analysis_response(response, text)
+        self._cache_put(key, result)
+        result["done"] = True
+        yield result
+    
+    def analyze_structured(self, text: str) -> Dict[str, Any]:
+        """
+        单次调用完成完整分析（判断 + 意图 + 引用类型 + 关键词）
+        
+        要求模型输出严格的 JSON 对象；解析失败时让模型修复一次。
+        
+        Returns:
+            包含 needs_citation / reason / intent / confidence / citation_types / keywords 的字典
+        """
+        from .prompts import STRUCTURED_ANALYZE_PROMPT, JSON_REPAIR_PROMPT
+        
+        prompt = STRUCTURED_ANALYZE_PROMPT.format(text=text)
+        key = self._cache_key("analyze_structured", STRUCTURED_ANALYZE_PROMPT, text, max_tokens=400)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._complete(prompt, template="analyze_structured", max_tokens=400, json_mode=True)
+            try:
+                with tracing.span("llm.parse"):
+                    result = self._parse_structured_response(response)
+            except ValueError:
+                # 格式错误或被截断：修复一次
+                repair_prompt = JSON_REPAIR_PROMPT.format(response=response)
+                repaired = self._complete(repair_prompt, template="json_repair", max_tokens=400, json_mode=True)
+                result = self._parse_structured_response(repaired)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            return self._structured_fallback(e)
+    
+    def stream_structured(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        流式的单次结构化分析（与 analyze_structured 使用同一提示词和缓存）
+        
+        JSON 字段每完成一个就产出一次当前的部分结果；提示词把 needs_citation 放在
+        第一位，判断最先出现。最后一次产出完整结果并带 done=True，字段与
+        analyze_structured 相同（输出不是合法 JSON 时修复一次）。
+        """
+        from .prompts import STRUCTURED_ANALYZE_PROMPT, JSON_REPAIR_PROMPT
+        from .streaming import JSONFieldStreamParser
+        
+        key = self._cache_key("analyze_structured", STRUCTURED_ANALYZE_PROMPT, text, max_tokens=400)
+        cached = self._cache_get(key)
+        if cached is not None:
+            yield dict(cached, done=True)
+            return
+        
+        parser = JSONFieldStreamParser()
+        try:
+            chunks = self._stream(STRUCTURED_ANALYZE_PROMPT.format(text=text),
+                                  template="analyze_structured", max_tokens=400, json_mode=True)
+            for chunk in chunks:
+                if parser.feed(chunk):
+                    yield dict(self._partial_from_fields(parser.fields), done=False)
+            try:
+                with tracing.span("llm.parse"):
+                    result = self._parse_structured_response(parser.text)
+            except ValueError:
+                repair_prompt = JSON_REPAIR_PROMPT.format(response=parser.text)
+                repaired = self._complete(repair_prompt, template="json_repair", max_tokens=400, json_mode=True)
+                result = self._parse_structured_response(repaired)
+        except Exception as e:
+            result = self._structured_fallback(e)
+            result["done"] = True
+            yield result
+            return
+        
+        self._cache_put(key, result)
+        yield dict(result, done=True)
+    
+    def _partial_from_fields(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """把已完成的 JSON 字段规范化为部分结果（未完成的字段为空）"""
+        normalized = self._structured_from_dict(fields)
+        partial: Dict[str, Any] = {"needs_citation": None, "reason": None, "citation_types": [], "keywords": []}
+        for field in ("needs_citation", "reason", "intent", "citation_types", "keywords"):
+            if field in fields:
+                partial[field] = normalized[field]
+        return partial
+    
+    def analyze_batch(
+        self,
+        texts: List[str],
+        max_batch: int = 16,
+        token_budget: int = 1500
+    ) -> List[Dict[str, Any]]:
+        """
+        把多个句子打包进同一次请求分析（模型输出 JSON 数组，再按编号分发）
+        
+        每个请求最多 max_batch 句，句子的估算 token 总数不超过 token_budget。
+        输出被截断或缺项时，把缺失的句子对半拆分后重试；单句仍失败则
+        退回 analyze_structured（含一次修复）。
+        
+        Args:
+            texts: 句子列表
+            max_batch: 每个请求最多的句子数
+            token_budget: 每个请求中句子部分的估算 token 上限
+        
+        Returns:
+            结构化结果列表，与 texts 一一对应
+        """
+        from .prompts import BATCH_ANALYZE_PROMPT
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        keys = [self._cache_key("analyze_batch", BATCH_ANALYZE_PROMPT, text) for text in texts]
+        pending = []
+        for index, key in enumerate(keys):
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+        
+        for batch in pack_batches([texts[i] for i in pending], max_batch, token_budget):
+            self._run_batch([pending[i] for i in batch], texts, keys, results)
+        return results
+    
+    def _run_batch(
+        self,
+        indices: List[int],
+        texts: List[str],
+        keys: List[str],
+        results: List[Optional[Dict[str, Any]]]
+    ):
+        """发送一个批次，把结果写入 results；截断时拆分重试"""
+        from .prompts import BATCH_ANALYZE_PROMPT
+        
+        if len(indices) == 1:
+            index = indices[0]
+            results[index] = self.analyze_structured(texts[index])
+            if "error" not in results[index]:
+                self._cache_put(keys[index], results[index])
+            return
+        
+        sentences = "\n".join(
+            f"{n}. {texts[index]}" for n, index in enumerate(indices, 1)
+        )
+        prompt = BATCH_ANALYZE_PROMPT.format(sentences=sentences)
+        max_tokens = BATCH_ITEM_TOKENS * len(indices) + 50
+        try:
+            response = self._complete(prompt, template="analyze_batch", max_tokens=max_tokens, json_mode=True)
+        except Exception as e:
+            # 请求本身失败（网络、鉴权等），拆分重试无济于事
+            for index in indices:
+                results[index] = self._structured_fallback(e)
+            return
+        
+        try:
+            with tracing.span("llm.parse", batch=len(indices)):
+                parsed = self._parse_batch_response(response)
+        except ValueError:
+            parsed = {}
+        
+        missing = []
+        for n, index in enumerate(indices, 1):
+            if n in parsed:
+                results[index] = parsed[n]
+                self._cache_put(keys[index], parsed[n])
+            else:
+                missing.append(index)
+        
+        if missing:
+            # 输出被截断或缺项：对半拆分后重试
+            half = (len(missing) + 1) // 2
+            for part in (missing[:half], missing[half:]):
+                if part:
+                    self._run_batch(part, texts, keys, results)
+    
+    def classify_intent(self, text: str) -> Dict[str, Any]:
+        """使用 LLM 分类引用意图"""
+        from .prompts import INTENT_CLASSIFY_PROMPT
+        
+        prompt = INTENT_CLASSIFY_PROMPT.format(text=text)
+        key = self._cache_key("classify_intent", INTENT_CLASSIFY_PROMPT, text, max_tokens=50)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._complete(prompt, template="classify_intent", max_tokens=50)
+            result = self._intent_result(response)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            return self._intent_fallback(e)
+    
+    def plan_citation_types(self, text: str, intent: str) -> List[str]:
+        """使用 LLM 规划引用类型"""
+        from .prompts import PLANNER_PROMPT
+        
+        prompt = PLANNER_PROMPT.format(text=text, intent=intent)
+        key = self._cache_key("plan_citation_types", PLANNER_PROMPT, text, intent, max_tokens=200)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._complete(prompt, template="plan_citation_types", max_tokens=200)
+            result = self._parse_citation_types(response)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            return []
+    
+    def generate_keywords(self, text: str, citation_types: List[str]) -> List[str]:
+        """使用 LLM 生成关键词"""
+        from .prompts import KEYWORD_PROMPT
+        
+        citation_type_str = self._citation_type_str(citation_types)
+        prompt = KEYWORD_PROMPT.format(text=text, citation_type=citation_type_str)
+        key = self._cache_key("generate_keywords", KEYWORD_PROMPT, text, citation_type_str, max_tokens=150)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._complete(prompt, template="generate_keywords", max_tokens=150)
+            result = self._parse_keywords(response)
+            self._cache_put(key, result)
+            return result
+        except Exception as e:
+            return []
+
+
+class ConnectionKeeper:
+    """
+    空闲保活：客户端空闲超过 interval 秒时重新预热一次，
+    避免服务端关闭空闲连接后下一次请求重新握手
+    """
+    
+    def __init__(self, client: UnifiedLLMClient, interval: float = 45.0):
+        """
+        Args:
+            client: UnifiedLLMClient 实例
+            interval: 空闲多久后发送一次保活请求（秒）
+        """
+        self.client = client
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """启动保活线程"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval / 3):
+            if time.monotonic() - self.client.last_activity >= self.interval:
+                self.client.warmup()
+    
+    def stop(self):
+        """停止保活线程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
@@ -0,0 +1,495 @@
+"""
+Language Server Protocol 前端 - 在编辑器中以诊断信息提示可能缺少引用的句子
+
+文档打开或修改后（去抖动），只重新切分改动过的段落、只重新分析内容变化的句子，
+其余句子复用每个文档自己的结果缓存。新的修改会取消仍在进行的旧分析。
+悬停显示原因、引用类型和检索关键词；代码操作可直接用关键词检索文献。
+
+用法（编辑器中配置为 stdio 语言服务器）：
+    python -m whatshouldicite.lsp
+    python -m whatshouldicite.lsp --llm --debounce 0.5
+"""
+
+import json
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+
+from .scanner import IncrementalSplitter, detect_syntax
+from .watcher import IncrementalScanner, SentenceResultCache
+
+SERVER_NAME = "whatshouldicite"
+SEARCH_COMMAND = "whatshouldicite.searchKeywords"
+DEFAULT_SEARCH_URL = "https://scholar.google.com/scholar?q={query}"
+
+# LSP 常量
+SEVERITY = {"Yes": 2, "Optional": 3}  # Warning / Information
+SYNC_INCREMENTAL = 2
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+_LANGUAGE_SYNTAX = {"latex": "tex", "tex": "tex", "bibtex": "text", "markdown": "md"}
+
+
+# ---------------------------------------------------------------------------
+# JSON-RPC 传输（Content-Length 分帧）
+# ---------------------------------------------------------------------------
+
+def read_message(stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    """
+    读取一条消息
+
+    Returns:
+        解析后的消息；流结束时返回 None
+    """
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is not None:
+                break
+            continue
+        name, _, value = line.decode("ascii", "replace").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+
+def write_message(stream: BinaryIO, message: Dict[str, Any]):
+    """写出一条消息"""
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    stream.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    stream.flush()
+
+
+# ---------------------------------------------------------------------------
+# 位置换算：LSP 默认按 UTF-16 码元计列，Python 字符串按码点计
+# ---------------------------------------------------------------------------
+
+def to_units(line: str, index: int, encoding: str = "utf-16") -> int:
+    """字符串下标 -> LSP 列号"""
+    if encoding != "utf-16" or line.isascii():
+        return index
+    return index + sum(1 for ch in line[:index] if ord(ch) > 0xFFFF)
+
+
+def to_index(line: str, units: int, encoding: str = "utf-16") -> int:
+    """LSP 列号 -> 字符串下标（超出行尾时返回行长）"""
+    if encoding != "utf-16" or line.isascii():
+        return min(units, len(line))
+    count = 0
+    for i, ch in enumerate(line):
+        if count >= units:
+            return i
+        count += 2 if ord(ch) > 0xFFFF else 1
+    return len(line)
+
+
+class TextDocument:
+    """编辑器中打开的一个文档及其分析状态"""
+
+    def __init__(self, uri: str, text: str, version: int, syntax: str, scanner: IncrementalScanner):
+        self.uri = uri
+        self.text = text
+        self.version = version
+        self.syntax = syntax
+        self.splitter = IncrementalSplitter(syntax)
+        self.scanner = scanner
+        self.verdicts: List[Dict[str, Any]] = []
+        self.stats: Dict[str, Any] = {}
+        self.cancel: Optional[threading.Event] = None
+
+    def lines(self) -> List[str]:
+        return self.text.splitlines(keepends=True)
+
+    def line_text(self, line: int) -> str:
+        lines = self.lines()
+        return lines[line].rstrip("\r\n") if 0 <= line < len(lines) else ""
+
+    def offset(self, position: Dict[str, int], encoding: str) -> int:
+        """LSP 位置 -> 全文下标"""
+        lines = self.lines()
+        line = position["line"]
+        if line >= len(lines):
+            return len(self.text)
+        start = sum(len(text) for text in lines[:line])
+        return start + to_index(lines[line].rstrip("\r\n"), position["character"], encoding)
+
+    def apply_change(self, change: Dict[str, Any], encoding: str):
+        """应用一次 didChange 修改（带 range 为增量修改，否则为全文替换）"""
+        if "range" not in change:
+            self.text = change["text"]
+            return
+        start = self.offset(change["range"]["start"], encoding)
+        end = self.offset(change["range"]["end"], encoding)
+        self.text = self.text[:start] + change["text"] + self.text[end:]
+
+
+class CitationLanguageServer:
+    """引用诊断语言服务器"""
+
+    def __init__(
+        self,
+        agent: Optional[Any] = None,
+        debounce: float = 0.3,
+        search_url: str = DEFAULT_SEARCH_URL
+    ):
+        """
+        Args:
+            agent: CitationAgent 实例（默认使用规则判断）
+            debounce: 去抖动时间（秒），连续输入只在停顿后分析一次
+            search_url: 检索关键词时打开的地址，{query} 处替换为关键词
+        """
+        if agent is None:
+            from .agent import CitationAgent
+            agent = CitationAgent()
+        self.agent = agent
+        self.debounce = debounce
+        self.search_url = search_url
+        self.documents: Dict[str, TextDocument] = {}
+        self.position_encoding = "utf-16"
+        self.running = False
+        self._shutdown_requested = False
+        self._show_document = False
+        self._pending: Dict[str, float] = {}  # uri -> 到期时间
+        self._cond = threading.Condition()
+        self._writer: Optional[BinaryIO] = None
+        self._write_lock = threading.Lock()
+        self._next_id = 0
+        self._worker: Optional[threading.Thread] = None
+
+    # ---- 消息 ----
+
+    def send(self, message: Dict[str, Any]):
+        message["jsonrpc"] = "2.0"
+        with self._write_lock:
+            write_message(self._writer, message)
+
+    def notify(self, method: str, params: Dict[str, Any]):
+        self.send({"method": method, "params": params})
+
+    def _request(self, method: str, params: Dict[str, Any]):
+        """向客户端发送请求（不等待响应）"""
+        self._next_id += 1
+        self.send({"id": f"{SERVER_NAME}-{self._next_id}", "method": method, "params": params})
+
+    def serve(self, reader: BinaryIO, writer: BinaryIO) -> int:
+        """
+        处理消息直到收到 exit 或输入结束
+
+        Returns:
+            进程退出码（收到 shutdown 后退出为 0，否则为 1）
+        """
+        self._writer = writer
+        self.running = True
+        self._worker = threading.Thread(target=self._analysis_loop, daemon=True)
+        self._worker.start()
+        try:
+            while self.running:
+                message = read_message(reader)
+                if message is None:
+                    break
+                self.handle(message)
+        finally:
+            self.stop()
+        return 0 if self._shutdown_requested else 1
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            for document in self.documents.values():
+                if document.cancel is not None:
+                    document.cancel.set()
+            self._cond.notify_all()
+
+    def handle(self, message: Dict[str, Any]):
+        """分发一条消息；请求的异常转换为错误响应"""
+        method = message.get("method")
+        if method is None:
+            return  # 客户端对我们请求的响应
+        handler = getattr(self, "on_" + method.replace("/", "_").replace("$", "dollar"), None)
+        is_request = "id" in message
+        if handler is None:
+            if is_request:
+                self.send({"id": message["id"], "error": {
+                    "code": METHOD_NOT_FOUND, "message": f"未支持的方法: {method}"}})
+            return
+        try:
+            result = handler(message.get("params") or {})
+        except (KeyError, TypeError, ValueError) as e:
+            if is_request:
+                self.send({"id": message["id"], "error": {"code": INVALID_PARAMS, "message": str(e)}})
+            return
+        except Exception as e:
+            if is_request:
+                self.send({"id": message["id"], "error": {
+                    "code": INTERNAL_ERROR, "message": f"{type(e).__name__}: {e}"}})
+            return
+        if is_request:
+            self.send({"id": message["id"], "result": result})
+
+    # ---- 生命周期 ----
+
+    def on_initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        capabilities = params.get("capabilities") or {}
+        encodings = (capabilities.get("general") or {}).get("positionEncodings") or []
+        # 客户端支持时按码点计列，省去换算
+        self.position_encoding = "utf-32" if "utf-32" in encodings else "utf-16"
+        self._show_document = bool(((capabilities.get("window") or {}).get("showDocument") or {}).get("support"))
+        options = params.get("initializationOptions") or {}
+        self.debounce = float(options.get("debounce", self.debounce))
+        self.search_url = options.get("searchUrl", self.search_url)
+        return {
+            "capabilities": {
+                "positionEncoding": self.position_encoding,
+                "textDocumentSync": {"openClose": True, "change": SYNC_INCREMENTAL},
+                "hoverProvider": True,
+                "codeActionProvider": {"codeActionKinds": ["quickfix"]},
+                "executeCommandProvider": {"commands": [SEARCH_COMMAND]},
+            },
+            "serverInfo": {"name": SERVER_NAME},
+        }
+
+    def on_initialized(self, params):
+        pass
+
+    def on_shutdown(self, params):
+        self._shutdown_requested = True
+        return None
+
+    def on_exit(self, params):
+        self.running = False
+
+    def on_dollar_cancelRequest(self, params):
+        pass  # 请求都是同步处理的，收到取消时已经响应过了
+
+    # ---- 文档同步 ----
+
+    def _syntax(self, uri: str, language_id: Optional[str]) -> str:
+        if language_id in _LANGUAGE_SYNTAX:
+            return _LANGUAGE_SYNTAX[language_id]
+        return detect_syntax(unquote(urlparse(uri).path))
+
+    def on_textDocument_didOpen(self, params):
+        item = params["textDocument"]
+        uri = item["uri"]
+        scanner = IncrementalScanner(self.agent, SentenceResultCache())
+        document = TextDocument(uri, item["text"], item.get("version", 0),
+                                self._syntax(uri, item.get("languageId")), scanner)
+        with self._cond:
+            self.documents[uri] = document
+            self._schedule(uri, delay=0.0)
+
+    def on_textDocument_didChange(self, params):
+        uri = params["textDocument"]["uri"]
+        with self._cond:
+            document = self.documents[uri]
+            for change in params["contentChanges"]:
+                document.apply_change(change, self.position_encoding)
+            document.version = params["textDocument"].get("version", document.version + 1)
+            self._schedule(uri)
+
+    def on_textDocument_didClose(self, params):
+        uri = params["textDocument"]["uri"]
+        with self._cond:
+            document = self.documents.pop(uri, None)
+            self._pending.pop(uri, None)
+            if document is not None and document.cancel is not None:
+                document.cancel.set()
+        self.notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def _schedule(self, uri: str, delay: Optional[float] = None):
+        """（调用方持有 _cond）安排去抖动后的分析，并取消该文档仍在进行的分析"""
+        document = self.documents[uri]
+        if document.cancel is not None:
+            document.cancel.set()
+        self._pending[uri] = time.monotonic() + (self.debounce if delay is None else delay)
+        self._cond.notify()
+
+    # ---- 分析 ----
+
+    def _next_job(self) -> Optional[Tuple[TextDocument, List[str], int, threading.Event]]:
+        """等待下一个到期的文档，返回 (文档, 各行, 版本, 取消事件)"""
+        with self._cond:
+            while self.running:
+                now = time.monotonic()
+                due = [(when, uri) for uri, when in self._pending.items() if when <= now]
+                if due:
+                    _, uri = min(due)
+                    del self._pending[uri]
+                    document = self.documents.get(uri)
+                    if document is None:
+                        continue
+                    document.cancel = threading.Event()
+                    return document, document.lines(), document.version, document.cancel
+                timeout = min(self._pending.values()) - now if self._pending else None
+                self._cond.wait(timeout)
+        return None
+
+    def _analysis_loop(self):
+        """后台分析线程：一次只分析一个文档，切分器和扫描器只在这个线程中使用"""
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            document, lines, version, cancel = job
+            try:
+                sentences = document.splitter.split(lines)
+                update = document.scanner.scan_sentences(sentences, cancel)
+            except Exception as e:
+                print(f"⚠️  分析 {document.uri} 失败: {e}", file=sys.stderr)
+                continue
+            if update["stats"]["cancelled"]:
+                continue
+            with self._cond:
+                if self.documents.get(document.uri) is not document or document.version != version:
+                    continue  # 分析期间文档又被修改，等待下一轮
+                document.verdicts = update["verdicts"]
+                document.stats = update["stats"]
+            self.publish(document, lines, version)
+
+    def _range(self, verdict: Dict[str, Any], lines: List[str]) -> Dict[str, Any]:
+        def line_text(line: int) -> str:
+            return lines[line - 1].rstrip("\r\n") if 0 < line <= len(lines) else ""
+
+        encoding = self.position_encoding
+        return {
+            "start": {"line": verdict["line"] - 1,
+                      "character": to_units(line_text(verdict["line"]), verdict["column"] - 1, encoding)},
+            "end": {"line": verdict["end_line"] - 1,
+                    "character": to_units(line_text(verdict["end_line"]), verdict["end_column"], encoding)},
+        }
+
+    @staticmethod
+    def _flagged(verdict: Dict[str, Any]) -> bool:
+        return (verdict["needs_citation"] in SEVERITY and not verdict.get("already_cited")
+                and "error" not in verdict)
+
+    def diagnostics(self, document: TextDocument, lines: List[str]) -> List[Dict[str, Any]]:
+        """可能缺少引用的句子 -> LSP 诊断"""
+        diagnostics = []
+        for verdict in document.verdicts:
+            if not self._flagged(verdict):
+                continue
+            diagnostics.append({
+                "range": self._range(verdict, lines),
+                "severity": SEVERITY[verdict["needs_citation"]],
+                "source": SERVER_NAME,
+                "code": verdict["intent"],
+                "message": f"Claim may need a citation: {verdict['reason']}",
+                "data": {"keywords": verdict["keywords"], "citation_types": verdict["citation_types"]},
+            })
+        return diagnostics
+
+    def publish(self, document: TextDocument, lines: List[str], version: int):
+        self.notify("textDocument/publishDiagnostics", {
+            "uri": document.uri,
+            "version": version,
+            "diagnostics": self.diagnostics(document, lines),
+        })
+
+    # ---- 悬停与代码操作 ----
+
+    def _verdicts_at(self, document: TextDocument, start: Dict[str, int],
+                     end: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """与 [start, end] 相交的已标记句子"""
+        encoding = self.position_encoding
+        end = end or start
+        first = (start["line"] + 1, to_index(document.line_text(start["line"]), start["character"], encoding) + 1)
+        last = (end["line"] + 1, to_index(document.line_text(end["line"]), end["character"], encoding) + 1)
+        return [
+            verdict for verdict in document.verdicts
+            if self._flagged(verdict)
+            and (verdict["line"], verdict["column"]) <= last
+            and first <= (verdict["end_line"], verdict["end_column"] + 1)
+        ]
+
+    def on_textDocument_hover(self, params):
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return None
+        verdicts = self._verdicts_at(document, params["position"])
+        if not verdicts:
+            return None
+        verdict = verdicts[0]
+        parts = [f"**Do I need a citation?** {verdict['needs_citation']}", "", verdict["reason"]]
+        if verdict["citation_types"]:
+            parts += ["", "**What to cite**"] + [f"- {ct}" for ct in verdict["citation_types"]]
+        if verdict["keywords"]:
+            parts += ["", "**Search keywords**"] + [f'- "{kw}"' for kw in verdict["keywords"]]
+        return {
+            "contents": {"kind": "markdown", "value": "\n".join(parts)},
+            "range": self._range(verdict, document.lines()),
+        }
+
+    def on_textDocument_codeAction(self, params):
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return []
+        selection = params["range"]
+        actions = []
+        for verdict in self._verdicts_at(document, selection["start"], selection["end"]):
+            for keyword in verdict["keywords"]:
+                actions.append({
+                    "title": f'Search literature: "{keyword}"',
+                    "kind": "quickfix",
+                    "command": {
+                        "title": f'Search literature: "{keyword}"',
+                        "command": SEARCH_COMMAND,
+                        "arguments": [{"query": keyword, "keywords": verdict["keywords"],
+                                       "citation_types": verdict["citation_types"]}],
+                    },
+                })
+        return actions
+
+    def on_workspace_executeCommand(self, params):
+        if params["command"] != SEARCH_COMMAND:
+            raise ValueError(f"未知命令: {params['command']}")
+        query = params["arguments"][0]["query"]
+        url = self.search_url.format(query=quote(query))
+        if self._show_document:
+            self._request("window/showDocument", {"uri": url, "external": True})
+        else:
+            self.notify("window/showMessage", {"type": 3, "message": f"{query}: {url}"})
+        return None
+
+
+def main(argv=None):
+    """命令行入口：通过标准输入输出提供语言服务"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite 语言服务器（stdio）")
+    parser.add_argument("--llm", action="store_true", help="启用 LLM（读取环境变量或 config.py）")
+    parser.add_argument("--debounce", type=float, default=0.3, help="去抖动时间（秒，默认 0.3）")
+    parser.add_argument("--search-url", default=DEFAULT_SEARCH_URL, help="检索地址，{query} 处替换为关键词")
+    args = parser.parse_args(argv)
+
+    # 标准输出留给协议；其余模块的 print 一律改到标准错误
+    reader, writer = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr
+
+    agent = None
+    if args.llm:
+        from .agent import CitationAgent
+        from .run_with_llm import enable_usage_ledger, get_llm_client
+
+        llm_client = get_llm_client()
+        if llm_client:
+            agent = CitationAgent(llm_client=llm_client, single_call=True)
+            enable_usage_ledger()
+
+    server = CitationLanguageServer(agent, debounce=args.debounce, search_url=args.search_url)
+    sys.exit(server.serve(reader, writer))
+
+
+if __name__ == "__main__":
+    main()
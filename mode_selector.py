@@ -2,10 +2,18 @@
 模式选择器 - 让用户选择分析模式
 """
 
-from typing import Optional, Callable
-import tkinter as tk
+from typing import Optional, Callable, Iterator, Dict, Any, List, TYPE_CHECKING
+import contextvars
+import queue
+import threading
 from enum import Enum
 
+if TYPE_CHECKING:
+    import tkinter as tk
+    from .dispatch import TkUIThread
+
+from . import tracing, usage
+
 
 class AnalysisMode(Enum):
     """分析模式"""
@@ -15,47 +23,52 @@ class AnalysisMode(Enum):
 
 
 class ModeSelectorWindow:
-    """模式选择窗口"""
+    """
+    模式选择窗口
+    
+    窗口只创建一次，之后每次显示只移动位置；所有方法都可在任意线程调用，
+    窗口操作和选择回调都在 UI 线程中执行。
+    """
     
-    def __init__(self, callback: Callable[[AnalysisMode], None]):
+    width = 450
+    height = 300
+    
+    def __init__(self, callback: Callable[[AnalysisMode], None], ui: Optional["TkUIThread"] = None):
         """
         Args:
             callback: 选择模式后的回调函数
+            ui: 所属的 UI 线程（None 则使用进程内共享的 UI 线程）
         """
         self.callback = callback
+        self.ui = ui
         self.selected_mode: Optional[AnalysisMode] = None
-        self.window: Optional[tk.Toplevel] = None
-        self._root: Optional[tk.Tk] = None
+        self.window: Optional["tk.Toplevel"] = None
+        self.mode_buttons = []
     
-    def _ensure_root(self):
-        """确保根窗口存在"""
-        if self._root is None:
-            self._root = tk.Tk()
-            self._root.withdraw()
+    def _ui(self) -> "TkUIThread":
+        if self.ui is None:
+            from .dispatch import default_ui
+            self.ui = default_ui()
+        return self.ui
     
     def show(self):
         """显示模式选择窗口"""
-        self._ensure_root()
-        
-        if self.window:
-            self.window.destroy()
+        self._ui().call(self._show)
+    
+    def hide(self):
+        """隐藏窗口"""
+        self._ui().call(self._hide)
+    
+    def _build(self):
+        """创建窗口和按钮（UI 线程，只执行一次）"""
+        import tkinter as tk
         
-        self.window = tk.Toplevel(self._root)
+        self.window = tk.Toplevel(self.ui.root)
+        self.window.withdraw()
         self.window.title("选择分析模式")
         self.window.overrideredirect(True)
         self.window.attributes('-topmost', True)
         
-        # 设置窗口大小和位置
-        width = 450
-        height = 300
-        try:
-            x = self._root.winfo_pointerx() + 20
-            y = self._root.winfo_pointery() + 20
-        except:
-            x = 100
-            y = 100
-        self.window.geometry(f"{width}x{height}+{x}+{y}")
-        
         # 设置窗口背景
         self.window.configure(bg="#2b2b2b")
         
@@ -79,7 +92,6 @@ class ModeSelectorWindow:
              "先规则判断，不确定时用 LLM\n平衡速度和准确率")
         ]
         
-        self.mode_buttons = []
         for key, mode, title, desc in modes:
             frame = tk.Frame(self.window, bg="#2b2b2b")
             frame.pack(fill=tk.X, padx=20, pady=5)
@@ -101,12 +113,8 @@ class ModeSelectorWindow:
             btn.pack(fill=tk.X)
             
             # 鼠标悬停效果
-            def on_enter(e):
-                btn.config(bg="#555555")
-            def on_leave(e):
-                btn.config(bg="#444444")
-            btn.bind("<Enter>", on_enter)
-            btn.bind("<Leave>", on_leave)
+            btn.bind("<Enter>", lambda e, b=btn: b.config(bg="#555555"))
+            btn.bind("<Leave>", lambda e, b=btn: b.config(bg="#444444"))
             
             desc_label = tk.Label(
                 frame,
@@ -125,43 +133,148 @@ class ModeSelectorWindow:
         self.window.bind('2', lambda e: self._select_mode(AnalysisMode.LLM_BASED))
         self.window.bind('3', lambda e: self._select_mode(AnalysisMode.HYBRID))
         self.window.bind('<Escape>', lambda e: self._select_mode(None))
-        
-        # 设置焦点
+    
+    def _show(self):
+        if self.window is None:
+            self._build()
+        try:
+            x, y = self.window.winfo_pointerxy()
+            x += 20
+            y += 20
+        except Exception:
+            x, y = 100, 100
+        self.window.geometry(f"{self.width}x{self.height}+{x}+{y}")
+        self.window.deiconify()
+        self.window.lift()
         self.window.focus_force()
-        self._root.update()
+    
+    def _hide(self):
+        if self.window is not None:
+            self.window.withdraw()
     
     def _select_mode(self, mode: Optional[AnalysisMode]):
         """选择模式"""
         self.selected_mode = mode
-        if self.window:
-            self.window.destroy()
-            self.window = None
+        self._hide()
         
         if self.callback:
             self.callback(mode)
+
+
+class SpeculativeLLMCall:
+    """
+    提前在后台发起的 LLM 流式分析
+
+    混合模式下与规则判断同时开始；规则足够确定时调用 cancel()，
+    后台线程在收到下一段输出时停止读取并关闭流式连接。
+    """
     
-    def hide(self):
-        """隐藏窗口"""
-        if self.window:
-            self.window.destroy()
-            self.window = None
+    def __init__(self, llm_client, text: str, structured: bool = True):
+        """
+        Args:
+            llm_client: UnifiedLLMClient 实例
+            text: 待分析文本
+            structured: 使用单次结构化调用（JSON）流式分析，否则使用分段文本格式
+        """
+        self.llm_client = llm_client
+        self.text = text
+        self.structured = structured
+        self.cancelled = False
+        self._cancel = threading.Event()
+        self._partials: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        # 后台线程继承调用方的上下文（用量标签等）
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._run,), daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        if self.structured:
+            stream = self.llm_client.stream_structured(self.text)
+        else:
+            stream = self.llm_client.stream_analysis(self.text)
+        try:
+            for partial in stream:
+                if self._cancel.is_set():
+                    break
+                self._partials.put(partial)
+        except Exception as e:
+            fallback = self.llm_client._structured_fallback if self.structured else self.llm_client._analysis_fallback
+            self._partials.put(dict(fallback(e), done=True))
+        finally:
+            stream.close()
+            self._partials.put(None)
+    
+    def cancel(self):
+        """放弃本次 LLM 分析"""
+        self.cancelled = True
+        self._cancel.set()
+    
+    def partials(self) -> Iterator[Dict[str, Any]]:
+        """依次产出部分结果（已在途的输出不会丢失），直到分析结束"""
+        while True:
+            partial = self._partials.get()
+            if partial is None:
+                return
+            yield partial
+    
+    def result(self) -> Optional[Dict[str, Any]]:
+        """等待并返回最终结果"""
+        final = None
+        for partial in self.partials():
+            final = partial
+        return final
 
 
 class ModeManager:
     """模式管理器"""
     
-    def __init__(self, default_mode: AnalysisMode = AnalysisMode.RULE_BASED):
+    def __init__(
+        self,
+        default_mode: AnalysisMode = AnalysisMode.RULE_BASED,
+        single_call: bool = True,
+        hybrid_threshold: float = 0.7
+    ):
         """
         Args:
             default_mode: 默认模式
+            single_call: LLM 分析是否使用单次结构化调用（默认开启，降低快捷键延迟）
+            hybrid_threshold: 混合模式下规则判断的置信度阈值，
+                达到阈值直接采用规则结果，否则采用 LLM 结果
         """
         self.current_mode = default_mode
+        self.single_call = single_call
+        self.hybrid_threshold = hybrid_threshold
         self.llm_client = None
+        self._agents = {}  # "rule" / "llm" -> CitationAgent，每次快捷键复用
         self.selector = ModeSelectorWindow(self._on_mode_selected)
     
     def set_llm_client(self, llm_client):
-        """设置 LLM 客户端"""
-        self.llm_client = llm_client
+        """设置 LLM 客户端（只包装一次，所有 Agent 共享）"""
+        from .llm_client import as_unified_client
+        
+        self.llm_client = as_unified_client(llm_client)
+        self._agents.clear()
+    
+    def _agent(self, kind: str):
+        """按类型获取缓存的 Agent（首次使用时创建）"""
+        agent = self._agents.get(kind)
+        if agent is None:
+            from .agent import CitationAgent
+            
+            if kind == "llm":
+                agent = CitationAgent(llm_client=self.llm_client, single_call=self.single_call)
+            else:
+                agent = CitationAgent(llm_client=None)
+            self._agents[kind] = agent
+        return agent
+    
+    def warmup(self) -> bool:
+        """预热 LLM 连接，并提前创建 Agent（未配置 LLM 时只创建规则 Agent）"""
+        self._agent("rule")
+        if not self.llm_client:
+            return False
+        self._agent("llm")
+        return self.llm_client.warmup()
     
     def _on_mode_selected(self, mode: Optional[AnalysisMode]):
         """模式选择回调"""
@@ -174,34 +287,146 @@ class ModeManager:
         self.selector.show()
     
     def get_agent(self):
-        """根据当前模式获取 Agent"""
-        from .agent import CitationAgent
-        
+        """根据当前模式获取 Agent（同一模式复用同一个实例）"""
         if self.current_mode == AnalysisMode.RULE_BASED:
             # 规则判断
-            return CitationAgent(llm_client=None)
+            return self._agent("rule")
         elif self.current_mode == AnalysisMode.LLM_BASED:
-            # LLM 判断
+            # LLM 判断（快捷键路径默认单次结构化调用）
             if not self.llm_client:
                 print("⚠️  LLM 模式需要配置 API key，回退到规则判断")
-                return CitationAgent(llm_client=None)
-            return CitationAgent(llm_client=self.llm_client)
+                return self._agent("rule")
+            return self._agent("llm")
         else:  # HYBRID
-            # 混合模式：先规则，不确定时用 LLM
-            return CitationAgent(llm_client=self.llm_client if self.llm_client else None)
+            # 混合模式：规则与 LLM 同时开始，按规则置信度取舍（见 analyze_hybrid）
+            return self._agent("rule")
+    
+    def _rule_is_confident(self, result: Dict[str, Any]) -> bool:
+        return result.get("confidence", 0.0) >= self.hybrid_threshold
+    
+    def analyze_hybrid(self, text: str) -> Dict[str, Any]:
+        """
+        混合模式分析，返回结构化结果（source 字段标明采用了规则还是 LLM）
+        
+        LLM 请求与规则判断同时发出；规则置信度达到阈值时立即采用规则结果并
+        取消 LLM 请求，否则等待已在途的 LLM 结果。
+        """
+        speculative = SpeculativeLLMCall(self.llm_client, text, self.single_call) if self.llm_client else None
+        rule_result = self._agent("rule").analyze_structured(text)
+        if speculative is None or self._rule_is_confident(rule_result):
+            if speculative is not None:
+                speculative.cancel()
+            self._record_hybrid("rule")
+            return dict(rule_result, source="rule")
+        
+        with tracing.span("hybrid.wait_llm"):
+            llm_result = speculative.result()
+        if llm_result is None:
+            self._record_hybrid("rule")
+            return dict(rule_result, source="rule")
+        self._record_hybrid("llm")
+        llm_result.pop("done", None)
+        llm_result["text"] = rule_result["text"]
+        return dict(llm_result, source="llm")
+    
+    def _record_hybrid(self, source: str):
+        """记录混合模式的取舍（用于统计升级到 LLM 的比例）"""
+        tracing.current_span().set("source", source)
+        ledger = usage.current_ledger()
+        if ledger is not None:
+            ledger.record_event("hybrid", source=source, threshold=self.hybrid_threshold)
+    
+    def stream_structured(self, text: str, mode: Optional[AnalysisMode] = None) -> Iterator[Dict[str, Any]]:
+        """
+        按指定模式分析文本，逐步产出结构化的部分结果（不改变 current_mode）
+        
+        LLM 判断以流式方式进行：判断结论先出现，原因、引用类型和关键词随后补全
+        （single_call 时流式输出单次结构化调用的 JSON，否则为分段文本格式）；
+        规则判断只产出一次。每个部分结果带 source 字段，最后一个带 done=True。
+        提前关闭生成器会取消在途的 LLM 请求。
+        """
+        mode = mode or self.current_mode
+        if mode == AnalysisMode.HYBRID and self.llm_client:
+            speculative = SpeculativeLLMCall(self.llm_client, text, self.single_call)
+            try:
+                rule_result = self._agent("rule").analyze_structured(text)
+                if self._rule_is_confident(rule_result):
+                    speculative.cancel()
+                    self._record_hybrid("rule")
+                    yield dict(rule_result, source="rule", done=True)
+                    return
+                self._record_hybrid("llm")
+                for partial in speculative.partials():
+                    yield dict(partial, source="llm")
+            finally:
+                speculative.cancel()
+            return
+        
+        if mode == AnalysisMode.LLM_BASED and self.llm_client:
+            if self.single_call:
+                stream = self.llm_client.stream_structured(text)
+            else:
+                stream = self.llm_client.stream_analysis(text)
+            try:
+                for partial in stream:
+                    yield dict(partial, source="llm")
+            finally:
+                stream.close()
+            return
+        
+        yield dict(self._agent("rule").analyze_structured(text), source="rule", done=True)
+    
+    def analyze_stream(self, text: str) -> Iterator[str]:
+        """
+        使用当前模式分析文本，逐步产出浮窗内容（见 stream_structured）
+        """
+        from .streaming import render_partial
+        
+        for partial in self.stream_structured(text):
+            yield render_partial(partial)
     
     def analyze_with_mode(self, text: str) -> str:
         """使用当前模式分析文本"""
-        agent = self.get_agent()
-        result = agent.analyze(text)
-        
-        # 混合模式：如果结果不确定，且配置了 LLM，则用 LLM 再分析一次
-        if (self.current_mode == AnalysisMode.HYBRID and 
-            self.llm_client and 
-            "Optional" in result):
-            print("  🔄 混合模式：结果不确定，使用 LLM 重新分析...")
-            llm_agent = CitationAgent(llm_client=self.llm_client)
-            llm_result = llm_agent.analyze(text)
-            return llm_result
-        
-        return result
+        with tracing.span("mode.analyze", mode=self.current_mode.value), \
+                usage.labels(mode=self.current_mode.value):
+            if self.current_mode == AnalysisMode.HYBRID and self.llm_client:
+                from .utils import format_result
+                
+                return format_result(self.analyze_hybrid(text))
+            return self.get_agent().analyze(text)
+    
+    def analyze_structured(self, text: str, mode: Optional[AnalysisMode] = None) -> Dict[str, Any]:
+        """
+        按指定模式分析文本，返回结构化结果（不改变 current_mode）
+        
+        供常驻服务等多个调用方共享同一个 ModeManager 时使用；
+        未配置 LLM 时 LLM / 混合模式回退到规则判断。
+        
+        Args:
+            text: 待分析文本
+            mode: 分析模式（None 则使用当前模式）
+        
+        Returns:
+            结构化结果，source 字段标明采用了规则还是 LLM
+        """
+        mode = mode or self.current_mode
+        with tracing.span("mode.analyze", mode=mode.value), usage.labels(mode=mode.value):
+            if mode == AnalysisMode.HYBRID and self.llm_client:
+                return self.analyze_hybrid(text)
+            if mode == AnalysisMode.LLM_BASED and self.llm_client:
+                return dict(self._agent("llm").analyze_structured(text), source="llm")
+            return dict(self._agent("rule").analyze_structured(text), source="rule")
+    
+    def analyze_many(self, texts, mode: Optional[AnalysisMode] = None) -> List[Dict[str, Any]]:
+        """
+        按指定模式批量分析，结果与 texts 一一对应（不改变 current_mode）
+        
+        规则 / LLM 模式交给 CitationAgent.analyze_many（LLM 模式会并发或打包请求），
+        混合模式逐条执行 analyze_hybrid。
+        """
+        mode = mode or self.current_mode
+        with usage.labels(mode=mode.value):
+            if mode == AnalysisMode.HYBRID and self.llm_client:
+                return [self.analyze_hybrid(text) for text in texts]
+            kind = "llm" if mode == AnalysisMode.LLM_BASED and self.llm_client else "rule"
+            return [dict(result, source=kind) for result in self._agent(kind).analyze_many(texts)]
@@ -2,7 +2,8 @@
 Citation Type Planner - 规划应该引用什么类型的工作
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
+from .analyzer import AnalysisContext
 from .intent import CitationIntentClassifier
 
 
@@ -14,32 +15,42 @@ class CitationTypePlanner:
         Args:
             llm_client: LLM 客户端（可选）
         """
+        if llm_client is not None:
+            from .llm_client import as_unified_client
+            llm_client = as_unified_client(llm_client)
         self.llm_client = llm_client
-        self.intent_classifier = CitationIntentClassifier(llm_client)
+        self.intent_classifier = CitationIntentClassifier(self.llm_client)
     
-    def plan(self, text: str) -> List[str]:
+    def plan(
+        self,
+        text: Union[str, AnalysisContext],
+        intent_result: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
         """
         规划引用类型
         
         Args:
-            text: 选中的文本
+            text: 选中的文本（或已构建的分析上下文）
+            intent_result: 已有的意图分类结果（可选，避免重复分类）
         
         Returns:
             引用类型建议列表
         """
-        intent_result = self.intent_classifier.classify(text)
+        context = self.intent_classifier.analyzer.build_context(text)
+        if intent_result is None:
+            intent_result = self.intent_classifier.classify(context)
         intent = intent_result.get("intent", "unknown")
         
         # 如果提供了 LLM 客户端，使用 LLM 规划
         if self.llm_client:
-            return self._plan_with_llm(text, intent)
+            return self._plan_with_llm(context.text, intent)
         
         # 否则使用规则规划
-        return self._plan_with_rules(text, intent)
+        return self._plan_with_rules(context, intent)
     
-    def _plan_with_rules(self, text: str, intent: str) -> List[str]:
+    def _plan_with_rules(self, context: AnalysisContext, intent: str) -> List[str]:
         """基于规则的规划（增强版，更专业）"""
-        text_lower = text.lower()
+        text_lower = context.text_lower
         suggestions = []
         
         if intent == "foundational_work":
@@ -100,11 +111,4 @@ class CitationTypePlanner:
     
     def _plan_with_llm(self, text: str, intent: str) -> List[str]:
         """使用 LLM 规划"""
-        from .llm_client import UnifiedLLMClient
-        
-        if not isinstance(self.llm_client, UnifiedLLMClient):
-            unified_client = UnifiedLLMClient(self.llm_client)
-        else:
-            unified_client = self.llm_client
-        
-        return unified_client.plan_citation_types(text, intent)
+        return self.llm_client.plan_citation_types(text, intent)
@@ -2,172 +2,83 @@
 系统级浮窗显示模块
 """
 
-import tkinter as tk
-from tkinter import scrolledtext
-from typing import Optional
-import threading
-
-
-class CitationPopupWindow:
-    """引用建议浮窗"""
-    
-    def __init__(self):
-        self.window: Optional[tk.Tk] = None
-        self.text_widget: Optional[scrolledtext.ScrolledText] = None
-    
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # tkinter 只在真正显示浮窗时导入，import 本模块不加载 Tk
+    import tkinter as tk
+    from tkinter import scrolledtext
+    from .dispatch import TkUIThread
+
+
+class SimplePopupWindow:
+    """
+    简化版浮窗
+
+    窗口只在第一次显示时创建，之后每次显示只替换文本和位置，关闭时隐藏而不销毁。
+    所有方法都可在任意线程调用，窗口操作由 UI 线程执行。
+    """
+
+    width = 500
+    height = 400
+
+    def __init__(self, ui: Optional["TkUIThread"] = None, alpha: float = 1.0):
+        """
+        Args:
+            ui: 所属的 UI 线程（None 则使用进程内共享的 UI 线程）
+            alpha: 窗口不透明度
+        """
+        self.ui = ui
+        self.alpha = alpha
+        self.window: Optional["tk.Toplevel"] = None
+        self.text_widget: Optional["scrolledtext.ScrolledText"] = None
+        self.visible = False
+
+    def _ui(self) -> "TkUIThread":
+        if self.ui is None:
+            from .dispatch import default_ui
+            self.ui = default_ui()
+        return self.ui
+
     def show(self, content: str, x: Optional[int] = None, y: Optional[int] = None):
         """
         显示浮窗
-        
+
         Args:
             content: 要显示的内容
             x, y: 窗口位置（None 则显示在鼠标位置附近）
         """
-        # 如果窗口已存在，先关闭
-        if self.window:
-            self.hide()
-        
-        # 创建新窗口
-        self.window = tk.Tk()
-        self.window.title("WhatShouldICite")
-        
-        # 设置窗口属性
-        self.window.overrideredirect(True)  # 无边框
-        self.window.attributes('-topmost', True)  # 置顶
-        self.window.attributes('-alpha', 0.95)  # 半透明（可选）
-        
-        # 设置窗口大小
-        width = 500
-        height = 400
-        self.window.geometry(f"{width}x{height}")
-        
-        # 设置窗口位置
-        if x is None or y is None:
-            # 获取鼠标位置
-            x = self.window.winfo_pointerx()
-            y = self.window.winfo_pointery()
-            # 稍微偏移，避免遮挡鼠标
-            x += 20
-            y += 20
-        
-        self.window.geometry(f"{width}x{height}+{x}+{y}")
-        
-        # 创建文本显示区域
-        self.text_widget = scrolledtext.ScrolledText(
-            self.window,
-            wrap=tk.WORD,
-            font=("Consolas", 10),
-            bg="#2b2b2b",  # 深色背景
-            fg="#ffffff",  # 白色文字
-            insertbackground="#ffffff",
-            borderwidth=0,
-            padx=15,
-            pady=15
-        )
-        self.text_widget.pack(fill=tk.BOTH, expand=True)
-        
-        # 插入内容
-        self.text_widget.insert("1.0", content)
-        self.text_widget.config(state=tk.DISABLED)  # 只读
-        
-        # 添加关闭按钮
-        close_btn = tk.Button(
-            self.window,
-            text="关闭 (Esc)",
-            command=self.hide,
-            bg="#444444",
-            fg="#ffffff",
-            relief=tk.FLAT,
-            padx=10,
-            pady=5
-        )
-        close_btn.pack(pady=5)
-        
-        # 绑定 ESC 键关闭
-        self.window.bind('<Escape>', lambda e: self.hide())
-        self.window.bind('<Button-1>', lambda e: self._on_click_outside(e))
-        
-        # 设置焦点
-        self.window.focus_force()
-        
-        # 显示窗口（非阻塞）
-        self.window.after(100, self._show_window)
-    
-    def _show_window(self):
-        """显示窗口（在主线程中）"""
-        if self.window:
-            try:
-                self.window.mainloop()
-            except:
-                pass
-    
-    def show_async(self, content: str, x: Optional[int] = None, y: Optional[int] = None):
-        """异步显示浮窗（在新线程中）"""
-        thread = threading.Thread(
-            target=self.show,
-            args=(content, x, y),
-            daemon=True
-        )
-        thread.start()
-    
-    def _on_click_outside(self, event):
-        """点击窗口外部时关闭"""
-        # 简单实现：点击窗口本身不关闭
-        # 可以改进：检测点击是否在窗口外
-        pass
-    
+        self._ui().call(self._show, content, x, y)
+
+    def update_content(self, content: str):
+        """
+        替换已显示浮窗的内容（流式输出时逐步补全）；浮窗未显示时等同于 show
+        """
+        self._ui().call(self._update_content, content)
+
     def hide(self):
         """隐藏浮窗"""
-        if self.window:
-            try:
-                self.window.quit()
-                self.window.destroy()
-            except:
-                pass
-            self.window = None
-            self.text_widget = None
+        self._ui().call(self._hide)
 
+    def destroy(self):
+        """销毁窗口（下次显示时重新创建）"""
+        self._ui().call(self._destroy)
 
-class SimplePopupWindow:
-    """简化版浮窗（使用更轻量的实现）"""
-    
-    def __init__(self):
-        self.window: Optional[tk.Toplevel] = None
-        self._root: Optional[tk.Tk] = None
-    
-    def _ensure_root(self):
-        """确保根窗口存在"""
-        if self._root is None:
-            self._root = tk.Tk()
-            self._root.withdraw()  # 隐藏根窗口
-    
-    def show(self, content: str):
-        """显示浮窗"""
-        # 如果已有窗口，先关闭
-        if self.window:
-            self.hide()
-        
-        # 确保根窗口存在
-        self._ensure_root()
-        
-        # 创建浮窗
-        self.window = tk.Toplevel(self._root)
+    def _build(self):
+        """创建窗口和控件（UI 线程，只执行一次）"""
+        import tkinter as tk
+        from tkinter import scrolledtext
+
+        self.window = tk.Toplevel(self.ui.root)
+        self.window.withdraw()
         self.window.title("WhatShouldICite")
         self.window.overrideredirect(True)
         self.window.attributes('-topmost', True)
-        
-        width = 500
-        height = 400
-        try:
-            x = self._root.winfo_pointerx() + 20
-            y = self._root.winfo_pointery() + 20
-        except:
-            x = 100
-            y = 100
-        self.window.geometry(f"{width}x{height}+{x}+{y}")
-        
+        if self.alpha < 1.0:
+            self.window.attributes('-alpha', self.alpha)
+
         # 文本显示
-        text_widget = scrolledtext.ScrolledText(
+        self.text_widget = scrolledtext.ScrolledText(
             self.window,
             wrap=tk.WORD,
             font=("Consolas", 10),
@@ -177,15 +88,14 @@ class SimplePopupWindow:
             padx=15,
             pady=15
         )
-        text_widget.pack(fill=tk.BOTH, expand=True)
-        text_widget.insert("1.0", content)
-        text_widget.config(state=tk.DISABLED)
-        
+        self.text_widget.pack(fill=tk.BOTH, expand=True)
+        self.text_widget.config(state=tk.DISABLED)
+
         # 关闭按钮
         close_btn = tk.Button(
             self.window,
             text="关闭 (Esc)",
-            command=self.hide,
+            command=self._hide,
             bg="#444444",
             fg="#ffffff",
             relief=tk.FLAT,
@@ -193,18 +103,61 @@ class SimplePopupWindow:
             pady=5
         )
         close_btn.pack(pady=5)
-        
-        self.window.bind('<Escape>', lambda e: self.hide())
-        self.window.focus_force()
-        
-        # 更新窗口（非阻塞）
-        self._root.update()
-    
-    def hide(self):
-        """隐藏浮窗"""
-        if self.window:
+
+        self.window.bind('<Escape>', lambda e: self._hide())
+
+    def _set_text(self, content: str):
+        import tkinter as tk
+
+        self.text_widget.config(state=tk.NORMAL)
+        self.text_widget.delete("1.0", tk.END)
+        self.text_widget.insert("1.0", content)
+        self.text_widget.config(state=tk.DISABLED)
+
+    def _show(self, content: str, x: Optional[int] = None, y: Optional[int] = None):
+        if self.window is None:
+            self._build()
+        self._set_text(content)
+
+        if x is None or y is None:
+            # 显示在鼠标附近，稍微偏移避免遮挡
             try:
-                self.window.destroy()
-            except:
-                pass
-            self.window = None
+                x, y = self.window.winfo_pointerxy()
+                x += 20
+                y += 20
+            except Exception:
+                x, y = 100, 100
+        self.window.geometry(f"{self.width}x{self.height}+{x}+{y}")
+        self.window.deiconify()
+        self.window.lift()
+        self.window.focus_force()
+        self.visible = True
+
+    def _update_content(self, content: str):
+        if not self.visible:
+            self._show(content)
+        else:
+            self._set_text(content)
+
+    def _hide(self):
+        if self.window is not None:
+            self.window.withdraw()
+        self.visible = False
+
+    def _destroy(self):
+        if self.window is not None:
+            self.window.destroy()
+        self.window = None
+        self.text_widget = None
+        self.visible = False
+
+
+class CitationPopupWindow(SimplePopupWindow):
+    """引用建议浮窗（半透明；窗口操作在共享的 UI 线程中执行，不另开事件循环）"""
+
+    def __init__(self, ui: Optional["TkUIThread"] = None):
+        super().__init__(ui, alpha=0.95)
+
+    def show_async(self, content: str, x: Optional[int] = None, y: Optional[int] = None):
+        """异步显示浮窗（show 本身已不阻塞，保留此接口以兼容旧代码）"""
+        self.show(content, x, y)
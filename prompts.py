@@ -41,6 +41,7 @@ INTENT_CLASSIFY_PROMPT = """判断以下文本的引用意图类型：
 - Survey/Review（综述）
 - Foundational work（基础性工作）
 - Recent advance（最新进展）
+- Theoretical claim（理论性论断）
 - Common knowledge（常识，不需要引用）
 
 只返回类型名称，不要其他解释。"""
@@ -68,3 +69,53 @@ KEYWORD_PROMPT = """为以下文本生成3-5个检索关键词，用于查找相
 - 每个关键词一行
 
 只输出关键词，不要其他解释。"""
+
+STRUCTURED_ANALYZE_PROMPT = """你是一个科研写作助手。分析以下选中的文本，判断是否需要引用。
+
+选中文本：
+{text}
+
+只输出一个 JSON 对象，不要输出任何其他内容，字段如下：
+{{
+  "needs_citation": "Yes" | "Optional" | "No",
+  "reason": "简短一句话说明原因（不超过50字）",
+  "intent": "factual_claim" | "method_technique" | "comparison" | "survey_review" | "foundational_work" | "recent_advance" | "theoretical_claim" | "common_knowledge" | "unknown",
+  "citation_types": ["Foundational works on XXX", "Recent methods for XXX"],
+  "keywords": ["keyword1 keyword2", "keyword3 keyword4"]
+}}
+
+重要要求：
+- 只做分类和推断，不要编造具体的论文标题或作者名
+- citation_types 最多 3 项，keywords 3-5 项
+- 如果不需要引用，citation_types 和 keywords 输出空数组"""
+
+JSON_REPAIR_PROMPT = """下面的内容本应是一个 JSON 对象，但格式有误或被截断：
+
+{response}
+
+请修复并只输出合法的 JSON 对象，字段为 needs_citation、reason、intent、citation_types、keywords，不要输出任何其他内容。"""
+
+BATCH_ANALYZE_PROMPT = """你是一个科研写作助手。下面是从同一篇稿件中摘出的若干句子，逐句判断是否需要引用。
+
+句子（每行以编号开头）：
+{sentences}
+
+只输出一个 JSON 对象，不要输出任何其他内容，格式如下：
+{{
+  "results": [
+    {{
+      "id": 1,
+      "needs_citation": "Yes" | "Optional" | "No",
+      "reason": "简短一句话说明原因（不超过50字）",
+      "intent": "factual_claim" | "method_technique" | "comparison" | "survey_review" | "foundational_work" | "recent_advance" | "theoretical_claim" | "common_knowledge" | "unknown",
+      "citation_types": ["Foundational works on XXX"],
+      "keywords": ["keyword1 keyword2"]
+    }}
+  ]
+}}
+
+重要要求：
+- 每个编号恰好输出一项，id 与句子编号一致，按编号顺序输出
+- 只做分类和推断，不要编造具体的论文标题或作者名
+- citation_types 最多 3 项，keywords 最多 3 项
+- 如果不需要引用，citation_types 和 keywords 输出空数组"""
@@ -0,0 +1,419 @@
+"""
+录制 / 回放 LLM 后端 - 无网络、无 API key 时可复现地测试和压测 LLM 模式
+"""
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Union
+
+from .cache import make_cache_key
+from .llm_client import LLMClient, LLMError, LLMTimeoutError, RetryableLLMError
+
+
+class LatencyModel:
+    """
+    合成延迟分布
+
+    规格字符串：
+    - "fixed:0.2"：固定 0.2 秒
+    - "uniform:0.1,0.5"：0.1~0.5 秒均匀分布
+    - "lognormal:0.4,0.5"：中位数 0.4 秒、对数标准差 0.5 的对数正态分布（长尾）
+    """
+
+    def __init__(self, spec: str = "fixed:0", rng: Optional[random.Random] = None):
+        """
+        Args:
+            spec: 分布规格
+            rng: 随机数生成器（指定种子可复现）
+        """
+        kind, _, params = spec.partition(":")
+        try:
+            values = [float(v) for v in params.split(",")] if params else []
+        except ValueError:
+            raise ValueError(f"无效的延迟规格: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"无效的延迟规格: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.values = values
+        self._rng = rng or random.Random()
+
+    def sample(self) -> float:
+        """抽取一次延迟（秒）"""
+        if self.kind == "fixed":
+            return self.values[0]
+        if self.kind == "uniform":
+            low, high = self.values
+            return self._rng.uniform(low, high)
+        median, sigma = self.values
+        return self._rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+class ReplayLLMClient(LLMClient):
+    """
+    录制 / 回放 LLM 客户端
+
+    - record 模式：调用真实客户端，记录 (提示词, 生成参数) -> 响应，
+      在 flush() / close()（或 with 块结束）时写入回放文件
+    - replay 模式：从回放文件返回响应，可叠加合成延迟和错误率
+    """
+
+    VERSION = 1
+    # 各客户端的默认生成参数：取默认值的参数不参与回放键，
+    # 这样省略参数的调用与显式传默认值的请求（如经 OpenAI 兼容服务转发的请求）能对上
+    DEFAULT_PARAMS = {"temperature": 0.3, "max_tokens": 500, "json_mode": False}
+
+    def __init__(
+        self,
+        fixture_path: Optional[str],
+        mode: str = "replay",
+        client: Optional[LLMClient] = None,
+        latency: Union[str, LatencyModel, None] = None,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        default: Union[str, Callable[[str], str], None] = None,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Args:
+            fixture_path: 回放文件路径（JSON）；None 表示不使用回放文件，全部返回 default
+            mode: "record" 或 "replay"
+            client: record 模式下的真实 LLM 客户端
+            latency: 回放时的合成延迟（分布规格或 LatencyModel），None 表示无延迟
+            error_rate: 回放时返回可重试错误的概率
+            seed: 随机种子（延迟和错误可复现）
+            default: 回放文件中没有该请求时的响应（字符串或 prompt -> 响应的函数），
+                None 表示抛出 LLMError
+            sleep: 等待函数（便于测试）
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未知的模式: {mode}")
+        if mode == "record" and (client is None or fixture_path is None):
+            raise ValueError("record 模式需要提供真实的 LLM 客户端和回放文件路径")
+        self.fixture_path = fixture_path
+        self.mode = mode
+        self.client = client
+        self._rng = random.Random(seed)
+        if isinstance(latency, str):
+            latency = LatencyModel(latency, self._rng)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.default = default
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        if fixture_path and os.path.exists(fixture_path):
+            with open(fixture_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.entries = data.get("entries", {})
+
+    @property
+    def model(self) -> str:
+        return getattr(self.client, "model", "replay")
+
+    @classmethod
+    def request_params(cls, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """参与回放键的生成参数（超时、截止时间和取默认值的参数不参与）"""
+        return {
+            k: v for k, v in kwargs.items()
+            if k not in ("timeout", "deadline") and not (k in cls.DEFAULT_PARAMS and v == cls.DEFAULT_PARAMS[k])
+        }
+
+    @classmethod
+    def request_key(cls, prompt: str, kwargs: Dict[str, Any]) -> str:
+        """请求的回放键"""
+        return make_cache_key(prompt, **cls.request_params(kwargs))
+
+    def save(self):
+        """写回回放文件（原子替换）"""
+        with self._lock:
+            data = {"version": self.VERSION, "entries": dict(self.entries)}
+            self._dirty = False
+        tmp_path = f"{self.fixture_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.fixture_path)
+
+    def flush(self):
+        """把录制的新响应写入回放文件（没有新响应时不写）"""
+        if self._dirty:
+            self.save()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def warmup(self) -> bool:
+        if self.mode == "record":
+            return self.client.warmup()
+        return True
+
+    def _record(self, prompt: str, kwargs: Dict[str, Any]) -> str:
+        response = self.client.complete(prompt, **kwargs)
+        with self._lock:
+            self.entries[self.request_key(prompt, kwargs)] = {
+                "prompt": prompt, "params": self.request_params(kwargs), "response": response
+            }
+            self._dirty = True
+        return response
+
+    def _lookup(self, prompt: str, kwargs: Dict[str, Any]) -> str:
+        entry = self.entries.get(self.request_key(prompt, kwargs))
+        with self._lock:
+            if entry is not None:
+                self.hits += 1
+                return entry["response"]
+            self.misses += 1
+        if self.default is None:
+            raise LLMError("回放文件中没有该请求，请先用 record 模式录制")
+        return self.default(prompt) if callable(self.default) else self.default
+
+    def _simulate(self, timeout: Optional[float]) -> float:
+        """抽取合成延迟和错误；超时或注入错误时抛出异常"""
+        with self._lock:
+            delay = self.latency.sample() if self.latency else 0.0
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+        if timeout is not None and delay > timeout:
+            self._sleep(timeout)
+            raise LLMTimeoutError(f"模拟请求超时（{timeout:.2f} 秒）")
+        if failed:
+            # 错误通常比正常响应返回得快
+            self._sleep(delay / 4)
+            raise RetryableLLMError("模拟服务端错误: 503 Service Unavailable")
+        return delay
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        if self.mode == "record":
+            return self._record(prompt, kwargs)
+        delay = self._simulate(kwargs.get("timeout"))
+        response = self._lookup(prompt, kwargs)
+        if delay:
+            self._sleep(delay)
+        return response
+
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """回放时按行产出，首行约在 30% 延迟处到达，其余行均匀分布"""
+        if self.mode == "record":
+            yield self._record(prompt, kwargs)
+            return
+        delay = self._simulate(kwargs.get("timeout"))
+        response = self._lookup(prompt, kwargs)
+        lines = response.splitlines(keepends=True) or [response]
+        if delay:
+            self._sleep(delay * 0.3)
+        rest = delay * 0.7 / max(1, len(lines) - 1)
+        for i, line in enumerate(lines):
+            if i and rest:
+                self._sleep(rest)
+            yield line
+
+
+def _last_user_message(messages: Any) -> str:
+    for message in reversed(messages or []):
+        if message.get("role") == "user":
+            content = message.get("content", "")
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content
+    return ""
+
+
+def make_openai_server(client: LLMClient, host: str = "127.0.0.1", port: int = 0):
+    """
+    创建 OpenAI 兼容的本地 HTTP 服务（/v1/chat/completions、/v1/models/<id>）
+
+    任何 LLMClient（通常是回放模式的 ReplayLLMClient）都可以挂在后面，
+    把 OpenAIClient 的 base_url 指向该服务即可离线运行完整的 LLM 路径。
+
+    Returns:
+        ThreadingHTTPServer 实例（调用 serve_forever() 启动；port=0 时由系统分配端口，
+        实际端口见 server.server_address）
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    model_name = getattr(client, "model", "replay")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: Dict[str, Any]):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status: int, message: str, kind: str):
+            self._send_json(status, {"error": {"message": message, "type": kind}})
+
+        def do_GET(self):
+            if self.path.startswith("/v1/models/"):
+                model = self.path[len("/v1/models/"):]
+                self._send_json(200, {"id": model, "object": "model", "owned_by": "replay"})
+            else:
+                self._send_error(404, f"unknown path {self.path}", "not_found")
+
+        def do_POST(self):
+            if self.path != "/v1/chat/completions":
+                self._send_error(404, f"unknown path {self.path}", "not_found")
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_error(400, "invalid JSON", "invalid_request_error")
+                return
+
+            prompt = _last_user_message(request.get("messages"))
+            kwargs: Dict[str, Any] = {k: request[k] for k in ("temperature", "max_tokens") if k in request}
+            if (request.get("response_format") or {}).get("type") == "json_object":
+                kwargs["json_mode"] = True
+            created = int(time.time())
+            model = request.get("model") or model_name
+
+            try:
+                if request.get("stream"):
+                    self._stream(client.stream(prompt, **kwargs), model, created)
+                    return
+                content = client.complete(prompt, **kwargs)
+            except RetryableLLMError as e:
+                self._send_error(503, str(e), "server_error")
+                return
+            except LLMError as e:
+                self._send_error(400, str(e), "invalid_request_error")
+                return
+
+            self._send_json(200, {
+                "id": f"chatcmpl-replay-{created}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": len(prompt) // 4 + 1,
+                    "completion_tokens": len(content) // 4 + 1,
+                    "total_tokens": (len(prompt) + len(content)) // 4 + 2
+                }
+            })
+
+        def _stream(self, chunks: Iterator[str], model: str, created: int):
+            """以 SSE 格式逐段发送（分块传输编码）"""
+            chunks = iter(chunks)
+            try:
+                first = next(chunks, None)
+            except RetryableLLMError as e:
+                self._send_error(503, str(e), "server_error")
+                return
+            except LLMError as e:
+                self._send_error(400, str(e), "invalid_request_error")
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(data: str):
+                payload = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(payload):X}\r\n".encode() + payload + b"\r\n")
+                self.wfile.flush()
+
+            def event(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+                return json.dumps({
+                    "id": f"chatcmpl-replay-{created}",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+                }, ensure_ascii=False)
+
+            if first is not None:
+                send(event({"role": "assistant", "content": first}))
+                for chunk in chunks:
+                    send(event({"content": chunk}))
+            send(event({}, "stop"))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main():
+    """命令行入口：录制或以 OpenAI 兼容服务的形式回放"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite LLM 录制 / 回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="以 OpenAI 兼容 HTTP 服务回放")
+    serve.add_argument("fixture", help="回放文件")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency", default="fixed:0", help='延迟分布，如 "lognormal:0.4,0.5"')
+    serve.add_argument("--error-rate", type=float, default=0.0, help="注入的可重试错误比例")
+    serve.add_argument("--seed", type=int, default=None)
+    serve.add_argument("--default", default=None, help="回放文件中没有该请求时返回的响应")
+
+    record = sub.add_parser("record", help="用真实 LLM 分析文本并录制响应")
+    record.add_argument("fixture", help="回放文件")
+    record.add_argument("inputs", help="每行一段文本的输入文件")
+    record.add_argument("--provider", choices=["openai", "anthropic"], default="openai")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        client = ReplayLLMClient(
+            args.fixture, latency=args.latency, error_rate=args.error_rate,
+            seed=args.seed, default=args.default
+        )
+        server = make_openai_server(client, args.host, args.port)
+        host, port = server.server_address[:2]
+        print(f"🎞  回放 {len(client.entries)} 条响应: http://{host}:{port}/v1")
+        print(f"   OpenAIClient(api_key=\"replay\", base_url=\"http://{host}:{port}/v1\")")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return
+
+    from .agent import CitationAgent
+    from .llm_client import shared_client
+
+    env = {"openai": "OPENAI_API_KEY", "anthropic": "ANTHROPIC_API_KEY"}[args.provider]
+    api_key = os.getenv(env)
+    if not api_key:
+        parser.error(f"record 模式需要设置 {env}")
+    with open(args.inputs, "r", encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    with ReplayLLMClient(args.fixture, mode="record", client=shared_client(args.provider, api_key)) as client:
+        agent = CitationAgent(llm_client=client, single_call=True)
+        for text in texts:
+            agent.analyze_structured(text)
+    print(f"✅ 已录制 {len(client.entries)} 条响应到 {args.fixture}")
+
+
+if __name__ == "__main__":
+    main()
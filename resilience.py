@@ -0,0 +1,408 @@
+"""
+LLM 调用的截止时间、重试与对冲请求 - 降低快捷键路径的尾延迟
+"""
+
+import contextvars
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from . import usage
+from .llm_client import LLMClient, LLMTimeoutError, RetryableLLMError
+
+
+_END = object()
+
+
+class Deadline:
+    """截止时间预算"""
+
+    def __init__(self, seconds: Optional[float], timer: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            seconds: 预算（秒），None 表示不限
+            timer: 时钟函数（便于测试）
+        """
+        self._timer = timer
+        self.expires_at = timer() + seconds if seconds is not None else None
+
+    def remaining(self) -> Optional[float]:
+        """剩余时间（秒），不限时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - self._timer())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and self._timer() >= self.expires_at
+
+
+class RetryPolicy:
+    """带上限和完全抖动（full jitter）的指数退避"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        rng: Callable[[], float] = random.random
+    ):
+        """
+        Args:
+            max_attempts: 最多尝试次数（含第一次）
+            base_delay: 第一次重试前的退避上限（秒）
+            max_delay: 单次退避的上限（秒）
+            rng: [0, 1) 随机数函数（便于测试）
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts 必须大于 0")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng
+
+    def delay(self, attempt: int) -> float:
+        """第 attempt 次（从 0 开始）失败后的等待时间"""
+        return self._rng() * min(self.max_delay, self.base_delay * (2 ** attempt))
+
+
+class LatencyWindow:
+    """最近若干次成功调用的延迟，用于计算对冲阈值"""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """第 p 百分位延迟（秒），没有样本时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class ResilientLLMClient(LLMClient):
+    """
+    带截止时间、重试和对冲请求的 LLM 客户端包装器
+
+    - 每次 complete 有一个总的截止时间预算，单次尝试的超时不超过剩余预算
+    - RetryableLLMError（超时、限流、5xx、连接错误）按抖动指数退避重试；
+      其他错误直接抛出
+    - 开启对冲后，若请求耗时超过近期延迟的第 hedge_percentile 百分位，
+      再并发发出一个相同请求，先返回者胜出
+    """
+
+    def __init__(
+        self,
+        client: LLMClient,
+        deadline: Optional[float] = 10.0,
+        attempt_timeout: Optional[float] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: bool = False,
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 20,
+        hedge_delay: Optional[float] = None,
+        max_workers: int = 8,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Args:
+            client: 被包装的 LLM 客户端（建议关闭 SDK 内置重试：max_retries=0）
+            deadline: 每次调用的总预算（秒），None 表示不限
+            attempt_timeout: 单次尝试的超时（秒），默认只受总预算约束
+            retry: 重试策略（默认最多 3 次尝试）
+            hedge: 是否发送对冲请求
+            hedge_percentile: 对冲阈值所取的延迟百分位
+            hedge_min_samples: 样本数达到该值后才按百分位对冲
+            hedge_delay: 样本不足时使用的固定对冲阈值（秒），None 表示样本不足时不对冲
+            max_workers: 执行请求的线程数
+            sleep: 退避等待函数（便于测试）
+        """
+        self.client = client
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.retry = retry or RetryPolicy()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self.latencies = LatencyWindow()
+        self._sleep = sleep
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0,
+                         "hedge_wins": 0, "timeouts": 0, "failures": 0}
+
+    @property
+    def model(self) -> str:
+        return getattr(self.client, "model", type(self.client).__name__)
+
+    def warmup(self) -> bool:
+        return self.client.warmup()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="llm-request"
+                )
+            return self._executor
+
+    def _attempt_timeout(self, budget: Deadline) -> Optional[float]:
+        limits = [t for t in (budget.remaining(), self.attempt_timeout) if t is not None]
+        return min(limits) if limits else None
+
+    def _hedge_after(self) -> Optional[float]:
+        """本次请求的对冲阈值（秒），None 表示不对冲"""
+        if not self.hedge:
+            return None
+        if len(self.latencies) >= self.hedge_min_samples:
+            return self.latencies.percentile(self.hedge_percentile)
+        return self.hedge_delay
+
+    def _timed_complete(self, prompt: str, timeout: Optional[float], kwargs: Dict[str, Any]) -> str:
+        start = time.perf_counter()
+        result = self.client.complete(prompt, timeout=timeout, **kwargs)
+        self.latencies.record(time.perf_counter() - start)
+        return result
+
+    def _submit(self, fn: Callable[..., Any], *args):
+        # 复制调用方的上下文，用量上报才能归到发起这次调用的记录上
+        context = contextvars.copy_context()
+        return self._pool().submit(context.run, fn, *args)
+
+    def _attempt(self, prompt: str, timeout: Optional[float], kwargs: Dict[str, Any]) -> str:
+        """
+        执行一次尝试（可能包含一个对冲请求）
+
+        请求在线程池中执行，即使底层 SDK 未遵守超时，调用方也会按时返回。
+        """
+        self._count("attempts")
+        budget = Deadline(timeout)
+        futures = [self._submit(self._timed_complete, prompt, timeout, kwargs)]
+
+        hedge_after = self._hedge_after()
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            done, _ = wait(futures, timeout=hedge_after)
+            if not done:
+                self._count("hedges")
+                usage.report_hedge()
+                futures.append(self._submit(self._timed_complete, prompt, self._attempt_timeout(budget), kwargs))
+
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=budget.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if future is not futures[0]:
+                    self._count("hedge_wins")
+                return result
+        if error is not None and not pending:
+            raise error
+        self._count("timeouts")
+        raise LLMTimeoutError(f"LLM 请求超时（{timeout:.1f} 秒）")
+
+    def complete(self, prompt: str, deadline: Optional[float] = None, **kwargs) -> str:
+        """
+        在截止时间内完成调用（按需重试、对冲）
+
+        Args:
+            prompt: 提示词
+            deadline: 覆盖默认的总预算（秒）
+        """
+        self._count("calls")
+        kwargs.pop("timeout", None)
+        budget = Deadline(deadline if deadline is not None else self.deadline)
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.retry.max_attempts):
+            if budget.expired():
+                break
+            try:
+                return self._attempt(prompt, self._attempt_timeout(budget), kwargs)
+            except RetryableLLMError as e:
+                last_error = e
+            if attempt + 1 >= self.retry.max_attempts:
+                break
+            pause = self.retry.delay(attempt)
+            remaining = budget.remaining()
+            if remaining is not None and pause >= remaining:
+                break
+            self._count("retries")
+            usage.report_retry()
+            self._sleep(pause)
+
+        self._count("failures")
+        if last_error is None or budget.expired():
+            raise LLMTimeoutError(f"LLM 调用超出截止时间: {last_error or '无可用时间'}")
+        raise last_error
+
+    def _feed_stream(self, index: int, prompt: str, timeout: Optional[float], kwargs: Dict[str, Any],
+                     results: "queue.Queue", cancel: threading.Event):
+        """在线程池中读取一个流，把 (index, chunk, error) 放入 results；取消后关闭底层流"""
+        iterator = None
+        try:
+            iterator = iter(self.client.stream(prompt, timeout=timeout, **kwargs))
+            for chunk in iterator:
+                if cancel.is_set():
+                    break
+                results.put((index, chunk, None))
+        except BaseException as e:
+            results.put((index, _END, e))
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+        results.put((index, _END, None))
+
+    def _stream_attempt(self, prompt: str, timeout: Optional[float], kwargs: Dict[str, Any]) -> Iterator[str]:
+        """
+        执行一次流式尝试（可能包含一个对冲流）
+
+        第一个 token 超过对冲阈值仍未到达时再发出一个相同的流，先产出 token 者胜出，
+        另一个被关闭。timeout 约束整个流（而非单次读取），首 token 延迟计入延迟窗口。
+        """
+        self._count("attempts")
+        budget = Deadline(timeout)
+        results: "queue.Queue" = queue.Queue()
+        cancels = [threading.Event()]
+        start = time.perf_counter()
+        self._submit(self._feed_stream, 0, prompt, timeout, kwargs, results, cancels[0])
+
+        hedge_after = self._hedge_after()
+        hedge_at = None
+        if hedge_after is not None and (timeout is None or hedge_after < timeout):
+            hedge_at = Deadline(hedge_after)
+
+        live = {0}
+        winner: Optional[int] = None
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                wait_for = budget.remaining()
+                if winner is None and hedge_at is not None:
+                    until_hedge = hedge_at.remaining()
+                    wait_for = until_hedge if wait_for is None else min(wait_for, until_hedge)
+                try:
+                    index, chunk, e = results.get(timeout=wait_for)
+                except queue.Empty:
+                    if winner is None and hedge_at is not None and hedge_at.expired():
+                        hedge_at = None
+                        self._count("hedges")
+                        usage.report_hedge()
+                        cancels.append(threading.Event())
+                        live.add(1)
+                        self._submit(self._feed_stream, 1, prompt, self._attempt_timeout(budget), kwargs,
+                                     results, cancels[1])
+                        continue
+                    if budget.expired():
+                        self._count("timeouts")
+                        raise LLMTimeoutError(f"LLM 流式请求超时（{timeout:.1f} 秒）")
+                    continue
+
+                if winner is not None and index != winner:
+                    continue
+                if chunk is _END:
+                    if winner is not None:
+                        if e is not None:
+                            raise e
+                        return
+                    live.discard(index)
+                    error = error or e
+                    if not live:
+                        if error is not None:
+                            raise error
+                        return
+                    continue
+                if winner is None:
+                    winner = index
+                    self.latencies.record(time.perf_counter() - start)
+                    if index != 0:
+                        self._count("hedge_wins")
+                    for other, cancel in enumerate(cancels):
+                        if other != winner:
+                            cancel.set()
+                yield chunk
+        finally:
+            for cancel in cancels:
+                cancel.set()
+
+    def stream(self, prompt: str, deadline: Optional[float] = None, **kwargs) -> Iterator[str]:
+        """
+        流式调用：收到第一个 token 之前的失败可以重试，之后的失败直接抛出
+
+        总预算约束整个流；开启对冲后按首 token 延迟对冲。
+        """
+        self._count("calls")
+        kwargs.pop("timeout", None)
+        budget = Deadline(deadline if deadline is not None else self.deadline)
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.retry.max_attempts):
+            if budget.expired():
+                break
+            started = False
+            try:
+                for chunk in self._stream_attempt(prompt, self._attempt_timeout(budget), kwargs):
+                    started = True
+                    yield chunk
+                return
+            except RetryableLLMError as e:
+                if started:
+                    raise
+                last_error = e
+            if attempt + 1 >= self.retry.max_attempts:
+                break
+            pause = self.retry.delay(attempt)
+            remaining = budget.remaining()
+            if remaining is not None and pause >= remaining:
+                break
+            self._count("retries")
+            usage.report_retry()
+            self._sleep(pause)
+
+        self._count("failures")
+        if last_error is None or budget.expired():
+            raise LLMTimeoutError(f"LLM 调用超出截止时间: {last_error or '无可用时间'}")
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        """重试、对冲、超时计数及延迟百分位（毫秒）"""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.counters)
+        for p in (50, 95, 99):
+            value = self.latencies.percentile(p)
+            stats[f"p{p}_ms"] = round(value * 1000, 1) if value is not None else None
+        return stats
+
+    def close(self):
+        """关闭线程池（不等待仍在进行的被放弃请求）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
@@ -5,6 +5,43 @@
 import sys
 import os
 
+HOTKEY_DEADLINE = 8.0  # 快捷键路径单次 LLM 调用的总预算（秒）
+
+
+def with_resilience(client):
+    """为 LLM 客户端加上截止时间、抖动退避重试和对冲请求"""
+    from whatshouldicite.resilience import ResilientLLMClient
+    return ResilientLLMClient(client, deadline=HOTKEY_DEADLINE, hedge=True)
+
+
+def with_disk_cache(client):
+    """为 LLM 客户端加上持久化缓存（设置 WHATSHOULDICITE_DISK_CACHE=0 可关闭）"""
+    if os.getenv("WHATSHOULDICITE_DISK_CACHE", "1") == "0":
+        return client
+    try:
+        from whatshouldicite.llm_client import CachedLLMClient
+        cached = CachedLLMClient(client)
+        print(f"✅ LLM 结果缓存: {cached.cache.path}")
+        return cached
+    except Exception as e:
+        print(f"⚠️  持久化缓存不可用，直接调用 LLM: {e}")
+        return client
+
+
+def enable_usage_ledger():
+    """记录每次 LLM 调用的 token、延迟和费用（设置 WHATSHOULDICITE_USAGE=0 可关闭）"""
+    if os.getenv("WHATSHOULDICITE_USAGE", "1") == "0":
+        return None
+    try:
+        from whatshouldicite import usage
+        ledger = usage.enable(usage.UsageLedger())
+        print(f"✅ LLM 用量账本: {ledger.path}（python -m whatshouldicite.usage stats 查看汇总）")
+        return ledger
+    except Exception as e:
+        print(f"⚠️  用量账本不可用: {e}")
+        return None
+
+
 # 尝试从环境变量或配置文件读取 API key
 def get_llm_client():
     """获取 LLM 客户端"""
@@ -27,10 +64,10 @@ def get_llm_client():
     # 选择 LLM
     if openai_key and openai_key != "your-openai-api-key-here":
         try:
-            from whatshouldicite.llm_client import OpenAIClient, UnifiedLLMClient
+            from whatshouldicite.llm_client import shared_client, UnifiedLLMClient
             print("✅ 使用 OpenAI")
-            client = OpenAIClient(api_key=openai_key)
-            return UnifiedLLMClient(client)
+            client = with_resilience(shared_client("openai", openai_key, max_retries=0))
+            return UnifiedLLMClient(with_disk_cache(client))
         except Exception as e:
             print(f"⚠️  OpenAI 初始化失败: {e}")
             print("   将使用规则判断模式")
@@ -38,10 +75,10 @@ def get_llm_client():
     
     elif anthropic_key and anthropic_key != "your-anthropic-api-key-here":
         try:
-            from whatshouldicite.llm_client import AnthropicClient, UnifiedLLMClient
+            from whatshouldicite.llm_client import shared_client, UnifiedLLMClient
             print("✅ 使用 Anthropic Claude")
-            client = AnthropicClient(api_key=anthropic_key)
-            return UnifiedLLMClient(client)
+            client = with_resilience(shared_client("anthropic", anthropic_key, max_retries=0))
+            return UnifiedLLMClient(with_disk_cache(client))
         except Exception as e:
             print(f"⚠️  Anthropic 初始化失败: {e}")
             print("   将使用规则判断模式")
@@ -64,6 +101,7 @@ def main():
     
     if llm_client:
         print("✅ LLM 模式已启用")
+        enable_usage_ledger()
     else:
         print("ℹ️  使用规则判断模式（无需 API key）")
     
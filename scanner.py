@@ -0,0 +1,559 @@
+"""
+文档扫描器 - 逐句流式分析 .tex / .md 手稿
+"""
+
+import io
+import os
+import re
+import sys
+from typing import Iterable, Iterator, Optional, Dict, Any, List, Tuple, Union, TextIO
+
+from .utils import clean_text
+
+
+# 不参与句子切分的缩写（小写，不含末尾句点）
+ABBREVIATIONS = {
+    "e.g", "i.e", "al", "cf", "fig", "figs", "eq", "eqs", "sec", "secs",
+    "tab", "ref", "refs", "vs", "v.s", "resp", "approx",
+    "dr", "mr", "ms", "prof", "ch", "app", "thm", "lem", "def", "viz"
+}
+
+# 句末标点后允许紧跟的闭合符号
+_CLOSERS = "\"')]}”’"
+
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([.,;:!?])")
+
+# 单句最大长度，超过后强制切分，保证内存占用有界
+MAX_SENTENCE_CHARS = 2000
+
+# ---- LaTeX ----
+_TEX_SKIP_ENVS = {
+    "equation", "equation*", "align", "align*", "gather", "gather*",
+    "multline", "multline*", "eqnarray", "eqnarray*", "displaymath",
+    "math", "figure", "figure*", "table", "table*", "tabular", "tikzpicture",
+    "verbatim", "lstlisting", "minted", "algorithm", "algorithmic",
+    "thebibliography", "comment"
+}
+_TEX_CITE = re.compile(
+    r"\\(?:cite|citep|citet|citealp|citealt|citeauthor|citeyear|parencite|"
+    r"textcite|autocite|footcite|nocite)\*?(?:\[[^\]]*\])*\{[^}]*\}"
+)
+_TEX_BLOCK_CMD = re.compile(
+    r"\\(?:part|chapter|section|subsection|subsubsection|paragraph|subparagraph|"
+    r"caption|title|author|date|bibliography|bibliographystyle|"
+    r"input|include|documentclass|usepackage)\*?(?:\[[^\]]*\])*\{[^}]*\}"
+)
+_TEX_DROP_CMD = re.compile(
+    r"\\(?:ref|eqref|autoref|cref|Cref|pageref|label|url|href|includegraphics)\*?"
+    r"(?:\[[^\]]*\])*\{[^}]*\}"
+)
+_TEX_ENV = re.compile(r"\\(begin|end)\{([^}]*)\}")
+_TEX_COMMAND = re.compile(r"\\[a-zA-Z@]+\*?|\\.")
+_TEX_INLINE_MATH = re.compile(r"\$[^$]*\$|\\\(.*?\\\)")
+
+# ---- Markdown ----
+_MD_FENCE = re.compile(r"^\s*(```|~~~)")
+_MD_HEADING = re.compile(r"^\s{0,3}#{1,6}\s")
+_MD_LIST = re.compile(r"^(\s*)([-*+]|\d+[.)])\s")
+_MD_CITE = re.compile(r"\[(?:[^\]]*@[\w:.-]+[^\]]*|\d+(?:\s*[,–-]\s*\d+)*)\]")
+_MD_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_MD_CODE = re.compile(r"`[^`]*`")
+_MD_HTML = re.compile(r"<[^>]+>")
+_MD_INLINE_MATH = re.compile(r"\$[^$]*\$")
+
+
+def _mask(line: str, start: int, end: int) -> str:
+    """把 [start, end) 区间替换为空格，保持列号不变"""
+    return line[:start] + " " * (end - start) + line[end:]
+
+
+def _mask_all(pattern: "re.Pattern", line: str) -> Tuple[str, List[Tuple[int, int]]]:
+    """把所有匹配替换为空格，返回 (新行, 被掩码的 [start, end) 区间列表)"""
+    spans = []
+    for m in pattern.finditer(line):
+        line = _mask(line, m.start(), m.end())
+        spans.append((m.start(), m.end()))
+    return line, spans
+
+
+class Sentence:
+    """从文档中切分出的一个句子"""
+
+    __slots__ = ("text", "line", "column", "cited", "end_line", "end_column")
+
+    def __init__(
+        self,
+        text: str,
+        line: int,
+        column: int,
+        cited: bool = False,
+        end_line: Optional[int] = None,
+        end_column: Optional[int] = None
+    ):
+        """
+        Args:
+            text: 句子文本（已去除标记并合并空白）
+            line: 句子起始行号（从 1 开始）
+            column: 句子起始列号（从 1 开始）
+            cited: 原文中该句是否已带有引用标记
+            end_line: 句子最后一个字符所在行号（默认与 line 相同）
+            end_column: 句子最后一个字符的列号（从 1 开始，默认与 column 相同）
+        """
+        self.text = text
+        self.line = line
+        self.column = column
+        self.cited = cited
+        self.end_line = end_line if end_line is not None else line
+        self.end_column = end_column if end_column is not None else column
+
+    def shifted(self, lines: int) -> "Sentence":
+        """行号整体平移 lines 行后的副本"""
+        return Sentence(self.text, self.line + lines, self.column, self.cited,
+                        self.end_line + lines, self.end_column)
+
+    def __repr__(self) -> str:
+        return f"Sentence({self.line}:{self.column}, {self.text!r})"
+
+
+class SentenceSplitter:
+    """
+    增量句子切分器
+
+    逐行输入，去除 LaTeX / Markdown 标记（用空格替换以保持列号），
+    遇到句末标点、空行或标题等块级边界时输出句子。只缓存当前句子，
+    内存占用与文档长度无关。
+    """
+
+    def __init__(self, syntax: str = "text"):
+        """
+        Args:
+            syntax: "tex" / "md" / "text"
+        """
+        if syntax not in ("tex", "md", "text"):
+            raise ValueError(f"不支持的文档格式: {syntax}")
+        self.syntax = syntax
+        self._parts: List[str] = []
+        self._length = 0
+        self._start: Optional[Tuple[int, int]] = None
+        self._end: Optional[Tuple[int, int]] = None
+        self._cited = False
+        self._cite_spans: List[Tuple[int, int]] = []  # 当前行中引用标记的列区间
+        # 块级状态
+        self._skip_env: Optional[str] = None
+        self._in_preamble = False
+        self._in_display_math = False
+        self._in_fence = False
+        self._in_front_matter = False
+        self._line_count = 0
+
+    def feed_line(self, line: str, lineno: int) -> Iterator[Sentence]:
+        """
+        输入一行文本
+
+        Args:
+            line: 一行原文（可带换行符）
+            lineno: 行号（从 1 开始）
+
+        Yields:
+            在本行内结束的句子
+        """
+        self._line_count += 1
+        line = line.rstrip("\r\n")
+        self._cite_spans = []
+
+        if self.syntax == "tex":
+            line, is_break = self._strip_tex(line)
+        elif self.syntax == "md":
+            line, is_break = self._strip_md(line)
+        else:
+            is_break = False
+
+        if is_break or not line.strip():
+            # 块级边界或空行：结束当前句子
+            yield from self.flush()
+            if not line.strip():
+                return
+
+        yield from self._split(line, lineno)
+
+    def flush(self) -> Iterator[Sentence]:
+        """输出缓存中尚未结束的句子"""
+        if self._start is not None:
+            # 被掩码的引用/公式会在标点前留下空格
+            text = _SPACE_BEFORE_PUNCT.sub(r"\1", clean_text("".join(self._parts)))
+            if any(ch.isalpha() for ch in text):
+                end_line, end_column = self._end or self._start
+                yield Sentence(text, self._start[0], self._start[1], self._cited, end_line, end_column)
+        self._parts = []
+        self._length = 0
+        self._start = None
+        self._end = None
+        self._cited = False
+
+    def checkpoint(self) -> Tuple[Any, ...]:
+        """
+        块级状态快照（可哈希）
+
+        仅在没有未结束的句子时（如空行之后）有意义；相同快照加相同输入必然得到相同输出。
+        """
+        return (self._skip_env, self._in_preamble, self._in_display_math,
+                self._in_fence, self._in_front_matter, min(self._line_count, 1))
+
+    def resume(self, state: Tuple[Any, ...]):
+        """恢复 checkpoint() 得到的块级状态"""
+        (self._skip_env, self._in_preamble, self._in_display_math,
+         self._in_fence, self._in_front_matter, self._line_count) = state
+
+    def _split(self, line: str, lineno: int) -> Iterator[Sentence]:
+        """在一行内查找句子边界"""
+        pos = 0
+        n = len(line)
+        i = 0
+        while i < n:
+            ch = line[i]
+            if self._start is None:
+                if ch.isspace():
+                    i += 1
+                    pos = i
+                    continue
+                self._start = (lineno, i + 1)
+            if ch in ".!?" and self._is_boundary(line, i):
+                end = i + 1
+                while end < n and line[end] in _CLOSERS:
+                    end += 1
+                self._mark_cited(pos, end)
+                self._append(line[pos:end])
+                self._end = (lineno, end)
+                yield from self.flush()
+                i = pos = end
+                continue
+            if self._length + (i - pos) >= MAX_SENTENCE_CHARS:
+                self._mark_cited(pos, i)
+                self._append(line[pos:i])
+                self._end = (lineno, len(line[:i].rstrip()))
+                yield from self.flush()
+                pos = i
+                continue
+            i += 1
+        if self._start is not None:
+            self._mark_cited(pos, n)
+            self._append(line[pos:] + " ")
+            tail = len(line.rstrip())
+            if tail > pos:
+                self._end = (lineno, tail)
+
+    def _mark_cited(self, start: int, end: int):
+        """当前行 [start, end) 属于当前句子：其中有引用标记时把该句标为已引用"""
+        if any(start <= span_start < end for span_start, _ in self._cite_spans):
+            self._cited = True
+
+    def _append(self, piece: str):
+        self._parts.append(piece)
+        self._length += len(piece)
+
+    def _is_boundary(self, line: str, i: int) -> bool:
+        """判断 line[i] 处的标点是否为句末"""
+        j = i + 1
+        while j < len(line) and line[j] in _CLOSERS:
+            j += 1
+        if j < len(line) and not line[j].isspace():
+            return False  # 如 0.05、e.g.、URL 中的点
+        if line[i] != ".":
+            return True
+
+        # 检查缩写与单字母首字母缩写
+        k = i
+        while k > 0 and (line[k - 1].isalnum() or line[k - 1] == "."):
+            k -= 1
+        word = line[k:i].lower()
+        if word in ABBREVIATIONS:
+            return False
+        if len(word) == 1 and word.isalpha() and line[k].isupper():
+            return False
+        # "et al." 后接小写字母时不切分
+        rest = line[j:].lstrip()
+        if word == "al" and (not rest or rest[0].islower()):
+            return False
+        return True
+
+    def _strip_tex(self, line: str) -> Tuple[str, bool]:
+        """去除 LaTeX 标记，返回 (掩码后的行, 是否为块级边界)"""
+        # 注释
+        m = re.search(r"(?<!\\)%", line)
+        if m:
+            line = _mask(line, m.start(), len(line))
+
+        stripped = line.strip()
+        if stripped.startswith("\\documentclass"):
+            self._in_preamble = True
+        if self._in_preamble:
+            if "\\begin{document}" in line:
+                self._in_preamble = False
+            return "", True
+
+        if self._skip_env is not None:
+            if f"\\end{{{self._skip_env}}}" in line:
+                self._skip_env = None
+            return "", True
+        if self._in_display_math:
+            if "\\]" in line or "$$" in line:
+                self._in_display_math = False
+            return "", True
+        if stripped.startswith("\\[") or stripped.startswith("$$"):
+            if not (stripped.endswith("\\]") or (stripped.endswith("$$") and len(stripped) > 2)):
+                self._in_display_math = True
+            return "", True
+
+        is_break = False
+        for m in _TEX_ENV.finditer(line):
+            name = m.group(2)
+            if m.group(1) == "begin" and name in _TEX_SKIP_ENVS:
+                if f"\\end{{{name}}}" not in line[m.end():]:
+                    self._skip_env = name
+                return _mask(line, m.start(), len(line)), True
+            is_break = True
+        line, _ = _mask_all(_TEX_ENV, line)
+
+        line, self._cite_spans = _mask_all(_TEX_CITE, line)
+        line, block = _mask_all(_TEX_BLOCK_CMD, line)
+        if re.match(r"\s*\\item\b", line):
+            is_break = True
+        line, _ = _mask_all(_TEX_DROP_CMD, line)
+        line, _ = _mask_all(_TEX_INLINE_MATH, line)
+        line, _ = _mask_all(_TEX_COMMAND, line)
+        line = line.replace("{", " ").replace("}", " ").replace("~", " ")
+        return line, is_break or bool(block)
+
+    def _strip_md(self, line: str) -> Tuple[str, bool]:
+        """去除 Markdown 标记，返回 (掩码后的行, 是否为块级边界)"""
+        stripped = line.strip()
+
+        if self._line_count == 1 and stripped == "---":
+            self._in_front_matter = True
+            return "", True
+        if self._in_front_matter:
+            if stripped in ("---", "..."):
+                self._in_front_matter = False
+            return "", True
+        if _MD_FENCE.match(line):
+            self._in_fence = not self._in_fence
+            return "", True
+        if self._in_fence:
+            return "", True
+        if self._in_display_math:
+            if stripped.endswith("$$"):
+                self._in_display_math = False
+            return "", True
+        if stripped.startswith("$$"):
+            if not (stripped.endswith("$$") and len(stripped) > 2):
+                self._in_display_math = True
+            return "", True
+        if _MD_HEADING.match(line) or stripped.startswith("|") or \
+                (len(stripped) >= 3 and set(stripped) <= set("-=*_ ")):
+            return "", True
+
+        is_break = False
+        m = _MD_LIST.match(line)
+        if m:
+            line = _mask(line, m.start(2), m.end(2))
+            is_break = True
+        if stripped.startswith(">"):
+            k = line.index(">")
+            line = _mask(line, k, k + 1)
+
+        line, self._cite_spans = _mask_all(_MD_CITE, line)
+        line, _ = _mask_all(_MD_IMAGE, line)
+        for m in _MD_LINK.finditer(line):
+            # 保留链接文字，去掉括号和 URL
+            line = _mask(line, m.start(), m.start() + 1)
+            line = _mask(line, m.end(1), m.end())
+        line, _ = _mask_all(_MD_CODE, line)
+        line, _ = _mask_all(_MD_HTML, line)
+        line, _ = _mask_all(_MD_INLINE_MATH, line)
+        line = re.sub(r"(\*{1,3}|(?<!\w)_{1,3}|_{1,3}(?!\w))", lambda m: " " * len(m.group()), line)
+        return line, is_break
+
+
+def detect_syntax(path: Optional[str]) -> str:
+    """根据文件扩展名推断文档格式"""
+    if not path:
+        return "text"
+    ext = os.path.splitext(str(path))[1].lower()
+    if ext in (".tex", ".latex", ".ltx"):
+        return "tex"
+    if ext in (".md", ".markdown", ".mdown", ".rmd", ".qmd"):
+        return "md"
+    return "text"
+
+
+def iter_sentences(
+    source: Union[str, "os.PathLike", TextIO, Iterable[str]],
+    syntax: Optional[str] = None
+) -> Iterator[Sentence]:
+    """
+    惰性地从文档中切分句子
+
+    Args:
+        source: 文件路径，或按行迭代的文本流
+        syntax: "tex" / "md" / "text"（默认根据扩展名推断）
+
+    Yields:
+        Sentence 对象
+    """
+    if isinstance(source, (str, os.PathLike)):
+        if syntax is None:
+            syntax = detect_syntax(os.fspath(source))
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            yield from iter_sentences(f, syntax)
+        return
+
+    if syntax is None:
+        syntax = detect_syntax(getattr(source, "name", None))
+
+    splitter = SentenceSplitter(syntax)
+    for lineno, line in enumerate(source, 1):
+        yield from splitter.feed_line(line, lineno)
+    yield from splitter.flush()
+
+
+class IncrementalSplitter:
+    """
+    按段落缓存切分结果的句子切分器
+
+    文档按空行分段，每段的切分结果以 (进入时的块级状态, 段落原文) 为键缓存。
+    编辑后再次切分时，只有改动过的段落（以及块级状态因此改变的后续段落）
+    需要重新切分，其余段落只平移行号。
+    """
+
+    def __init__(self, syntax: str = "text"):
+        """
+        Args:
+            syntax: "tex" / "md" / "text"
+        """
+        SentenceSplitter(syntax)  # 校验 syntax
+        self.syntax = syntax
+        self._blocks: Dict[Tuple[Any, str], Tuple[List[Sentence], Tuple[Any, ...]]] = {}
+
+    @staticmethod
+    def _paragraphs(lines: List[str]) -> Iterator[Tuple[int, List[str]]]:
+        """按空行分段，产出 (段首行下标, 段内各行)，空行归入上一段"""
+        start = 0
+        for i, line in enumerate(lines):
+            if not line.strip():
+                yield start, lines[start:i + 1]
+                start = i + 1
+        if start < len(lines):
+            yield start, lines[start:]
+
+    def split(self, lines: Iterable[str]) -> List[Sentence]:
+        """
+        切分整篇文档
+
+        Args:
+            lines: 文档各行（可带换行符）
+
+        Returns:
+            与 iter_sentences 结果相同的句子列表
+        """
+        lines = list(lines)
+        splitter = SentenceSplitter(self.syntax)
+        sentences: List[Sentence] = []
+        used = {}
+        for start, block in self._paragraphs(lines):
+            key = (splitter.checkpoint(), "".join(block))
+            entry = self._blocks.get(key) or used.get(key)
+            if entry is None:
+                # 段内行号从 1 开始，复用时再平移到实际位置
+                block_sentences = []
+                for offset, line in enumerate(block, 1):
+                    block_sentences.extend(splitter.feed_line(line, offset))
+                block_sentences.extend(splitter.flush())
+                entry = (block_sentences, splitter.checkpoint())
+            else:
+                splitter.resume(entry[1])
+            used[key] = entry
+            sentences.extend(sentence.shifted(start) for sentence in entry[0])
+        self._blocks = used
+        return sentences
+
+
+def scan_document(
+    source: Union[str, "os.PathLike", TextIO, Iterable[str]],
+    agent: Optional[Any] = None,
+    syntax: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    流式扫描整篇文档，逐句输出引用判断
+
+    复用 CitationAgent 的 classify → plan → keywords 流水线；
+    原文已带引用标记的句子不再分析。
+
+    Args:
+        source: 文件路径，或按行迭代的文本流
+        agent: CitationAgent 实例（默认使用规则判断）
+        syntax: "tex" / "md" / "text"（默认根据扩展名推断）
+
+    Yields:
+        结构化结果字典，额外包含 sentence / line / column / already_cited
+    """
+    if agent is None:
+        from .agent import CitationAgent
+        agent = CitationAgent()
+
+    for sentence in iter_sentences(source, syntax):
+        yield make_verdict(sentence, agent)
+
+
+def make_verdict(sentence: Sentence, agent: Any) -> Dict[str, Any]:
+    """为单个句子生成判断结果"""
+    if sentence.cited:
+        result = {
+            "text": sentence.text,
+            "needs_citation": "Yes",
+            "intent": "already_cited",
+            "confidence": 1.0,
+            "reason": "句中已包含引用",
+            "citation_types": [],
+            "keywords": []
+        }
+    else:
+        result = agent.analyze_isolated(sentence.text)
+    result["sentence"] = sentence.text
+    result["line"] = sentence.line
+    result["column"] = sentence.column
+    result["end_line"] = sentence.end_line
+    result["end_column"] = sentence.end_column
+    result["already_cited"] = sentence.cited
+    return result
+
+
+def main():
+    """命令行入口：扫描手稿并逐句输出判断"""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite 文档扫描")
+    parser.add_argument("path", help="手稿路径（.tex / .md / 纯文本），- 表示标准输入")
+    parser.add_argument("--syntax", choices=["tex", "md", "text"], help="文档格式（默认按扩展名推断）")
+    parser.add_argument("--jsonl", action="store_true", help="以 JSON Lines 输出")
+    parser.add_argument("--all", action="store_true", help="输出所有句子（默认只输出缺少引用的句子）")
+    args = parser.parse_args()
+
+    if args.path == "-":
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", errors="replace")
+    else:
+        source = args.path
+
+    for verdict in scan_document(source, syntax=args.syntax):
+        if not args.all and (verdict["already_cited"] or verdict["needs_citation"] == "No"):
+            continue
+        if args.jsonl:
+            print(json.dumps(verdict, ensure_ascii=False), flush=True)
+        else:
+            print(f"{verdict['line']}:{verdict['column']}  [{verdict['needs_citation']}] "
+                  f"{verdict['sentence'][:80]}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
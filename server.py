@@ -0,0 +1,454 @@
+"""
+本地 HTTP/JSON 分析服务 - 供 VS Code、Vim、浏览器编辑器等插件共享
+
+所有请求由固定大小的工作线程池处理，共享同一个 ModeManager（同一套规则表、
+LLM 客户端和缓存）。等待队列有上限，超出时立即返回 503（准入控制），
+而不是让请求无限排队。
+
+接口：
+    POST /analyze          {"text": "...", "mode": "rule"}      -> 结构化结果 + formatted
+    POST /analyze/batch    {"texts": [...], "mode": "hybrid"}   -> {"results": [...]}
+    POST /analyze/stream   {"text": "...", "mode": "llm"}       -> NDJSON，每行一个部分结果
+    GET  /health                                                -> 队列深度、延迟分位数等
+
+用法：
+    python -m whatshouldicite.server --port 8765 --workers 8
+    python -m whatshouldicite.server --llm --allow-origin http://localhost:3000
+"""
+
+import contextvars
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+from . import usage
+from .daemon import build_manager
+from .mode_selector import AnalysisMode, ModeManager
+from .streaming import render_partial
+from .utils import format_result
+
+MAX_BODY = 1024 * 1024  # 请求体上限（字节）
+MAX_BATCH = 256         # 单个批量请求的句子数上限
+
+
+class Overloaded(Exception):
+    """等待队列已满，请求被拒绝"""
+
+
+class WorkerPool:
+    """
+    固定数量的工作线程 + 有界等待队列
+
+    submit 在等待中的任务数达到 max_queue 时抛出 Overloaded；
+    同时记录最近 window 秒的排队时间和处理时间直方图。
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 64, window: float = 300.0):
+        """
+        Args:
+            workers: 工作线程数（同时处理的请求数）
+            max_queue: 最多等待的请求数，超出后拒绝
+            window: 延迟统计的时间窗口（秒）
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.latency_us = usage.RollingHistogram(window, interval=10.0)
+        self.queue_wait_us = usage.RollingHistogram(window, interval=10.0)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whatshouldicite-worker")
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """
+        提交任务
+
+        Raises:
+            Overloaded: 等待队列已满
+        """
+        with self._lock:
+            # 空闲的工作线程可以立即接手，不计入等待队列
+            if self.queued >= self.max_queue + max(0, self.workers - self.running):
+                self.rejected += 1
+                raise Overloaded(f"服务繁忙（等待中 {self.queued} 个请求）")
+            self.queued += 1
+        enqueued = time.perf_counter()
+        # 工作线程继承提交方的上下文（用量标签、追踪等）
+        context = contextvars.copy_context()
+
+        def run():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.queue_wait_us.record((started - enqueued) * 1e6)
+            ok = False
+            try:
+                result = context.run(fn, *args)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.failed += not ok
+                    self.latency_us.record((time.perf_counter() - enqueued) * 1e6)
+
+        future = self._executor.submit(run)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: Future):
+        # 尚未开始就被取消（调用方已超时）的任务不会执行 run，在这里出队
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """队列深度、计数和最近窗口内的延迟分位数（毫秒）"""
+        with self._lock:
+            latency = self.latency_us.snapshot()
+            queue_wait = self.queue_wait_us.snapshot()
+            stats = {
+                "workers": self.workers,
+                "running": self.running,
+                "queue_depth": self.queued,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+        def percentiles(histogram: usage.Histogram) -> Dict[str, Optional[float]]:
+            return {
+                f"p{p}": None if histogram.count == 0 else round(histogram.percentile(p) / 1000, 3)
+                for p in (50, 95, 99)
+            }
+
+        stats["latency_ms"] = percentiles(latency)
+        stats["queue_wait_ms"] = percentiles(queue_wait)
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class HTTPError(Exception):
+    """以指定状态码返回给客户端的错误"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive，编辑器插件可复用连接
+    server_version = "WhatShouldICite"
+    # 响应头和响应体分两次写出，不关闭 Nagle 会与客户端的延迟确认叠加出约 40ms 的停顿
+    disable_nagle_algorithm = True
+
+    @property
+    def app(self) -> "AnalysisServer":
+        return self.server.app
+
+    def log_message(self, format, *args):
+        if self.app.verbose:
+            super().log_message(format, *args)
+
+    # ---- 响应 ----
+
+    def _send_headers(self, status: int, content_type: str, length: Optional[int] = None,
+                      extra: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if length is None:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(length))
+        if self.app.allow_origin:
+            self.send_header("Access-Control-Allow-Origin", self.app.allow_origin)
+        for name, value in (extra or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _send_json(self, status: int, payload: Any, extra: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send_headers(status, "application/json; charset=utf-8", len(body), extra)
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, extra: Optional[Dict[str, str]] = None):
+        self._send_json(status, {"error": message}, extra)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    # ---- 请求 ----
+
+    def _read_json(self) -> Dict[str, Any]:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Content-Length 无效")
+        if length > MAX_BODY:
+            self.close_connection = True  # 未读取的请求体会污染后续请求
+            raise HTTPError(413, f"请求体超过 {MAX_BODY} 字节")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是合法的 JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "请求体必须是 JSON 对象")
+        return payload
+
+    @staticmethod
+    def _mode(payload: Dict[str, Any]) -> Optional[AnalysisMode]:
+        mode = payload.get("mode")
+        if not mode:
+            return None
+        try:
+            return AnalysisMode(mode)
+        except ValueError:
+            raise HTTPError(400, f"未知模式: {mode}")
+
+    @staticmethod
+    def _text(value: Any) -> str:
+        if not isinstance(value, str):
+            raise HTTPError(400, "text 必须是字符串")
+        return value
+
+    def do_OPTIONS(self):
+        # 浏览器编辑器跨域预检
+        self._send_headers(204, "text/plain", 0, {
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type",
+        })
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, self.app.health())
+        else:
+            self._send_error(404, f"未知路径: {self.path}")
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+            if self.path == "/analyze":
+                text = self._text(payload.get("text"))
+                self._send_json(200, self.app.run(self.app.analyze, text, self._mode(payload)))
+            elif self.path == "/analyze/batch":
+                texts = payload.get("texts")
+                if not isinstance(texts, list):
+                    raise HTTPError(400, "texts 必须是字符串列表")
+                if len(texts) > MAX_BATCH:
+                    raise HTTPError(413, f"单次最多 {MAX_BATCH} 条")
+                texts = [self._text(text) for text in texts]
+                results = self.app.run(self.app.manager.analyze_many, texts, self._mode(payload))
+                self._send_json(200, {"results": results})
+            elif self.path == "/analyze/stream":
+                self._stream(self._text(payload.get("text")), self._mode(payload))
+            else:
+                raise HTTPError(404, f"未知路径: {self.path}")
+        except HTTPError as e:
+            self._send_error(e.status, str(e))
+        except Overloaded as e:
+            self._send_error(503, str(e), {"Retry-After": "1"})
+        except TimeoutError:
+            self._send_error(504, "分析超时")
+        except Exception as e:
+            self._send_error(500, f"{type(e).__name__}: {e}")
+
+    def _stream(self, text: str, mode: Optional[AnalysisMode]):
+        partials, cancel, future = self.app.stream(text, mode)
+        self._send_headers(200, "application/x-ndjson; charset=utf-8")
+        deadline = time.monotonic() + self.app.request_timeout
+        try:
+            while True:
+                try:
+                    partial = partials.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    cancel.set()
+                    partial = {"error": "分析超时", "done": True}
+                    self._write_chunk(json.dumps(partial, ensure_ascii=False).encode("utf-8") + b"\n")
+                    break
+                if partial is None:
+                    error = future.exception()
+                    if error is not None:
+                        partial = {"error": f"{type(error).__name__}: {error}", "done": True}
+                        self._write_chunk(json.dumps(partial, ensure_ascii=False).encode("utf-8") + b"\n")
+                    break
+                self._write_chunk(json.dumps(partial, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._write_chunk(b"")
+        except OSError:
+            # 客户端断开：停止读取 LLM 流，释放工作线程
+            cancel.set()
+            self.close_connection = True
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class AnalysisServer:
+    """HTTP 分析服务"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        manager: Optional[ModeManager] = None,
+        workers: int = 4,
+        max_queue: int = 64,
+        request_timeout: float = 60.0,
+        allow_origin: Optional[str] = None,
+        verbose: bool = False
+    ):
+        """
+        Args:
+            host: 监听地址（默认只监听本机）
+            port: 端口（0 表示由系统分配）
+            manager: 共享的 ModeManager（None 则创建规则模式的 ModeManager）
+            workers: 工作线程数
+            max_queue: 最多等待的请求数，超出后返回 503
+            request_timeout: 单个请求的最长等待时间（秒），超时返回 504
+            allow_origin: 允许跨域访问的来源（浏览器编辑器使用，如 "*"）
+            verbose: 是否打印访问日志
+        """
+        self.host = host
+        self.port = port
+        self.manager = manager or ModeManager()
+        self.pool = WorkerPool(workers, max_queue)
+        self.request_timeout = request_timeout
+        self.allow_origin = allow_origin
+        self.verbose = verbose
+        self.started = time.time()
+        self._server: Optional[_Server] = None
+
+    # ---- 分析 ----
+
+    def analyze(self, text: str, mode: Optional[AnalysisMode] = None) -> Dict[str, Any]:
+        result = self.manager.analyze_structured(text, mode)
+        result["formatted"] = format_result(result)
+        return result
+
+    def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        在工作线程池中执行并等待结果
+
+        Raises:
+            Overloaded: 等待队列已满
+            TimeoutError: 超过 request_timeout（尚未开始的任务会被取消）
+        """
+        future = self.pool.submit(fn, *args)
+        try:
+            return future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"分析超过 {self.request_timeout}s")
+
+    def stream(self, text: str, mode: Optional[AnalysisMode] = None):
+        """
+        在工作线程池中流式分析
+
+        Returns:
+            (partials, cancel, future)：partials 队列依次收到带 formatted 的部分结果，
+            以 None 结束；设置 cancel 会在下一个部分结果到达时停止分析
+        """
+        partials: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        cancel = threading.Event()
+
+        def run():
+            stream = self.manager.stream_structured(text, mode)
+            try:
+                for partial in stream:
+                    if cancel.is_set():
+                        break
+                    partials.put(dict(partial, formatted=render_partial(partial)))
+            finally:
+                stream.close()
+                partials.put(None)
+
+        future = self.pool.submit(run)
+        return partials, cancel, future
+
+    def health(self) -> Dict[str, Any]:
+        stats = self.pool.stats()
+        stats["status"] = "overloaded" if stats["queue_depth"] >= self.pool.max_queue else "ok"
+        stats["uptime_s"] = round(time.time() - self.started, 3)
+        stats["mode"] = self.manager.current_mode.value
+        stats["llm"] = self.manager.llm_client is not None
+        if self.manager.llm_client is not None:
+            stats["llm_latency"] = self.manager.llm_client.latency_stats()
+        return stats
+
+    # ---- 生命周期 ----
+
+    def bind(self):
+        """监听端口，不开始处理请求（port=0 时绑定后 self.port 为实际端口）"""
+        self._server = _Server((self.host, self.port), _Handler)
+        self._server.app = self
+        self.port = self._server.server_address[1]
+
+    def serve_forever(self):
+        """预热后开始处理请求，直到 shutdown"""
+        if self._server is None:
+            self.bind()
+        self.manager.warmup()
+        server = self._server
+        try:
+            server.serve_forever(poll_interval=0.5)
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """停止服务（可在任意线程调用）"""
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+    def close(self):
+        server, self._server = self._server, None
+        if server is not None:
+            server.server_close()
+        self.pool.shutdown()
+
+
+def main(argv=None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite HTTP 分析服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8765, help="端口（默认 8765）")
+    parser.add_argument("--workers", type=int, default=4, help="工作线程数（默认 4）")
+    parser.add_argument("--max-queue", type=int, default=64, help="最多等待的请求数，超出返回 503（默认 64）")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求超时（秒，默认 60）")
+    parser.add_argument("--llm", action="store_true", help="启用 LLM（读取环境变量或 config.py）")
+    parser.add_argument("--mode", choices=[m.value for m in AnalysisMode],
+                        help="默认分析模式（启用 LLM 时默认 hybrid，否则 rule）")
+    parser.add_argument("--allow-origin", help="允许跨域访问的来源（浏览器编辑器使用）")
+    parser.add_argument("--verbose", action="store_true", help="打印访问日志")
+    args = parser.parse_args(argv)
+
+    server = AnalysisServer(
+        args.host, args.port, build_manager(args.llm, args.mode),
+        workers=args.workers, max_queue=args.max_queue, request_timeout=args.timeout,
+        allow_origin=args.allow_origin, verbose=args.verbose
+    )
+    server.bind()
+    print(f"HTTP 分析服务已启动: http://{args.host}:{server.port}（{args.workers} 个工作线程）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+流式输出 - 增量解析【Do I need a citation?】/【Why】/【What to cite】/【Search keywords】格式
+以及结构化提示词输出的 JSON 对象
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .utils import format_output
+
+
+# 标题 -> 结果字段
+SECTION_FIELDS = {
+    "do i need a citation?": "needs_citation",
+    "why": "reason",
+    "what to cite": "citation_types",
+    "search keywords": "keywords",
+}
+
+_HEADER_RE = re.compile(r"^\s*【([^】]+)】(.*)$")
+_VERDICT_RE = re.compile(r"\b(yes|no|optional)\b", re.IGNORECASE)
+
+
+class SectionStreamParser:
+    """
+    分段格式的增量解析器
+
+    每收到一段 token 调用 feed()，返回本次新完成的事件：
+    - ("needs_citation", "Yes")：判断所在行一结束就发出
+    - ("citation_type", item) / ("keyword", item)：列表项逐行发出
+    - ("reason", text)：【Why】段结束时发出
+    流结束后调用 close() 发出剩余事件。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._chunks: List[str] = []
+        self._section: Optional[str] = None
+        self._reason_lines: List[str] = []
+        self.result: Dict[str, Any] = {
+            "needs_citation": None,
+            "reason": None,
+            "citation_types": [],
+            "keywords": []
+        }
+
+    @property
+    def text(self) -> str:
+        """目前收到的完整文本"""
+        return "".join(self._chunks)
+
+    @property
+    def saw_sections(self) -> bool:
+        """是否识别到了分段格式"""
+        return self._section is not None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """输入一段 token，返回新完成的事件"""
+        self._chunks.append(chunk)
+        self._buffer += chunk
+        events: List[Tuple[str, Any]] = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            events.extend(self._feed_line(line))
+        return events
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """流结束：处理最后一行并收尾当前段"""
+        events: List[Tuple[str, Any]] = []
+        if self._buffer:
+            events.extend(self._feed_line(self._buffer))
+            self._buffer = ""
+        events.extend(self._end_section())
+        return events
+
+    def _feed_line(self, line: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        header = _HEADER_RE.match(line)
+        if header:
+            events.extend(self._end_section())
+            title = header.group(1).strip().lower()
+            self._section = SECTION_FIELDS.get(title, "other")
+            line = header.group(2)
+            # 标题后的说明（如"（如果需要引用）"）不是内容
+            if line.strip().startswith(("（", "(")):
+                return events
+
+        item = line.strip()
+        if not item or self._section is None:
+            return events
+
+        if self._section == "needs_citation":
+            if self.result["needs_citation"] is None:
+                match = _VERDICT_RE.search(item)
+                if match:
+                    verdict = match.group(1).capitalize()
+                    self.result["needs_citation"] = verdict
+                    events.append(("needs_citation", verdict))
+        elif self._section == "reason":
+            self._reason_lines.append(item.lstrip("-•").strip())
+        elif self._section in ("citation_types", "keywords"):
+            value = item.lstrip("-•").strip()
+            if self._section == "keywords":
+                value = value.strip('"“”')
+            if value and len(self.result[self._section]) < 5:
+                self.result[self._section].append(value)
+                kind = "citation_type" if self._section == "citation_types" else "keyword"
+                events.append((kind, value))
+        return events
+
+    def _end_section(self) -> List[Tuple[str, Any]]:
+        if self._section == "reason" and self._reason_lines and self.result["reason"] is None:
+            reason = " ".join(line for line in self._reason_lines if line)
+            if len(reason) > 100:
+                reason = reason[:100] + "..."
+            self.result["reason"] = reason
+            return [("reason", reason)]
+        return []
+
+
+_DECODER = json.JSONDecoder()
+
+
+def _skip(text: str, pos: int, chars: str) -> int:
+    while pos < len(text) and text[pos] in chars:
+        pos += 1
+    return pos
+
+
+class JSONFieldStreamParser:
+    """
+    单层 JSON 对象的增量解析器
+
+    每收到一段 token 调用 feed()，返回本次新完成的顶层字段 (键, 值)。
+    字段按模型输出的顺序完成；结构化提示词把 needs_citation 放在第一位，
+    判断因而最先给出。值完整（后面出现逗号或右括号）之后才发出。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._started = False
+        self.fields: Dict[str, Any] = {}
+
+    @property
+    def text(self) -> str:
+        """目前收到的完整文本"""
+        return self._buffer
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """输入一段 token，返回新完成的字段"""
+        self._buffer += chunk
+        events: List[Tuple[str, Any]] = []
+        while True:
+            field = self._next_field()
+            if field is None:
+                return events
+            events.append(field)
+
+    def _next_field(self) -> Optional[Tuple[str, Any]]:
+        buffer = self._buffer
+        if not self._started:
+            start = buffer.find("{", self._pos)
+            if start == -1:
+                return None
+            self._started = True
+            self._pos = start + 1
+        pos = _skip(buffer, self._pos, " \t\r\n,")
+        try:
+            key, end = _DECODER.raw_decode(buffer, pos)
+            colon = _skip(buffer, end, " \t\r\n")
+            if not isinstance(key, str) or buffer[colon:colon + 1] != ":":
+                return None
+            value, end = _DECODER.raw_decode(buffer, _skip(buffer, colon + 1, " \t\r\n"))
+        except ValueError:
+            # 还没收完（或格式有误，留给完整解析处理）
+            return None
+        # 数字等值在缓冲区末尾时可能还没写完
+        if _skip(buffer, end, " \t\r\n") >= len(buffer):
+            return None
+        self._pos = end
+        self.fields[key] = value
+        return key, value
+
+
+def render_partial(partial: Dict[str, Any]) -> str:
+    """
+    把部分结果渲染为浮窗文本（判断先出现，其余部分随流式输出补全）
+
+    Args:
+        partial: UnifiedLLMClient.stream_structured / stream_analysis 产出的部分结果
+    """
+    needs_citation = partial.get("needs_citation") or "…"
+    content = format_output(
+        needs_citation=needs_citation,
+        reason=partial.get("reason") or "…",
+        citation_types=partial.get("citation_types") or [],
+        keywords=partial.get("keywords") or []
+    )
+    if not partial.get("done"):
+        content += "\n\n⏳ 正在生成…"
+    return content
@@ -0,0 +1,77 @@
+"""
+测试 CitationAgent 的批量接口
+"""
+
+import threading
+import time
+
+from whatshouldicite import CitationAgent
+from whatshouldicite.llm_client import LLMClient
+
+
+class SlowFakeClient(LLMClient):
+    """记录并发数的假 LLM 客户端"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return "Method/Technique\n- Foundational works on test methods\n- \"test keyword\""
+
+
+def test_analyze_many_rules_keeps_order():
+    """测试规则模式批量分析保持输入顺序"""
+    agent = CitationAgent()
+    texts = [
+        "It is well known that water boils at 100 degrees Celsius.",
+        "",
+        "Our method outperforms previous approaches on the benchmark.",
+    ]
+    results = agent.analyze_many(texts)
+
+    assert [r["needs_citation"] for r in results] == ["No", "No", "Yes"]
+    assert results[0]["intent"] == "common_knowledge"
+    assert results[2]["keywords"]
+
+
+def test_analyze_many_isolates_errors():
+    """测试单条失败不影响其他条目"""
+    agent = CitationAgent()
+    original_plan = agent.planner.plan
+
+    def flaky_plan(context, intent_result=None):
+        if "boom" in context.text:
+            raise RuntimeError("planner exploded")
+        return original_plan(context, intent_result)
+
+    agent.planner.plan = flaky_plan
+    results = agent.analyze_many([
+        "Deep learning methods work well.",
+        "This boom method fails.",
+        "Recent studies show gains.",
+    ])
+
+    assert "error" not in results[0]
+    assert results[1]["error"] == "planner exploded"
+    assert results[2]["needs_citation"] == "Yes"
+
+
+def test_analyze_many_llm_bounded_concurrency():
+    """测试 LLM 模式并发受限且顺序不变"""
+    client = SlowFakeClient()
+    agent = CitationAgent(llm_client=client, max_concurrency=3)
+    texts = [f"Sentence number {i} about methods." for i in range(9)]
+    results = agent.analyze_many(texts)
+
+    assert [r["text"] for r in results] == texts
+    assert all(r["intent"] == "method_technique" for r in results)
+    assert 1 < client.peak <= 3
@@ -0,0 +1,78 @@
+"""
+测试文本分析器的关键词匹配
+"""
+
+from whatshouldicite.analyzer import TextAnalyzer, KeywordMatcher
+
+
+def test_flags_single_pass():
+    """测试一次扫描得到全部类别标记"""
+    analyzer = TextAnalyzer()
+    result = analyzer.analyze("Recently proposed models outperform prior methods.")
+
+    assert result["has_survey_keywords"]
+    assert result["has_temporal_keywords"]
+    assert result["has_foundational_keywords"]
+    assert result["has_method_keywords"]
+    assert result["has_comparison_keywords"] is False
+    assert not result["has_statistical_keywords"]
+
+
+def test_match_offsets():
+    """测试匹配位置相对于小写文本"""
+    analyzer = TextAnalyzer()
+    result = analyzer.analyze("Related work shows recently proposed models.")
+    text_lower = result["text"].lower()
+
+    phrases = [phrase for _, _, phrase in result["keyword_matches"]]
+    assert phrases == ["related work", "shows", "recently", "proposed", "model"]
+    for start, end, phrase in result["keyword_matches"]:
+        assert text_lower[start:end] == phrase
+
+
+def test_word_start_boundary():
+    """测试关键词只在词首匹配"""
+    analyzer = TextAnalyzer()
+    # "network" 不应命中 "work"，"improvements" 不应命中 "prove"
+    result = analyzer.analyze("The networks showed improvements.")
+    assert "work" not in [p for _, _, p in result["keyword_matches"]]
+    assert not result["has_theoretical_keywords"]
+
+
+def test_nested_phrase_categories():
+    """测试长短语继承内部短关键词的类别"""
+    matcher = KeywordMatcher({"survey": ("related work",), "factual": ("work",)})
+    found, matches = matcher.scan("see related work for details")
+
+    assert found == {"survey", "factual"}
+    assert matches == [(4, 16, "related work")]
+
+
+def test_context_features_computed_once():
+    """测试整条规则流水线只计算一次特征"""
+    from whatshouldicite import CitationAgent
+
+    calls = []
+
+    class CountingAnalyzer(TextAnalyzer):
+        def extract_features(self, context):
+            calls.append(context.text)
+            return super().extract_features(context)
+
+    agent = CitationAgent()
+    agent.analyzer = CountingAnalyzer()
+    result = agent.analyze("Our method outperforms previous approaches on the benchmark.")
+
+    assert "【Search keywords】" in result
+    assert len(calls) == 1
+
+
+def test_context_passthrough():
+    """测试已构建的上下文原样传递"""
+    analyzer = TextAnalyzer()
+    context = analyzer.build_context("  Deep   learning\nworks.  ")
+
+    assert analyzer.build_context(context) is context
+    assert context.text == "Deep learning works."
+    assert context.tokens == ["deep", "learning", "works."]
+    assert analyzer.analyze(context) is context.features
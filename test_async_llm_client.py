@@ -0,0 +1,88 @@
+"""
+测试异步 LLM 客户端
+"""
+
+import asyncio
+
+from whatshouldicite.async_llm_client import AsyncLLMClient, AsyncUnifiedLLMClient
+from whatshouldicite.llm_client import LLMClient
+
+
+class SlowAsyncClient(AsyncLLMClient):
+    """记录并发数的假异步客户端"""
+
+    model = "slow"
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.cancelled = 0
+
+    async def complete(self, prompt: str, **kwargs) -> str:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        return '{"needs_citation": "Yes", "reason": "r", "intent": "comparison", "citation_types": [], "keywords": ["k"]}'
+
+
+def test_bounded_concurrency_and_order():
+    """测试并发受限且结果顺序不变"""
+    client = SlowAsyncClient()
+    unified = AsyncUnifiedLLMClient(client, max_concurrency=4, use_cache=False)
+    texts = [f"text {i}" for i in range(20)]
+
+    results = asyncio.run(unified.analyze_many(texts))
+
+    assert [r["text"] for r in results] == texts
+    assert all(r["intent"] == "comparison" for r in results)
+    assert client.peak == 4
+
+
+def test_timeout_becomes_fallback():
+    """测试超时按失败处理"""
+    client = SlowAsyncClient(delay=1.0)
+    unified = AsyncUnifiedLLMClient(client, timeout=0.05)
+
+    result = asyncio.run(unified.classify_intent("text"))
+
+    assert result["needs_citation"] == "Optional"
+    assert "error" in result
+    assert client.cancelled == 1
+
+
+def test_cancellation_propagates():
+    """测试取消调用方任务会取消在途请求"""
+    client = SlowAsyncClient(delay=1.0)
+    unified = AsyncUnifiedLLMClient(client)
+
+    async def run():
+        task = asyncio.ensure_future(unified.analyze_structured("text"))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+    assert client.cancelled == 1
+
+
+def test_wraps_sync_client():
+    """测试同步客户端可直接用于异步接口"""
+    class SyncClient(LLMClient):
+        def complete(self, prompt: str, **kwargs) -> str:
+            return "Survey/Review"
+
+    unified = AsyncUnifiedLLMClient(SyncClient())
+    result = asyncio.run(unified.classify_intent("text"))
+
+    assert result["intent"] == "survey_review"
@@ -0,0 +1,72 @@
+"""
+测试多句打包请求（pack_batches / analyze_batch）
+"""
+
+import json
+import re
+
+from whatshouldicite import CitationAgent
+from whatshouldicite.llm_client import LLMClient, UnifiedLLMClient, pack_batches
+
+
+class BatchEchoClient(LLMClient):
+    """按句子编号返回结果的假 LLM 客户端，可模拟输出截断"""
+
+    model = "batch-echo"
+
+    def __init__(self, truncate_over=None):
+        self.truncate_over = truncate_over
+        self.batch_sizes = []
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        items = re.findall(r"^(\d+)\. (.*)$", prompt, re.M)
+        if not items:
+            # 单句结构化调用
+            return '{"needs_citation": "No", "reason": "single", "intent": "common_knowledge"}'
+        self.batch_sizes.append(len(items))
+        results = [{"id": int(n), "needs_citation": "Yes", "reason": text,
+                    "intent": "factual_claim", "keywords": [text]} for n, text in items]
+        body = json.dumps({"results": results}, ensure_ascii=False)
+        if self.truncate_over and len(items) > self.truncate_over:
+            return body[:len(body) // 2]
+        return body
+
+
+def test_pack_batches_respects_limits():
+    """测试按句子数和 token 预算分组"""
+    texts = ["a" * 40] * 10
+    assert pack_batches(texts, max_batch=4, token_budget=1000) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert [len(b) for b in pack_batches(texts, max_batch=10, token_budget=33)] == [3, 3, 3, 1]
+
+
+def test_batch_demultiplexes_in_order():
+    """测试一次请求分析多句，结果按输入顺序分发"""
+    client = BatchEchoClient()
+    texts = [f"sentence {i}" for i in range(10)]
+    results = UnifiedLLMClient(client).analyze_batch(texts, max_batch=4)
+
+    assert client.batch_sizes == [4, 4, 2]
+    assert [r["reason"] for r in results] == texts
+
+
+def test_truncated_batch_is_split_and_retried():
+    """测试输出被截断时对半拆分重试"""
+    client = BatchEchoClient(truncate_over=2)
+    texts = [f"sentence {i}" for i in range(8)]
+    results = UnifiedLLMClient(client).analyze_batch(texts, max_batch=8)
+
+    assert client.batch_sizes == [8, 4, 2, 2, 4, 2, 2]
+    assert [r["reason"] for r in results] == texts
+
+
+def test_agent_analyze_many_batches():
+    """测试 analyze_many 在单次调用模式下按批发送"""
+    client = BatchEchoClient()
+    agent = CitationAgent(UnifiedLLMClient(client), single_call=True, batch_size=5)
+    texts = [f"sentence {i}" for i in range(12)] + [""]
+    results = agent.analyze_many(texts)
+
+    assert sorted(client.batch_sizes) == [2, 5, 5]
+    assert [r["text"] for r in results[:12]] == texts[:12]
+    assert results[12]["needs_citation"] == "No"
+
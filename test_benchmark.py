@@ -0,0 +1,56 @@
+"""
+测试基准测试套件
+"""
+
+from whatshouldicite.bench_corpus import generate_corpus
+from whatshouldicite.benchmark import compare, percentile, run_benchmarks, simulated_llm, simulated_response
+from whatshouldicite.llm_client import UnifiedLLMClient
+from whatshouldicite import prompts
+
+
+def test_corpus_is_deterministic():
+    """测试语料规模和确定性"""
+    corpus = generate_corpus()
+    assert len(corpus) >= 2000
+    assert corpus == generate_corpus()
+    assert generate_corpus(50, seed=1) != generate_corpus(50, seed=2)
+
+
+def test_percentile():
+    """测试最近秩百分位"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
+
+
+def test_simulated_responses_parse():
+    """测试模拟响应能被真实解析器解析"""
+    client = UnifiedLLMClient(simulated_llm(), use_cache=False)
+    structured = simulated_response(prompts.STRUCTURED_ANALYZE_PROMPT.format(text="x"))
+    assert client._parse_structured_response(structured)["needs_citation"] == "Yes"
+    batch = simulated_response(prompts.BATCH_ANALYZE_PROMPT.format(sentences="1. a\n2. b"))
+    assert set(client._parse_batch_response(batch)) == {1, 2}
+
+
+def test_run_benchmarks_quick():
+    """测试小规模运行产出吞吐量和百分位"""
+    report = run_benchmarks(corpus_size=60, llm_calls=4, latency="fixed:0", only="e2e")
+    assert report["meta"]["corpus_size"] == 60
+    assert set(report["results"]) == {
+        "e2e.rule_agent", "e2e.llm_pipeline", "e2e.llm_single_call",
+        "e2e.llm_single_call_x8", "e2e.llm_batched_16"
+    }
+    stats = report["results"]["e2e.llm_single_call"]
+    assert stats["n"] == 4
+    assert {"ops_per_s", "p50_us", "p95_us", "p99_us"} <= set(stats)
+
+
+def test_compare_flags_regression():
+    """测试 p50 变慢超过阈值时标记回归"""
+    baseline = {"results": {"a": {"p50_us": 10.0}, "b": {"p50_us": 10.0}}}
+    current = {"results": {"a": {"p50_us": 10.5}, "b": {"p50_us": 12.0}, "c": {"p50_us": 1.0}}}
+    rows = {row["name"]: row for row in compare(baseline, current, threshold=0.10)}
+    assert set(rows) == {"a", "b"}
+    assert not rows["a"]["regression"]
+    assert rows["b"]["regression"]
@@ -0,0 +1,140 @@
+"""
+测试 LLM 结果缓存
+"""
+
+from whatshouldicite.cache import LRUCache
+from whatshouldicite.llm_client import LLMClient, UnifiedLLMClient
+
+
+class FakeClient(LLMClient):
+    """记录调用次数的假 LLM 客户端"""
+
+    def __init__(self, model="fake-model", fail=False):
+        self.model = model
+        self.fail = fail
+        self.calls = 0
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("provider down")
+        return "Comparison"
+
+
+def test_lru_eviction_and_stats():
+    """测试 LRU 淘汰和命中统计"""
+    cache = LRUCache(maxsize=2, ttl=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # a 变为最近使用
+    cache.put("c", 3)           # 淘汰 b
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+
+def test_ttl_expiry():
+    """测试 TTL 过期"""
+    now = [100.0]
+    cache = LRUCache(maxsize=4, ttl=10, timer=lambda: now[0])
+    cache.put("a", 1)
+    now[0] = 109.0
+    assert cache.get("a") == 1
+    now[0] = 110.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_unified_client_memoizes():
+    """测试重复选中文本不再调用 LLM"""
+    client = FakeClient()
+    unified = UnifiedLLMClient(client)
+
+    first = unified.classify_intent("Our model beats  the baseline.")
+    first["intent"] = "mutated"
+    second = unified.classify_intent("Our model beats the baseline.")
+
+    assert client.calls == 1
+    assert second["intent"] == "comparison"
+    assert unified.cache_stats()["hits"] == 1
+
+
+def test_cache_key_includes_model_and_operation():
+    """测试不同模型、不同操作互不复用"""
+    cache = LRUCache()
+    a = UnifiedLLMClient(FakeClient(model="a"), cache=cache)
+    b = UnifiedLLMClient(FakeClient(model="b"), cache=cache)
+
+    a.classify_intent("text")
+    b.classify_intent("text")
+    a.plan_citation_types("text", "comparison")
+
+    assert a.client.calls == 2
+    assert b.client.calls == 1
+
+
+def test_errors_not_cached():
+    """测试失败结果不进入缓存"""
+    client = FakeClient(fail=True)
+    unified = UnifiedLLMClient(client)
+
+    assert unified.classify_intent("text")["needs_citation"] == "Optional"
+    unified.classify_intent("text")
+    assert client.calls == 2
+
+
+def test_disk_cache_roundtrip_and_compression(tmp_path):
+    """测试磁盘缓存读写与压缩"""
+    from whatshouldicite.cache import DiskCache
+
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DiskCache(path, version="v1")
+    value = "【Why】\n- " + "long response " * 50
+    cache.put("k", value)
+
+    # 新实例（模拟重启）仍能读到
+    assert DiskCache(path, version="v1").get("k") == value
+    assert cache.stats()["bytes"] < len(value.encode("utf-8"))
+
+
+def test_disk_cache_template_invalidation(tmp_path):
+    """测试模板版本变化后旧条目被清除"""
+    from whatshouldicite.cache import DiskCache
+
+    path = str(tmp_path / "cache.sqlite3")
+    DiskCache(path, version="v1").put("k", "old")
+    cache = DiskCache(path, version="v2")
+
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_disk_cache_size_cap(tmp_path):
+    """测试按最近访问淘汰到大小上限以内"""
+    from whatshouldicite.cache import DiskCache
+
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=100, compress=False, version="v")
+    for i in range(40):
+        cache.put(f"k{i}", "x" * 10)
+    cache.evict()
+
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get("k39") == "x" * 10
+    assert cache.get("k0") is None
+
+
+def test_cached_llm_client_survives_restart(tmp_path):
+    """测试 CachedLLMClient 跨实例复用结果"""
+    from whatshouldicite.cache import DiskCache
+    from whatshouldicite.llm_client import CachedLLMClient
+
+    path = str(tmp_path / "cache.sqlite3")
+    inner = FakeClient()
+    CachedLLMClient(inner, DiskCache(path)).complete("prompt", max_tokens=50)
+    restarted = CachedLLMClient(inner, DiskCache(path))
+
+    assert restarted.complete("prompt", max_tokens=50) == "Comparison"
+    assert restarted.complete("prompt", max_tokens=60) == "Comparison"
+    assert inner.calls == 2
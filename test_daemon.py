@@ -0,0 +1,95 @@
+"""
+测试常驻分析服务与客户端
+"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from whatshouldicite import CitationAgent
+from whatshouldicite.client import DaemonClient, DaemonError, recv_frame, send_frame
+from whatshouldicite.daemon import CitationDaemon
+
+
+@pytest.fixture
+def running_daemon(tmp_path):
+    """在后台线程中运行的服务"""
+    daemon = CitationDaemon(str(tmp_path / "d.sock"))
+    daemon.bind()
+    thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+    thread.start()
+    yield daemon
+    daemon.shutdown()
+    thread.join(5)
+
+
+def test_frame_roundtrip():
+    """测试分帧协议（含多字节字符）"""
+    left, right = socket.socketpair()
+    message = {"id": 1, "method": "analyze", "params": {"text": "深度学习 " * 1000}}
+    send_frame(left, message)
+    assert recv_frame(right) == message
+    left.close()
+    assert recv_frame(right) is None
+    right.close()
+
+
+def test_analyze_matches_agent(running_daemon):
+    """测试服务结果与直接调用 CitationAgent 一致，且连接可复用"""
+    text = "Recent studies have shown that transformers outperform RNNs."
+    with DaemonClient(running_daemon.socket_path, autostart=False) as client:
+        result = client.analyze(text)
+        assert result["formatted"] == CitationAgent().analyze(text)
+        assert result["source"] == "rule"
+        many = client.analyze_many([text, ""])
+        assert [r["needs_citation"] for r in many] == [result["needs_citation"], "No"]
+        assert client.ping()["llm"] is False
+
+
+def test_errors_do_not_break_connection(running_daemon):
+    """测试未知方法和参数错误以 error 返回，连接仍可继续使用"""
+    with DaemonClient(running_daemon.socket_path, autostart=False) as client:
+        with pytest.raises(DaemonError):
+            client.call("no_such_method")
+        with pytest.raises(DaemonError):
+            client.analyze("text", mode="bogus")
+        assert client.analyze("We use BERT.")["needs_citation"]
+        assert client.stats()["errors"] == 2
+
+
+def test_repeated_rule_queries_are_fast(running_daemon):
+    """测试预热后的规则模式请求往返在个位数毫秒内"""
+    text = "We adopt the Adam optimizer with a learning rate of 0.001."
+    with DaemonClient(running_daemon.socket_path, autostart=False) as client:
+        client.analyze(text)
+        timings = []
+        for _ in range(50):
+            start = time.perf_counter()
+            client.analyze(text)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    assert timings[len(timings) // 2] < 0.010
+
+
+def test_second_daemon_refuses_same_socket(running_daemon):
+    """测试同一路径上只能运行一个服务"""
+    with pytest.raises(RuntimeError):
+        CitationDaemon(running_daemon.socket_path).bind()
+
+
+def test_client_autostarts_daemon(tmp_path):
+    """测试服务未运行时客户端自动启动，shutdown 后删除套接字"""
+    path = str(tmp_path / "auto.sock")
+    (tmp_path / "auto.sock").write_text("")  # 上次异常退出残留的文件
+    client = DaemonClient(path, start_timeout=30)
+    try:
+        assert client.analyze("Deep learning has achieved remarkable success.")["text"]
+    finally:
+        client.shutdown()
+    for _ in range(100):
+        if not (tmp_path / "auto.sock").exists():
+            break
+        time.sleep(0.05)
+    assert not (tmp_path / "auto.sock").exists()
@@ -0,0 +1,166 @@
+"""
+测试快捷键路径的后台工作线程、UI 队列和取消
+"""
+
+import threading
+import time
+
+from whatshouldicite.dispatch import LatestWinsWorker, UIQueue, iter_cancellable
+from whatshouldicite.global_agent import GlobalCitationAgent
+from whatshouldicite.mode_selector import AnalysisMode
+
+TEXT = "Recent studies have shown that transformers outperform RNNs."
+
+
+class RecordingPopup:
+    """只记录调用的浮窗"""
+
+    def __init__(self):
+        self.calls = []
+
+    def show(self, content):
+        self.calls.append(("show", content))
+
+    def update_content(self, content):
+        self.calls.append(("update", content))
+
+    def hide(self):
+        self.calls.append(("hide", None))
+
+
+def test_latest_submission_wins():
+    """测试新任务取消执行中的任务、取代等待中的任务，只有最后一个完成"""
+    worker = LatestWinsWorker()
+    started = threading.Event()
+    done = []
+
+    def job(name, cancel):
+        started.set()
+        if cancel.wait(0.02 if name == "last" else 5):
+            return
+        done.append(name)
+
+    try:
+        worker.submit(job, "first")
+        assert started.wait(5)
+        worker.submit(job, "second")
+        worker.submit(job, "last")
+        assert worker.wait_idle(5)
+        assert done == ["last"]
+        assert worker.stats() == {"submitted": 3, "superseded": 1, "cancelled": 1, "completed": 1}
+    finally:
+        worker.stop()
+
+
+def test_cancel_reports_whether_anything_was_running():
+    """测试 cancel() 只在确有任务时返回 True"""
+    worker = LatestWinsWorker()
+    try:
+        assert not worker.cancel()
+        worker.submit(lambda cancel: cancel.wait(5))
+        assert worker.cancel()
+        assert worker.wait_idle(1)
+    finally:
+        worker.stop()
+
+
+def test_iter_cancellable_returns_without_waiting_for_blocked_item():
+    """测试取消后不等阻塞中的下一项，并在之后关闭源生成器"""
+    cancel = threading.Event()
+    closed = threading.Event()
+
+    def slow():
+        try:
+            yield 1
+            time.sleep(0.3)
+            yield 2
+        finally:
+            closed.set()
+
+    items = iter_cancellable(slow(), cancel)
+    assert next(items) == 1
+    threading.Timer(0.02, cancel.set).start()
+    start = time.perf_counter()
+    assert list(items) == []
+    assert time.perf_counter() - start < 0.2
+    assert closed.wait(2)
+
+
+def test_hotkey_llm_call_keeps_labels_and_parent_span(tmp_path):
+    """测试快捷键路径的 LLM 调用仍带模式标签，并挂在 hotkey.analyze 之下（后台迭代继承上下文）"""
+    from whatshouldicite import tracing, usage
+    from whatshouldicite.benchmark import simulated_llm
+    from whatshouldicite.llm_client import UnifiedLLMClient
+
+    ring = tracing.RingBufferExporter()
+    tracing.enable(ring)
+    ledger = usage.enable(usage.UsageLedger(str(tmp_path / "usage.jsonl")))
+    agent = GlobalCitationAgent(llm_client=UnifiedLLMClient(simulated_llm("fixed:0.01"), use_cache=False),
+                                default_mode=AnalysisMode.LLM_BASED, select_mode=False,
+                                popup=RecordingPopup(), text_source=lambda: TEXT)
+    try:
+        agent._on_hotkey_triggered()
+        assert agent.worker.wait_idle(5)
+    finally:
+        agent.worker.stop()
+        usage.disable()
+        tracing.disable()
+    assert [r["mode"] for r in ledger.records()] == ["llm"]
+    assert ring.spans("llm.stream")[0].parent_id == ring.spans("hotkey.analyze")[0].span_id
+
+
+def test_ui_queue_runs_calls_in_order():
+    """测试投递的调用在 run_pending 所在线程按顺序执行"""
+    ui = UIQueue()
+    seen = []
+    threading.Thread(target=lambda: [ui.call(seen.append, i) for i in range(3)]).start()
+    count = 0
+    while count < 3:
+        count += ui.run_pending(timeout=1)
+    assert seen == [0, 1, 2]
+    assert ui.run_pending() == 0
+
+
+def test_rapid_triggers_show_only_latest_result():
+    """测试连续触发时只显示最后一次选中文本的结果，窗口操作都在 UI 线程执行"""
+    popup = RecordingPopup()
+    selection = [None]
+
+    def slow_capture():
+        time.sleep(0.05)
+        return selection[0]
+
+    agent = GlobalCitationAgent(select_mode=False, popup=popup, text_source=slow_capture)
+    try:
+        for text in ["We use BERT.", "Water boils at 100 degrees.", TEXT]:
+            selection[0] = text
+            agent._on_hotkey_triggered()
+            time.sleep(0.01)
+        assert agent.worker.wait_idle(5)
+        agent.ui.run_pending()
+        expected = agent.mode_manager.analyze_structured(TEXT)["keywords"][0]
+        assert len(popup.calls) == 1 and expected in popup.calls[0][1]
+    finally:
+        agent.worker.stop()
+
+
+def test_selected_mode_is_used_and_esc_cancels():
+    """测试模式选择后按所选模式分析；Esc 取消进行中的任务并关闭浮窗"""
+    popup = RecordingPopup()
+    agent = GlobalCitationAgent(popup=popup, text_source=lambda: time.sleep(5))
+    try:
+        agent.pending_text = TEXT
+        agent._on_mode_selected(AnalysisMode.HYBRID)
+        assert agent.worker.wait_idle(5)
+        agent.ui.run_pending()
+        assert agent.mode_manager.current_mode == AnalysisMode.HYBRID
+        assert popup.calls[0][0] == "show"
+
+        popup.calls.clear()
+        agent._on_hotkey_triggered()
+        time.sleep(0.02)
+        agent.cancel()
+        agent.ui.run_pending()
+        assert popup.calls == [("hide", None)]
+    finally:
+        agent.worker.stop()
@@ -0,0 +1,114 @@
+"""
+测试选中文本获取：PRIMARY 选区读取与剪贴板后备方案
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from whatshouldicite.dispatch import TkUIThread
+from whatshouldicite.global_service import ClipboardTextGetter, PrimarySelectionReader, poll
+
+
+class FakeApp:
+    """模拟目标程序：收到复制按键后经过 delay 秒才写入剪贴板"""
+
+    def __init__(self, selection, clipboard="user clipboard", delay=0.02):
+        self.selection = selection
+        self.clipboard = clipboard
+        self.delay = delay
+        self._copied_at = None
+
+    def paste(self):
+        if self._copied_at is not None and time.monotonic() >= self._copied_at:
+            self.clipboard = self.selection
+            self._copied_at = None
+        return self.clipboard
+
+    def copy(self, text):
+        self.clipboard = text
+
+    def send_keys(self):
+        if self.selection is not None:
+            self._copied_at = time.monotonic() + self.delay
+
+
+def test_poll_backs_off_and_times_out():
+    """测试轮询在条件满足时立即返回，超时返回 None"""
+    calls = []
+    start = time.monotonic()
+    assert poll(lambda: calls.append(1) or len(calls), lambda n: n >= 3) == 3
+    assert time.monotonic() - start < 0.1
+    assert poll(lambda: 0, lambda n: n > 0, timeout=0.05) is None
+
+
+def test_clipboard_getter_restores_clipboard():
+    """测试读取选中文本后恢复原剪贴板，且不需要固定等待"""
+    app = FakeApp("Transformers outperform RNNs.")
+    getter = ClipboardTextGetter(app.paste, app.copy, app.send_keys)
+    start = time.monotonic()
+    assert getter.get_selected_text() == "Transformers outperform RNNs."
+    assert time.monotonic() - start < 0.1
+    assert app.clipboard == "user clipboard"
+
+
+def test_clipboard_getter_same_text_as_clipboard():
+    """测试选中内容与原剪贴板相同时也能识别（旧实现会返回 None）"""
+    app = FakeApp("same text", clipboard="same text")
+    assert ClipboardTextGetter(app.paste, app.copy, app.send_keys).get_selected_text() == "same text"
+
+
+def test_clipboard_getter_nothing_selected():
+    """测试没有选中文本时超时返回 None，并恢复剪贴板"""
+    app = FakeApp(None)
+    getter = ClipboardTextGetter(app.paste, app.copy, app.send_keys, timeout=0.05)
+    assert getter.get_selected_text() is None
+    assert app.clipboard == "user clipboard"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux") or not shutil.which("Xvfb"), reason="需要 Xvfb")
+def test_primary_selection_under_xvfb(monkeypatch):
+    """测试在 Xvfb 中读取其他程序持有的 PRIMARY 选区（命令行工具与共享 UI 线程两种方式）"""
+    display = ":87"
+    xvfb = subprocess.Popen(["Xvfb", display, "-nolisten", "tcp"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    owner = None
+    try:
+        monkeypatch.setenv("DISPLAY", display)
+        monkeypatch.delenv("WAYLAND_DISPLAY", raising=False)
+        time.sleep(0.5)
+        # 另一个进程用 Tk 持有 PRIMARY 选区
+        script = (
+            "import tkinter as tk\n"
+            "root = tk.Tk()\n"
+            "root.selection_handle(lambda offset, length: 'Recent studies show gains.'[int(offset):][:int(length)])\n"
+            "root.selection_own()\n"
+            "print('ready', flush=True)\n"
+            "root.mainloop()\n"
+        )
+        owner = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE,
+                                 env=dict(os.environ, DISPLAY=display))
+        assert owner.stdout.readline().strip() == b"ready"
+
+        assert PrimarySelectionReader.available()
+        reader = PrimarySelectionReader()
+        start = time.monotonic()
+        assert reader.read() == "Recent studies show gains."
+        assert time.monotonic() - start < 0.1
+
+        # Tk 读取方式在共享 UI 线程的根窗口上执行，不另建根窗口
+        ui = TkUIThread().start()
+        try:
+            tk_reader = PrimarySelectionReader(ui=ui)
+            tk_reader.command = None
+            assert tk_reader.read() == "Recent studies show gains."
+        finally:
+            ui.stop()
+    finally:
+        if owner is not None:
+            owner.kill()
+        xvfb.kill()
@@ -0,0 +1,124 @@
+"""
+测试 LLM 单次结构化分析
+"""
+
+from whatshouldicite import CitationAgent
+from whatshouldicite.llm_client import LLMClient, UnifiedLLMClient
+
+
+class ScriptedClient(LLMClient):
+    """按顺序返回预设响应的假 LLM 客户端"""
+
+    model = "scripted"
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+        self.kwargs = []
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        self.prompts.append(prompt)
+        self.kwargs.append(kwargs)
+        return self.responses.pop(0)
+
+
+GOOD_JSON = """```json
+{"needs_citation": "yes", "reason": "提到了具体方法", "intent": "Method Technique",
+ "citation_types": ["Foundational works on transformers"],
+ "keywords": ["transformer architecture", "self-attention"]}
+```"""
+
+
+def test_structured_single_call():
+    """测试一次调用解析出全部字段"""
+    client = ScriptedClient(GOOD_JSON)
+    result = UnifiedLLMClient(client).analyze_structured("The transformer was introduced in 2017.")
+
+    assert len(client.prompts) == 1
+    assert client.kwargs[0]["json_mode"] is True
+    assert result["needs_citation"] == "Yes"
+    assert result["intent"] == "method_technique"
+    assert result["keywords"] == ["transformer architecture", "self-attention"]
+
+
+def test_structured_repair_once():
+    """测试格式错误时修复一次"""
+    client = ScriptedClient('{"needs_citation": "No", "reason": "常识', '{"needs_citation": "No", "reason": "常识"}')
+    result = UnifiedLLMClient(client).analyze_structured("Water boils at 100 degrees.")
+
+    assert len(client.prompts) == 2
+    assert result["needs_citation"] == "No"
+    assert result["citation_types"] == [] and result["keywords"] == []
+
+
+def test_structured_gives_up_after_repair():
+    """测试修复仍失败时返回 Optional 而不是抛出异常"""
+    client = ScriptedClient("not json", "still not json")
+    result = UnifiedLLMClient(client).analyze_structured("Some text.")
+
+    assert len(client.prompts) == 2
+    assert result["needs_citation"] == "Optional"
+    assert "error" in result
+
+
+
+def test_theoretical_claim_intent():
+    """测试理论性论断不会被解析为 unknown，且需要引用"""
+    client = ScriptedClient("Theoretical claim", '{"needs_citation": "Yes", "intent": "theoretical"}')
+    unified = UnifiedLLMClient(client, use_cache=False)
+
+    assert unified.classify_intent("By the universal approximation theorem, ...") == \
+        {"intent": "theoretical_claim", "needs_citation": "Yes", "confidence": 0.9}
+    assert unified.analyze_structured("The bound follows from the theorem.")["intent"] == "theoretical_claim"
+
+def test_agent_single_call_mode():
+    """测试 Agent 单次调用模式只访问一次 LLM"""
+    client = ScriptedClient(GOOD_JSON)
+    agent = CitationAgent(llm_client=client, single_call=True)
+    output = agent.analyze("The transformer was introduced in 2017.")
+
+    assert len(client.prompts) == 1
+    assert "✔️ Yes" in output
+    assert '- "self-attention"' in output
+
+
+class WarmableClient(ScriptedClient):
+    """记录预热次数的假 LLM 客户端"""
+
+    def __init__(self, *responses):
+        super().__init__(*responses)
+        self.warmups = 0
+
+    def warmup(self) -> bool:
+        self.warmups += 1
+        return True
+
+
+def test_components_share_one_unified_client():
+    """测试 Agent 各模块共享同一个 UnifiedLLMClient"""
+    agent = CitationAgent(llm_client=ScriptedClient())
+
+    assert isinstance(agent.llm_client, UnifiedLLMClient)
+    assert agent.intent_classifier.llm_client is agent.llm_client
+    assert agent.planner.llm_client is agent.llm_client
+    assert agent.planner.intent_classifier.llm_client is agent.llm_client
+    assert agent.keyword_generator.llm_client is agent.llm_client
+
+
+def test_mode_manager_reuses_agents_and_warms_up():
+    """测试快捷键路径复用 Agent，预热和首次调用延迟可见"""
+    from whatshouldicite.mode_selector import ModeManager, AnalysisMode
+
+    client = WarmableClient(GOOD_JSON)
+    manager = ModeManager(default_mode=AnalysisMode.LLM_BASED)
+    manager.set_llm_client(client)
+
+    assert manager.warmup() is True
+    assert client.warmups == 1
+    assert manager.get_agent() is manager.get_agent()
+
+    manager.analyze_with_mode("The transformer was introduced in 2017.")
+    stats = manager.llm_client.latency_stats()
+    assert stats["calls"] == 1
+    assert stats["warmup_ms"] is not None
+    assert stats["first_call_ms"] is not None
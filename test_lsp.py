@@ -0,0 +1,220 @@
+"""
+测试语言服务器：增量诊断、去抖动、悬停和代码操作
+"""
+
+import io
+import os
+import queue
+import threading
+import time
+
+from whatshouldicite.lsp import CitationLanguageServer, read_message, to_index, to_units, write_message
+from whatshouldicite.scanner import IncrementalSplitter, iter_sentences
+from whatshouldicite.watcher import IncrementalScanner
+
+URI = "file:///tmp/paper.tex"
+DOC = (
+    "It is well known that water boils at 100 degrees.\n"
+    "\n"
+    "Recent studies have shown that transformers outperform RNNs on translation.\n"
+    "Deep learning has revolutionized vision \\cite{lecun2015}.\n"
+)
+
+
+class Session:
+    """通过管道驱动服务器（与编辑器经 stdio 通信的方式相同）"""
+
+    def __init__(self, debounce=0.05):
+        self.server = CitationLanguageServer(debounce=debounce)
+        client_read, server_write = os.pipe()
+        server_read, self._client_write = os.pipe()
+        self._reader = os.fdopen(client_read, "rb")
+        self._writer = os.fdopen(self._client_write, "wb")
+        self.thread = threading.Thread(
+            target=self.server.serve,
+            args=(os.fdopen(server_read, "rb"), os.fdopen(server_write, "wb")),
+            daemon=True
+        )
+        self.thread.start()
+        self.notifications = queue.Queue()
+        self.responses = {}
+        self._next_id = 0
+        self._responded = threading.Condition()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def _read_loop(self):
+        while True:
+            message = read_message(self._reader)
+            if message is None:
+                return
+            if "id" in message and "method" not in message:
+                with self._responded:
+                    self.responses[message["id"]] = message
+                    self._responded.notify_all()
+            else:
+                self.notifications.put(message)
+
+    def notify(self, method, params):
+        write_message(self._writer, {"jsonrpc": "2.0", "method": method, "params": params})
+
+    def request(self, method, params):
+        self._next_id += 1
+        request_id = self._next_id
+        write_message(self._writer, {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        with self._responded:
+            assert self._responded.wait_for(lambda: request_id in self.responses, timeout=5)
+            return self.responses.pop(request_id)
+
+    def diagnostics(self, timeout=5):
+        deadline = time.time() + timeout
+        while True:
+            message = self.notifications.get(timeout=max(0.01, deadline - time.time()))
+            if message["method"] == "textDocument/publishDiagnostics":
+                return message["params"]
+
+    def close(self):
+        self.request("shutdown", {})
+        self.notify("exit", {})
+        self.thread.join(5)
+        self._writer.close()
+
+
+def open_session(**kwargs):
+    session = Session(**kwargs)
+    session.request("initialize", {"capabilities": {}})
+    session.notify("initialized", {})
+    session.notify("textDocument/didOpen", {"textDocument": {
+        "uri": URI, "languageId": "latex", "version": 1, "text": DOC}})
+    return session
+
+
+def test_framing_roundtrip():
+    """测试 Content-Length 分帧（含多字节字符）"""
+    stream = io.BytesIO()
+    write_message(stream, {"method": "x", "params": {"text": "引用 🙂"}})
+    stream.seek(0)
+    assert read_message(stream) == {"method": "x", "params": {"text": "引用 🙂"}}
+    assert read_message(stream) is None
+
+
+def test_utf16_columns():
+    """测试 UTF-16 码元与字符串下标互换（BMP 以外字符占两个码元）"""
+    line = "🙂 Recent studies show."
+    assert to_units(line, 2) == 3
+    assert to_index(line, 3) == 2
+    assert to_units(line, 2, "utf-32") == 2
+
+
+def test_incremental_splitter_matches_full_split():
+    """测试按段落缓存的切分结果与完整切分一致（含编辑后）"""
+    lines = (DOC + "\nOur method outperforms previous approaches.\n").splitlines(keepends=True)
+    splitter = IncrementalSplitter("tex")
+    signature = lambda sentences: [(s.text, s.line, s.column, s.end_line, s.end_column) for s in sentences]
+    assert signature(splitter.split(lines)) == signature(iter_sentences(lines, "tex"))
+    lines.insert(0, "\\section{Intro}\n")
+    lines[3] = "Recent work shows gains.\n"
+    assert signature(splitter.split(lines)) == signature(iter_sentences(lines, "tex"))
+
+
+def test_scan_can_be_cancelled():
+    """测试取消后停止分析，结果标记为 cancelled"""
+    cancel = threading.Event()
+    cancel.set()
+    update = IncrementalScanner().scan_sentences(iter_sentences(DOC.splitlines(True), "tex"), cancel)
+    assert update["stats"]["cancelled"] and update["verdicts"] == []
+
+
+def test_open_publishes_diagnostics():
+    """测试打开文档后发布诊断：只标记缺少引用的论断，范围覆盖整句"""
+    session = open_session()
+    try:
+        params = session.diagnostics()
+        assert params["uri"] == URI and params["version"] == 1
+        flagged = [d for d in params["diagnostics"] if d["range"]["start"]["line"] == 2]
+        assert len(flagged) == 1
+        assert flagged[0]["range"]["end"] == {"line": 2, "character": len(DOC.splitlines()[2])}
+        assert flagged[0]["data"]["keywords"]
+        # 已带引用的句子不标记
+        assert all(d["range"]["start"]["line"] != 3 for d in params["diagnostics"])
+    finally:
+        session.close()
+
+
+def test_change_reanalyzes_only_edited_sentence():
+    """测试增量修改后只重新分析改动的句子，并且去抖动合并连续输入"""
+    session = open_session(debounce=0.2)
+    try:
+        session.diagnostics()
+        # 连续三次输入，只应触发一次分析
+        previous = DOC.splitlines()[0]
+        edits = ["It is well known that ice melts.", "It is well known that ice melts at 0 degrees.",
+                 "It is well known that ice melts at 0 degrees Celsius."]
+        for version, line in enumerate(edits, start=2):
+            session.notify("textDocument/didChange", {
+                "textDocument": {"uri": URI, "version": version},
+                "contentChanges": [{"range": {"start": {"line": 0, "character": 0},
+                                              "end": {"line": 0, "character": len(previous)}},
+                                    "text": line}],
+            })
+            previous = line
+        params = session.diagnostics()
+        assert params["version"] == 4
+        document = session.server.documents[URI]
+        assert document.text.splitlines()[0] == edits[-1]
+        assert document.stats["analyzed"] == 1
+        assert session.notifications.empty()
+    finally:
+        session.close()
+
+
+def test_adding_citation_clears_diagnostic():
+    """测试给被标记的句子补上引用后诊断消失，删掉引用后重新出现"""
+    session = open_session()
+    try:
+        flagged = lambda params: [d for d in params["diagnostics"] if d["range"]["start"]["line"] == 2]
+        assert flagged(session.diagnostics())
+        end = len(DOC.splitlines()[2]) - 1  # 句号之前
+        cite = " \\cite{vaswani2017}"
+        session.notify("textDocument/didChange", {
+            "textDocument": {"uri": URI, "version": 2},
+            "contentChanges": [{"range": {"start": {"line": 2, "character": end},
+                                          "end": {"line": 2, "character": end}},
+                                "text": cite}],
+        })
+        assert not flagged(session.diagnostics())
+        session.notify("textDocument/didChange", {
+            "textDocument": {"uri": URI, "version": 3},
+            "contentChanges": [{"range": {"start": {"line": 2, "character": end},
+                                          "end": {"line": 2, "character": end + len(cite)}},
+                                "text": ""}],
+        })
+        assert flagged(session.diagnostics())
+    finally:
+        session.close()
+
+
+def test_hover_and_code_action():
+    """测试悬停显示关键词，代码操作携带检索命令"""
+    session = open_session()
+    try:
+        session.diagnostics()
+        position = {"line": 2, "character": 10}
+        hover = session.request("textDocument/hover", {"textDocument": {"uri": URI}, "position": position})
+        assert "Search keywords" in hover["result"]["contents"]["value"]
+
+        actions = session.request("textDocument/codeAction", {
+            "textDocument": {"uri": URI},
+            "range": {"start": position, "end": position},
+            "context": {"diagnostics": []},
+        })["result"]
+        assert actions and actions[0]["command"]["command"] == "whatshouldicite.searchKeywords"
+
+        session.request("workspace/executeCommand", actions[0]["command"])
+        message = session.notifications.get(timeout=5)
+        assert message["method"] == "window/showMessage" and "scholar" in message["params"]["message"]
+
+        none = session.request("textDocument/hover", {"textDocument": {"uri": URI},
+                                                     "position": {"line": 0, "character": 3}})
+        assert none["result"] is None
+    finally:
+        session.close()
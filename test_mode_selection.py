@@ -2,8 +2,12 @@
 测试模式选择功能
 """
 
+import threading
+import time
+
 from whatshouldicite.mode_selector import ModeManager, AnalysisMode
 from whatshouldicite.agent import CitationAgent
+from whatshouldicite.llm_client import LLMClient, UnifiedLLMClient
 
 def test_rules():
     """测试规则判断"""
@@ -67,6 +71,101 @@ def test_mode_manager():
     except Exception as e:
         print(f"\n[2] LLM 判断模式: 测试失败 - {e}")
 
+class _SlowStreamingClient(LLMClient):
+    """逐段慢速输出的假 LLM 客户端，记录是否被提前关闭"""
+
+    model = "slow-stream"
+
+    def __init__(self, response, delay=0.02):
+        self.response = response
+        self.delay = delay
+        self.started = threading.Event()
+        self.closed_early = False
+        self.finished = False
+
+    def complete(self, prompt, **kwargs):
+        return self.response
+
+    def stream(self, prompt, **kwargs):
+        self.started.set()
+        try:
+            for line in self.response.splitlines(keepends=True):
+                time.sleep(self.delay)
+                yield line
+            self.finished = True
+        except GeneratorExit:
+            self.closed_early = True
+            raise
+
+
+_LLM_RESPONSE = """{
+  "needs_citation": "Yes",
+  "reason": "LLM 判断需要引用",
+  "intent": "factual_claim",
+  "citation_types": [],
+  "keywords": ["llm keyword"]
+}
+"""
+
+_LLM_SECTION_RESPONSE = """【Do I need a citation?】
+Yes
+
+【Why】
+- LLM 判断需要引用
+
+【Search keywords】
+- "llm keyword"
+"""
+
+
+def _hybrid_manager(client, threshold=0.7, single_call=True):
+    manager = ModeManager(default_mode=AnalysisMode.HYBRID, hybrid_threshold=threshold, single_call=single_call)
+    manager.set_llm_client(UnifiedLLMClient(client))
+    return manager
+
+
+def test_hybrid_confident_rules_cancel_llm():
+    """测试混合模式：规则置信度达到阈值时直接采用规则结果并取消 LLM"""
+    client = _SlowStreamingClient(_LLM_RESPONSE)
+    manager = _hybrid_manager(client)
+
+    result = manager.analyze_hybrid("Our method outperforms previous approaches on the benchmark.")
+    assert result["source"] == "rule"
+    assert client.started.wait(1)
+
+    deadline = time.time() + 2
+    while not client.closed_early and time.time() < deadline:
+        time.sleep(0.01)
+    assert client.closed_early and not client.finished
+
+
+def test_hybrid_uncertain_rules_use_inflight_llm():
+    """测试混合模式：规则不确定时使用已在途的 LLM 结果"""
+    client = _SlowStreamingClient(_LLM_RESPONSE)
+    manager = _hybrid_manager(client)
+
+    result = manager.analyze_hybrid("The cat sat on the mat.")
+    assert result["source"] == "llm"
+    assert result["reason"] == "LLM 判断需要引用"
+    assert result["keywords"] == ["llm keyword"]
+
+    frames = list(_hybrid_manager(_SlowStreamingClient(_LLM_RESPONSE)).analyze_stream("The cat sat on the mat."))
+    assert len(frames) > 1 and "llm keyword" in frames[-1]
+
+    # 关闭单次结构化调用时使用分段文本格式
+    manager = _hybrid_manager(_SlowStreamingClient(_LLM_SECTION_RESPONSE), single_call=False)
+    assert manager.analyze_hybrid("The cat sat on the mat.")["keywords"] == ["llm keyword"]
+
+
+def test_hybrid_threshold_is_configurable():
+    """测试阈值可配置：阈值高于规则置信度时改用 LLM"""
+    client = _SlowStreamingClient(_LLM_RESPONSE, delay=0)
+    manager = _hybrid_manager(client, threshold=0.95)
+
+    result = manager.analyze_hybrid("Our method outperforms previous approaches on the benchmark.")
+    assert result["source"] == "llm"
+
+
 if __name__ == "__main__":
     print("WhatShouldICite - 模式选择功能测试")
     print()
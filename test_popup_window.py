@@ -0,0 +1,71 @@
+"""
+测试浮窗和模式选择窗口：共享同一个 UI 线程，只创建一次并反复显示
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+from whatshouldicite.dispatch import TkUIThread
+from whatshouldicite.mode_selector import AnalysisMode, ModeSelectorWindow
+from whatshouldicite.popup_window import CitationPopupWindow, SimplePopupWindow
+
+pytestmark = pytest.mark.skipif(
+    sys.platform.startswith("linux") and not os.environ.get("DISPLAY"), reason="需要图形界面"
+)
+
+
+@pytest.fixture
+def ui():
+    ui = TkUIThread().start()
+    yield ui
+    ui.stop()
+
+
+def on_ui(ui, fn):
+    """在 UI 线程中执行 fn 并返回结果"""
+    box = []
+    done = threading.Event()
+    ui.call(lambda: (box.append(fn()), done.set()))
+    assert done.wait(5)
+    return box[0]
+
+
+def test_popup_is_built_once_and_reused(ui):
+    """测试再次显示只替换文本，不重建窗口；Esc 关闭只隐藏"""
+    popup = SimplePopupWindow(ui)
+    popup.show("first")
+    window = on_ui(ui, lambda: popup.window)
+    popup.hide()
+    popup.show("second")
+    popup.update_content("second, completed")
+    assert on_ui(ui, lambda: popup.window) is window
+    assert on_ui(ui, lambda: popup.text_widget.get("1.0", "end-1c")) == "second, completed"
+    assert on_ui(ui, lambda: len(ui.root.winfo_children())) == 1
+    popup.hide()
+    assert on_ui(ui, lambda: (popup.visible, window.winfo_exists())) == (False, 1)
+
+
+def test_selector_callback_runs_on_ui_thread(ui):
+    """测试模式选择窗口复用，选择回调在 UI 线程中执行"""
+    seen = []
+    selector = ModeSelectorWindow(lambda mode: seen.append((mode, ui.in_ui_thread())), ui)
+    for mode in (AnalysisMode.LLM_BASED, AnalysisMode.HYBRID):
+        selector.show()
+        ui.call(selector._select_mode, mode)
+    on_ui(ui, lambda: None)
+    assert seen == [(AnalysisMode.LLM_BASED, True), (AnalysisMode.HYBRID, True)]
+    assert on_ui(ui, lambda: len(ui.root.winfo_children())) == 1
+
+
+def test_citation_popup_from_other_threads(ui):
+    """测试从多个线程显示浮窗，都挂在同一个根窗口下，不另开事件循环"""
+    popup = CitationPopupWindow(ui)
+    threads = [threading.Thread(target=popup.show_async, args=(f"text {i}", 10, 10)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert on_ui(ui, lambda: (popup.visible, len(ui.root.winfo_children()))) == (True, 1)
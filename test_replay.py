@@ -0,0 +1,155 @@
+"""
+测试录制 / 回放 LLM 后端
+"""
+
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from whatshouldicite import CitationAgent
+from whatshouldicite.llm_client import LLMClient, LLMError, LLMTimeoutError, RetryableLLMError
+from whatshouldicite.replay import LatencyModel, ReplayLLMClient, make_openai_server
+
+TEXT = "The transformer was introduced in 2017."
+
+
+class EchoClient(LLMClient):
+    """返回提示词长度的假 LLM 客户端"""
+
+    model = "echo"
+
+    def __init__(self):
+        self.calls = 0
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        return f"【Do I need a citation?】\nYes\n\n【Why】\n- {len(prompt)}"
+
+
+class JSONClient(EchoClient):
+    """返回结构化 JSON 的假 LLM 客户端"""
+
+    RESPONSE = ('{"needs_citation": "Yes", "reason": "提到了具体方法", "intent": "method_technique", '
+                '"citation_types": ["Foundational works"], "keywords": ["transformer"]}')
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        return self.RESPONSE
+
+
+def test_record_then_replay(tmp_path):
+    """测试录制后回放相同响应，不再调用真实客户端"""
+    path = str(tmp_path / "fixture.json")
+    real = EchoClient()
+    with ReplayLLMClient(path, mode="record", client=real) as recorder:
+        recorded = recorder.complete("hello", max_tokens=50)
+
+    replay = ReplayLLMClient(path)
+    assert replay.complete("hello", max_tokens=50, timeout=3) == recorded
+    assert real.calls == 1
+    with pytest.raises(LLMError):
+        replay.complete("hello", max_tokens=99)
+
+
+def test_recorded_fixture_served_to_openai_requests(tmp_path):
+    """测试按 record 命令的方式录制后，OpenAI 客户端经本地服务发来的请求都能命中"""
+    path = str(tmp_path / "fixture.json")
+    real = JSONClient()
+    with ReplayLLMClient(path, mode="record", client=real) as recorder:
+        CitationAgent(llm_client=recorder, single_call=True).analyze_structured(TEXT)
+        assert not os.path.exists(path)  # 关闭时才写文件
+    prompt, = [entry["prompt"] for entry in json.load(open(path, encoding="utf-8"))["entries"].values()]
+
+    replay = ReplayLLMClient(path)
+    server = make_openai_server(replay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # 与 OpenAIClient.complete 发出的请求相同：总是带 temperature / max_tokens
+        request = urllib.request.Request(
+            "http://%s:%d/v1/chat/completions" % server.server_address[:2],
+            data=json.dumps({
+                "model": "gpt-3.5-turbo",
+                "messages": [{"role": "system", "content": "You are a helpful research assistant."},
+                             {"role": "user", "content": prompt}],
+                "temperature": 0.3, "max_tokens": 400, "response_format": {"type": "json_object"},
+            }).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            body = json.loads(response.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert body["choices"][0]["message"]["content"] == JSONClient.RESPONSE
+    assert (replay.hits, replay.misses, real.calls) == (1, 0, 1)
+
+
+def test_synthetic_latency_and_errors_are_reproducible(tmp_path):
+    """测试合成延迟和错误率可按种子复现"""
+    def run(seed):
+        sleeps = []
+        client = ReplayLLMClient(str(tmp_path / "none.json"), latency="lognormal:0.2,0.5",
+                                 error_rate=0.3, seed=seed, default="ok", sleep=sleeps.append)
+        outcomes = []
+        for _ in range(50):
+            try:
+                outcomes.append(client.complete("p"))
+            except RetryableLLMError:
+                outcomes.append("error")
+        return outcomes, sleeps
+
+    first, second = run(7), run(7)
+    assert first == second
+    assert 5 < first[0].count("error") < 30
+
+
+def test_timeout_is_simulated(tmp_path):
+    """测试延迟超过超时参数时抛出超时错误"""
+    client = ReplayLLMClient(str(tmp_path / "none.json"), latency="fixed:5",
+                             default="ok", sleep=lambda s: None)
+    with pytest.raises(LLMTimeoutError):
+        client.complete("p", timeout=0.1)
+
+
+def test_latency_spec_validation():
+    """测试无效的延迟规格"""
+    assert LatencyModel("uniform:0.1,0.2").sample() <= 0.2
+    with pytest.raises(ValueError):
+        LatencyModel("gamma:1")
+
+
+def test_openai_compatible_server(tmp_path):
+    """测试 OpenAI 兼容的本地 HTTP 服务（普通与流式）"""
+    client = ReplayLLMClient(str(tmp_path / "none.json"), default="line one\nline two\n")
+    server = make_openai_server(client)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = "http://%s:%d/v1" % server.server_address[:2]
+
+    def post(payload):
+        request = urllib.request.Request(
+            base + "/chat/completions", data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.read().decode()
+
+    try:
+        body = json.loads(post({"model": "m", "messages": [{"role": "user", "content": "hi"}]}))
+        assert body["choices"][0]["message"]["content"] == "line one\nline two\n"
+
+        stream = post({"model": "m", "stream": True, "messages": [{"role": "user", "content": "hi"}]})
+        events = [line[6:] for line in stream.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        text = "".join(json.loads(e)["choices"][0]["delta"].get("content", "") for e in events[:-1])
+        assert text == "line one\nline two\n"
+
+        with urllib.request.urlopen(base + "/models/m", timeout=5) as response:
+            assert json.loads(response.read())["id"] == "m"
+    finally:
+        server.shutdown()
+        server.server_close()
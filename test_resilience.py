@@ -0,0 +1,163 @@
+"""
+测试截止时间、重试与对冲请求
+"""
+
+import threading
+import time
+
+import pytest
+
+from whatshouldicite.llm_client import (
+    LLMClient, LLMError, LLMTimeoutError, RetryableLLMError, UnifiedLLMClient, wrap_sdk_error
+)
+from whatshouldicite.resilience import ResilientLLMClient, RetryPolicy
+
+
+class FlakyClient(LLMClient):
+    """按脚本依次失败或延迟的假 LLM 客户端"""
+
+    model = "flaky"
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self.timeouts = []
+        self.lock = threading.Lock()
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        with self.lock:
+            step = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+            self.timeouts.append(kwargs.get("timeout"))
+        if isinstance(step, Exception):
+            raise step
+        if isinstance(step, (int, float)):
+            time.sleep(step)
+            return f"slept {step}"
+        return step
+
+
+def no_sleep(_):
+    pass
+
+
+def test_retryable_errors_are_retried():
+    """测试可重试错误按退避重试，退避时间有上限"""
+    delays = []
+    client = FlakyClient(RetryableLLMError("429"), RetryableLLMError("503"), "ok")
+    resilient = ResilientLLMClient(client, retry=RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=0.15,
+                                                             rng=lambda: 1.0), sleep=delays.append)
+
+    assert resilient.complete("prompt") == "ok"
+    assert client.calls == 3
+    assert delays == [0.1, 0.15]
+    assert resilient.stats()["retries"] == 2
+
+
+def test_non_retryable_errors_fail_fast():
+    """测试不可重试错误直接抛出"""
+    client = FlakyClient(LLMError("401 invalid key"), "ok")
+    resilient = ResilientLLMClient(client, sleep=no_sleep)
+
+    with pytest.raises(LLMError):
+        resilient.complete("prompt")
+    assert client.calls == 1
+
+
+def test_deadline_bounds_slow_calls():
+    """测试截止时间：底层调用不返回也会按时失败，且超时参数不超过剩余预算"""
+    client = FlakyClient(1.0)
+    resilient = ResilientLLMClient(client, deadline=0.1, sleep=no_sleep)
+
+    start = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        resilient.complete("prompt")
+    assert time.monotonic() - start < 0.5
+    assert client.timeouts[0] <= 0.1
+
+
+def test_hedged_request_wins():
+    """测试第一次请求过慢时发出对冲请求，先返回者胜出"""
+    client = FlakyClient(1.0, "fast")
+    resilient = ResilientLLMClient(client, deadline=2.0, hedge=True, hedge_delay=0.05, sleep=no_sleep)
+
+    start = time.monotonic()
+    assert resilient.complete("prompt") == "fast"
+    assert time.monotonic() - start < 0.5
+    stats = resilient.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+
+class DripClient(LLMClient):
+    """每隔 interval 秒产出一个 token 的假流式客户端"""
+
+    model = "drip"
+
+    def __init__(self, interval: float, count: int):
+        self.interval = interval
+        self.count = count
+        self.closed = threading.Event()
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        return "".join(self.stream(prompt))
+
+    def stream(self, prompt: str, **kwargs):
+        try:
+            for i in range(self.count):
+                time.sleep(self.interval)
+                yield f"{i} "
+        finally:
+            self.closed.set()
+
+
+def test_stream_hedges_on_slow_first_token():
+    """测试流式调用：首 token 过慢时发出对冲流，先出 token 者胜出，首 token 延迟计入样本"""
+    client = FlakyClient(1.0, "fast")
+    resilient = ResilientLLMClient(client, deadline=2.0, hedge=True, hedge_delay=0.05, sleep=no_sleep)
+
+    start = time.monotonic()
+    assert list(resilient.stream("prompt")) == ["fast"]
+    assert time.monotonic() - start < 0.5
+    stats = resilient.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    assert len(resilient.latencies) == 1
+
+
+def test_stream_deadline_bounds_whole_stream():
+    """测试截止时间约束整个流：每个 token 都按时到达，总时长超出预算也会失败并关闭底层流"""
+    client = DripClient(0.05, 100)
+    resilient = ResilientLLMClient(client, deadline=0.3, sleep=no_sleep)
+
+    chunks = []
+    start = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        for chunk in resilient.stream("prompt"):
+            chunks.append(chunk)
+    assert time.monotonic() - start < 0.6
+    assert 0 < len(chunks) < 100
+    assert client.closed.wait(1)
+    assert resilient.stats()["timeouts"] == 1
+
+def test_sdk_errors_are_typed():
+    """测试 SDK 异常转换为带类型的错误"""
+    class RateLimitError(Exception):
+        status_code = 429
+
+    class AuthenticationError(Exception):
+        status_code = 401
+
+    assert isinstance(wrap_sdk_error("OpenAI", RateLimitError("slow down")), RetryableLLMError)
+    assert isinstance(wrap_sdk_error("OpenAI", TimeoutError()), LLMTimeoutError)
+    error = wrap_sdk_error("OpenAI", AuthenticationError("bad key"))
+    assert type(error) is LLMError and "OpenAI API 调用失败" in str(error)
+
+
+def test_unified_client_reports_error_type():
+    """测试失败结果中带有错误类型，而不是静默返回 Optional"""
+    client = FlakyClient(RetryableLLMError("503"))
+    resilient = ResilientLLMClient(client, retry=RetryPolicy(max_attempts=2), sleep=no_sleep)
+    result = UnifiedLLMClient(resilient).analyze_structured("text")
+
+    assert result["needs_citation"] == "Optional"
+    assert result["error_type"] == "RetryableLLMError"
@@ -0,0 +1,99 @@
+"""
+测试文档扫描器
+"""
+
+import io
+
+from whatshouldicite.scanner import iter_sentences, scan_document
+
+
+TEX_DOC = r"""\documentclass{article}
+\begin{document}
+\section{Introduction}
+Deep learning has revolutionized vision \cite{lecun2015}.
+Transformers, e.g. BERT, were introduced
+by Vaswani et al. in 2017. % comment. Ignored.
+\begin{equation}
+  a = b. c = d.
+\end{equation}
+It is well known that water boils at 100 degrees.
+\end{document}
+"""
+
+MD_DOC = """# Intro
+Recent studies show gains [@smith2020]. Our **novel** model beats
+the `baseline` in [our repo](http://example.org/a.html).
+
+```python
+x = 1. y = 2.
+```
+- See Fig. 3 for details!
+"""
+
+
+def test_tex_sentences_and_offsets():
+    """测试 LaTeX 切分、引用检测和行列号"""
+    sentences = list(iter_sentences(io.StringIO(TEX_DOC), syntax="tex"))
+
+    assert [s.text for s in sentences] == [
+        "Deep learning has revolutionized vision.",
+        "Transformers, e.g. BERT, were introduced by Vaswani et al. in 2017.",
+        "It is well known that water boils at 100 degrees.",
+    ]
+    assert [(s.line, s.column) for s in sentences] == [(4, 1), (5, 1), (10, 1)]
+    assert [s.cited for s in sentences] == [True, False, False]
+
+
+def test_markdown_sentences():
+    """测试 Markdown 切分"""
+    sentences = list(iter_sentences(io.StringIO(MD_DOC), syntax="md"))
+
+    assert [s.text for s in sentences] == [
+        "Recent studies show gains.",
+        "Our novel model beats the in our repo.",
+        "See Fig. 3 for details!",
+    ]
+    assert (sentences[1].line, sentences[1].column) == (2, 41)
+    assert sentences[0].cited
+
+
+
+def test_citation_marks_only_its_sentence():
+    """测试同一行有多个句子时，只有包含引用标记的句子被标为已引用"""
+    tex = "Deep learning works well. Transformers beat RNNs on translation \\cite{vaswani}.\n"
+    md = "Deep learning works well. Transformers beat RNNs on translation [@vaswani].\n"
+
+    for doc, syntax in ((tex, "tex"), (md, "md")):
+        sentences = list(iter_sentences(io.StringIO(doc), syntax=syntax))
+        assert [s.text for s in sentences] == [
+            "Deep learning works well.",
+            "Transformers beat RNNs on translation.",
+        ]
+        assert [s.cited for s in sentences] == [False, True]
+
+    verdicts = list(scan_document(io.StringIO(tex), syntax="tex"))
+    assert [v["already_cited"] for v in verdicts] == [False, True]
+
+def test_scan_is_lazy():
+    """测试首个结果在读完全文之前产出"""
+    consumed = []
+
+    def lines():
+        for i in range(1000):
+            consumed.append(i)
+            yield f"Our method outperforms baseline number {i}.\n"
+
+    verdicts = scan_document(lines(), syntax="text")
+    first = next(verdicts)
+
+    assert first["line"] == 1
+    assert first["needs_citation"] == "Yes"
+    assert len(consumed) < 5
+
+
+def test_scan_skips_cited():
+    """测试已有引用的句子不再分析"""
+    verdicts = list(scan_document(io.StringIO(TEX_DOC), syntax="tex"))
+
+    assert verdicts[0]["already_cited"]
+    assert verdicts[2]["needs_citation"] == "No"
@@ -0,0 +1,97 @@
+"""
+测试 HTTP 分析服务
+"""
+
+import http.client
+import json
+import threading
+
+import pytest
+
+from whatshouldicite import CitationAgent
+from whatshouldicite.server import AnalysisServer, Overloaded, WorkerPool
+
+
+@pytest.fixture
+def server():
+    """在后台线程中运行的服务（系统分配端口）"""
+    app = AnalysisServer(port=0, workers=2, max_queue=4)
+    app.bind()
+    thread = threading.Thread(target=app.serve_forever, daemon=True)
+    thread.start()
+    yield app
+    app.shutdown()
+    thread.join(5)
+
+
+def request(app, method, path, payload=None):
+    conn = http.client.HTTPConnection("127.0.0.1", app.port, timeout=10)
+    body = None if payload is None else json.dumps(payload)
+    conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = response.read().decode("utf-8")
+    conn.close()
+    return response.status, data
+
+
+def test_analyze_and_batch(server):
+    """测试单条和批量分析与直接调用 CitationAgent 一致"""
+    text = "Recent studies have shown that transformers outperform RNNs."
+    status, body = request(server, "POST", "/analyze", {"text": text, "mode": "rule"})
+    assert status == 200
+    assert json.loads(body)["formatted"] == CitationAgent().analyze(text)
+
+    status, body = request(server, "POST", "/analyze/batch", {"texts": [text, "We use BERT."]})
+    results = json.loads(body)["results"]
+    assert status == 200 and len(results) == 2
+    assert results[0]["needs_citation"] == CitationAgent().analyze_structured(text)["needs_citation"]
+
+
+def test_stream_returns_ndjson(server):
+    """测试流式接口逐行返回部分结果，最后一行 done=True"""
+    status, body = request(server, "POST", "/analyze/stream", {"text": "We adopt the Adam optimizer."})
+    lines = [json.loads(line) for line in body.splitlines() if line]
+    assert status == 200
+    assert lines[-1]["done"] is True and lines[-1]["formatted"]
+
+
+def test_bad_requests(server):
+    """测试参数错误和未知路径"""
+    assert request(server, "POST", "/analyze", {"text": 1})[0] == 400
+    assert request(server, "POST", "/analyze", {"text": "x", "mode": "bogus"})[0] == 400
+    assert request(server, "POST", "/nowhere", {})[0] == 404
+
+
+def test_keep_alive_connection(server):
+    """测试同一连接上连续请求"""
+    conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+    for _ in range(3):
+        conn.request("POST", "/analyze", body=json.dumps({"text": "We use BERT."}))
+        response = conn.getresponse()
+        assert response.status == 200
+        response.read()
+    conn.close()
+
+
+def test_health_reports_queue_and_latency(server):
+    """测试健康检查包含队列深度和延迟分位数"""
+    request(server, "POST", "/analyze", {"text": "We use BERT."})
+    status, body = request(server, "GET", "/health")
+    health = json.loads(body)
+    assert status == 200 and health["status"] == "ok"
+    assert health["queue_depth"] == 0 and health["workers"] == 2
+    assert health["completed"] >= 1 and health["latency_ms"]["p50"] is not None
+
+
+def test_worker_pool_admission_control():
+    """测试等待队列满时拒绝新任务，已提交的任务不受影响"""
+    pool = WorkerPool(workers=1, max_queue=1)
+    release = threading.Event()
+    first = pool.submit(release.wait, 5)
+    second = pool.submit(lambda: "queued")
+    with pytest.raises(Overloaded):
+        pool.submit(lambda: "rejected")
+    assert pool.stats()["rejected"] == 1
+    release.set()
+    assert first.result(5) is True and second.result(5) == "queued"
+    pool.shutdown()
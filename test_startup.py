@@ -0,0 +1,39 @@
+"""
+测试冷启动：规则路径只导入标准库，GUI 和快捷键依赖推迟到第一次使用
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+
+def loaded_modules(code: str):
+    """在新进程中执行 code，返回之后已加载的模块名"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+    script = code + "\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, env=env, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+    return set(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+
+def test_rule_path_imports_only_stdlib():
+    """测试规则路径不导入任何第三方模块或 LLM 相关模块"""
+    modules = loaded_modules(
+        "from whatshouldicite import CitationAgent\n"
+        "CitationAgent().analyze('We adopt a transformer to encode the input.')"
+    )
+    # 解释器启动时（site 钩子等）已加载的模块不计
+    new = modules - loaded_modules("")
+    third_party = {m.split(".")[0] for m in new} - set(sys.stdlib_module_names) - {"whatshouldicite"}
+    assert third_party == set()
+    assert "whatshouldicite.llm_client" not in modules
+    assert "concurrent.futures" not in modules
+
+
+def test_global_agent_defers_gui_and_hotkey_dependencies():
+    """测试导入全局 Agent 不加载 tkinter、keyboard、剪贴板和 LLM SDK"""
+    modules = loaded_modules("import whatshouldicite.global_agent")
+    deferred = {"tkinter", "keyboard", "pyperclip", "pyautogui", "openai", "anthropic", "httpx"}
+    assert deferred & modules == set()
@@ -0,0 +1,166 @@
+"""
+测试流式解析与流式分析
+"""
+
+from whatshouldicite.llm_client import LLMClient, UnifiedLLMClient
+from whatshouldicite.streaming import JSONFieldStreamParser, SectionStreamParser, render_partial
+
+
+RESPONSE = """【Do I need a citation?】
+Yes
+
+【Why】
+- 提到了具体方法，需要引用原始工作
+
+【What to cite】（如果需要引用）
+- Foundational works on transformers
+- Recent methods for efficient attention
+
+【Search keywords】（如果需要引用）
+- "transformer architecture"
+- "efficient attention"
+"""
+
+JSON_RESPONSE = """{
+  "needs_citation": "Yes",
+  "reason": "提到了具体方法，需要引用原始工作",
+  "intent": "method_technique",
+  "citation_types": ["Foundational works on transformers"],
+  "keywords": ["transformer architecture", "efficient attention"]
+}"""
+
+
+class StreamingClient(LLMClient):
+    """把预设响应切成小段逐段产出的假 LLM 客户端"""
+
+    model = "streaming"
+
+    def __init__(self, response: str, chunk_size: int = 7):
+        self.response = response
+        self.chunk_size = chunk_size
+        self.sent = 0
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        return self.response
+
+    def stream(self, prompt: str, **kwargs):
+        for i in range(0, len(self.response), self.chunk_size):
+            self.sent = i + self.chunk_size
+            yield self.response[i:i + self.chunk_size]
+
+
+def test_parser_emits_sections_incrementally():
+    """测试逐字输入时各分段按顺序尽早发出"""
+    parser = SectionStreamParser()
+    events = []
+    verdict_at = None
+    for i, ch in enumerate(RESPONSE):
+        new = parser.feed(ch)
+        if verdict_at is None and any(kind == "needs_citation" for kind, _ in new):
+            verdict_at = i
+        events.extend(new)
+    events.extend(parser.close())
+
+    assert verdict_at is not None and verdict_at < RESPONSE.index("【Why】")
+    assert [kind for kind, _ in events] == [
+        "needs_citation", "reason", "citation_type", "citation_type", "keyword", "keyword"
+    ]
+    assert parser.result["keywords"] == ["transformer architecture", "efficient attention"]
+    assert parser.result["reason"] == "提到了具体方法，需要引用原始工作"
+
+
+def test_parser_handles_missing_trailing_newline():
+    """测试最后一行没有换行符时 close() 仍能发出"""
+    parser = SectionStreamParser()
+    parser.feed('【Do I need a citation?】\nNo\n\n【Why】\n- 常识性陈述')
+    assert parser.close() == [("reason", "常识性陈述")]
+    assert parser.result["needs_citation"] == "No"
+
+
+def test_stream_analysis_verdict_first():
+    """测试流式分析先给出判断，最终结果与完整解析一致并写入缓存"""
+    client = StreamingClient(RESPONSE)
+    unified = UnifiedLLMClient(client)
+
+    partials = []
+    verdict_sent = None
+    for partial in unified.stream_analysis("The transformer was introduced in 2017."):
+        if verdict_sent is None and partial["needs_citation"]:
+            verdict_sent = client.sent
+        partials.append(partial)
+
+    assert verdict_sent < len(RESPONSE) // 4
+    final = partials[-1]
+    assert final["done"] is True
+    assert final["needs_citation"] == "Yes"
+    assert final["citation_types"] == ["Foundational works on transformers",
+                                       "Recent methods for efficient attention"]
+    assert all(not p["done"] for p in partials[:-1])
+    assert unified.latency_stats()["first_token_ms"] is not None
+
+    cached = list(unified.stream_analysis("The transformer was introduced in 2017."))
+    assert len(cached) == 1 and cached[0]["keywords"] == final["keywords"]
+
+
+def test_stream_analysis_unformatted_response():
+    """测试模型未按分段格式输出时退回完整解析"""
+    unified = UnifiedLLMClient(StreamingClient("No, this is common knowledge."))
+    final = list(unified.stream_analysis("Water is wet."))[-1]
+
+    assert final["done"] is True
+    assert final["needs_citation"] == "No"
+
+
+def test_json_parser_emits_fields_as_they_complete():
+    """测试 JSON 字段逐个完成时发出，未写完的值不发出"""
+    parser = JSONFieldStreamParser()
+    events = []
+    verdict_at = None
+    for i, ch in enumerate(JSON_RESPONSE):
+        new = parser.feed(ch)
+        if verdict_at is None and new:
+            verdict_at = i
+        events.extend(new)
+
+    assert verdict_at < JSON_RESPONSE.index('"reason"')
+    assert [key for key, _ in events] == ["needs_citation", "reason", "intent", "citation_types", "keywords"]
+    assert parser.fields["keywords"] == ["transformer architecture", "efficient attention"]
+    assert JSONFieldStreamParser().feed('{"confidence": 0.9') == []
+
+
+def test_stream_structured_verdict_first_and_shares_cache():
+    """测试结构化流式分析先给出判断，结果与 analyze_structured 相同并共用缓存"""
+    client = StreamingClient(JSON_RESPONSE)
+    unified = UnifiedLLMClient(client)
+
+    partials = []
+    verdict_sent = None
+    for partial in unified.stream_structured("The transformer was introduced in 2017."):
+        if verdict_sent is None and partial["needs_citation"]:
+            verdict_sent = client.sent
+        partials.append(partial)
+
+    assert verdict_sent < len(JSON_RESPONSE) // 4
+    final = partials[-1]
+    assert final["done"] is True and all(not p["done"] for p in partials[:-1])
+    assert final["intent"] == "method_technique"
+    assert final["keywords"] == ["transformer architecture", "efficient attention"]
+    assert unified.analyze_structured("The transformer was introduced in 2017.") == {
+        k: v for k, v in final.items() if k != "done"}
+
+
+def test_stream_structured_repairs_invalid_json():
+    """测试输出不是合法 JSON 时修复一次"""
+    client = StreamingClient("Yes, it needs a citation.")
+    client.complete = lambda prompt, **kwargs: JSON_RESPONSE
+    final = list(UnifiedLLMClient(client).stream_structured("Transformers are effective."))[-1]
+    assert final["done"] is True and final["needs_citation"] == "Yes"
+    assert final["citation_types"] == ["Foundational works on transformers"]
+
+
+def test_render_partial_shows_progress():
+    """测试部分结果渲染"""
+    content = render_partial({"needs_citation": "Yes", "reason": None,
+                              "citation_types": [], "keywords": [], "done": False})
+    assert "✔️ Yes" in content
+    assert "正在生成" in content
@@ -0,0 +1,115 @@
+"""
+测试分阶段追踪
+"""
+
+import json
+
+import pytest
+
+from whatshouldicite import CitationAgent, tracing
+from whatshouldicite.llm_client import LLMClient, UnifiedLLMClient
+
+
+GOOD_JSON = ('{"needs_citation": "Yes", "reason": "提到了具体方法", "intent": "method_technique", '
+             '"citation_types": ["Foundational works"], "keywords": ["transformer"]}')
+
+
+class FixedClient(LLMClient):
+    """总是返回同一响应的假 LLM 客户端"""
+
+    model = "fixed"
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        return GOOD_JSON
+
+    def stream(self, prompt: str, **kwargs):
+        yield "【Do I need a citation?】\nYes\n"
+        yield "【Why】\n- 方法\n"
+
+
+@pytest.fixture
+def ring():
+    exporter = tracing.RingBufferExporter()
+    tracing.enable(exporter)
+    yield exporter
+    tracing.disable()
+
+
+def test_disabled_is_noop():
+    """测试未开启时返回共享的空操作 span"""
+    assert not tracing.enabled()
+    assert tracing.span("x", a=1) is tracing.NOOP_SPAN
+    assert tracing.current_span() is tracing.NOOP_SPAN
+    with tracing.span("x") as span:
+        span.set("k", "v")
+
+
+def test_rule_pipeline_stages(ring):
+    """测试规则模式下各阶段 span 挂在 agent.analyze 之下"""
+    CitationAgent().analyze("Our method outperforms previous approaches by 5% on ImageNet.")
+
+    root = ring.spans("agent.analyze")[0]
+    assert root.attributes["mode"] == "rule"
+    children = {s.name: s for s in ring.spans() if s.parent_id == root.span_id}
+    assert {"analyzer.build_context", "intent.classify", "planner.plan",
+            "keywords.generate", "agent.format"} <= set(children)
+    assert children["intent.classify"].attributes["intent"]
+    assert all(s.trace_id == root.trace_id and s.duration_ns >= 0 for s in children.values())
+
+
+def test_llm_call_attributes_and_cache_hit(ring):
+    """测试 LLM 调用记录模型和 token 估算，缓存命中记录在所属阶段"""
+    agent = CitationAgent(llm_client=UnifiedLLMClient(FixedClient()), single_call=True)
+    agent.analyze("The transformer was introduced in 2017.")
+    agent.analyze("The transformer was introduced in 2017.")
+
+    call = ring.spans("llm.call")[0]
+    assert call.attributes["model"] == "fixed"
+    assert call.attributes["prompt_tokens_est"] > 0
+    assert call.attributes["completion_tokens_est"] > 0
+    assert len(ring.spans("llm.call")) == 1
+    assert [s.attributes["cache_hit"] for s in ring.spans("llm.analyze_structured")] == [False, True]
+    assert len(ring.spans("llm.parse")) == 1
+
+
+def test_stream_span_and_error(ring):
+    """测试流式调用记录首个 token 延迟，异常记录在 span 上"""
+    client = UnifiedLLMClient(FixedClient(), use_cache=False)
+    list(client.stream_analysis("text"))
+    stream_span = ring.spans("llm.stream")[0]
+    assert stream_span.attributes["first_token_ms"] is not None
+    assert stream_span.parent_id is None
+
+    with pytest.raises(ValueError):
+        with tracing.span("failing"):
+            raise ValueError("boom")
+    assert ring.spans("failing")[0].error == "ValueError: boom"
+
+
+def test_jsonl_exporter(tmp_path):
+    """测试 JSONL 导出"""
+    path = tmp_path / "trace.jsonl"
+    tracing.enable(tracing.JSONLExporter(str(path)))
+    try:
+        with tracing.span("outer", mode="rule"):
+            with tracing.span("inner"):
+                pass
+    finally:
+        tracing.disable()
+
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["name"] for line in lines] == ["inner", "outer"]
+    assert lines[0]["parent_id"] == lines[1]["span_id"]
+    assert lines[1]["attributes"] == {"mode": "rule"}
+
+
+def test_enable_from_env(monkeypatch):
+    """测试通过环境变量开启"""
+    monkeypatch.delenv("WHATSHOULDICITE_TRACE", raising=False)
+    assert tracing.enable_from_env() is None
+    monkeypatch.setenv("WHATSHOULDICITE_TRACE", "ring:8")
+    try:
+        assert isinstance(tracing.enable_from_env(), tracing.RingBufferExporter)
+        assert tracing.enabled()
+    finally:
+        tracing.disable()
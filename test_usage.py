@@ -0,0 +1,148 @@
+"""
+测试 LLM 用量账本
+"""
+
+import json
+import random
+
+import pytest
+
+from whatshouldicite import usage
+from whatshouldicite.cache import DiskCache
+from whatshouldicite.llm_client import CachedLLMClient, LLMClient, RetryableLLMError, UnifiedLLMClient
+from whatshouldicite.resilience import ResilientLLMClient, RetryPolicy
+
+
+GOOD_JSON = ('{"needs_citation": "Yes", "reason": "方法", "intent": "method_technique", '
+             '"citation_types": ["Foundational works"], "keywords": ["transformer"]}')
+
+
+class MeteredClient(LLMClient):
+    """像 SDK 一样上报 usage 的假 LLM 客户端，可按脚本先失败"""
+
+    model = "gpt-4o-mini-2024-07-18"
+
+    def __init__(self, *failures):
+        self.failures = list(failures)
+
+    def complete(self, prompt: str, **kwargs) -> str:
+        if self.failures:
+            raise self.failures.pop(0)
+        usage.report_tokens("openai", self.model, 1000, 200)
+        return GOOD_JSON
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = usage.enable(usage.UsageLedger(str(tmp_path / "usage.jsonl")))
+    yield ledger
+    usage.disable()
+
+
+def test_histogram_relative_error():
+    """测试对数-线性直方图的百分位误差在 1% 以内"""
+    rng = random.Random(0)
+    values = sorted(rng.randint(1, 5_000_000) for _ in range(20000))
+    histogram = usage.Histogram()
+    for value in values:
+        histogram.record(value)
+    for p in (50, 95, 99):
+        exact = values[int(len(values) * p / 100) - 1]
+        assert abs(histogram.percentile(p) - exact) / exact < 0.01
+    assert histogram.percentile(100) == values[-1]
+    assert len(histogram.counts) < 2000
+
+
+def test_rolling_histogram_expires_old_slots():
+    """测试滚动窗口丢弃过期数据"""
+    rolling = usage.RollingHistogram(window=120, interval=60)
+    rolling.record(1000, now=0)
+    rolling.record(10, now=100)
+    assert rolling.snapshot(now=100).count == 2
+    assert rolling.snapshot(now=200).count == 1
+    assert rolling.snapshot(now=200).max == 10
+
+
+def test_price_table(tmp_path):
+    """测试最长前缀匹配和价格文件覆盖"""
+    prices = usage.PriceTable()
+    assert prices.lookup("gpt-4o-mini-2024-07-18") == usage.DEFAULT_PRICES["gpt-4o-mini"]
+    assert prices.cost("gpt-4o-mini", 1_000_000, 0) == pytest.approx(0.15)
+    assert prices.cost("unknown-model", 10, 10) is None
+
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps({"local-model": {"input": 1, "output": 2}}), encoding="utf-8")
+    loaded = usage.PriceTable.load(str(path))
+    assert loaded.cost("local-model-v2", 1_000_000, 1_000_000) == pytest.approx(3.0)
+    assert loaded.lookup("gpt-4o") == usage.DEFAULT_PRICES["gpt-4o"]
+
+
+def test_calls_recorded_with_tokens_cost_and_labels(ledger):
+    """测试每次调用记录 token、费用、模板、模式和重试次数"""
+    resilient = ResilientLLMClient(MeteredClient(RetryableLLMError("503")),
+                                   retry=RetryPolicy(rng=lambda: 0.0), sleep=lambda _: None)
+    client = UnifiedLLMClient(resilient, use_cache=False)
+    with usage.labels(mode="llm"):
+        client.analyze_structured("The transformer was introduced in 2017.")
+
+    record = next(ledger.records())
+    assert record["mode"] == "llm"
+    assert record["template"] == "analyze_structured"
+    assert (record["provider"], record["model"]) == ("openai", "gpt-4o-mini-2024-07-18")
+    assert (record["prompt_tokens"], record["completion_tokens"]) == (1000, 200)
+    assert record["retries"] == 1
+    assert not record["estimated"]
+    assert record["cost_usd"] == pytest.approx((1000 * 0.15 + 200 * 0.60) / 1e6)
+    assert ledger.snapshot()["openai/gpt-4o-mini-2024-07-18"]["calls"] == 1
+
+
+def test_unreported_usage_is_estimated_and_cache_hits_are_free(ledger, tmp_path):
+    """测试提供方未上报时估算 token，磁盘缓存命中不计费"""
+
+    class SilentClient(LLMClient):
+        model = "silent"
+
+        def complete(self, prompt: str, **kwargs) -> str:
+            return GOOD_JSON
+
+    cached = CachedLLMClient(SilentClient(), DiskCache(str(tmp_path / "cache.sqlite3")))
+    client = UnifiedLLMClient(cached, use_cache=False)
+    client.classify_intent("text")
+    client.classify_intent("text")
+
+    first, second = list(ledger.records())
+    assert first["estimated"] and first["prompt_tokens"] > 0 and not first["cached"]
+    assert second["cached"] and second["prompt_tokens"] == 0 and second["cost_usd"] is None
+
+
+def test_disabled_ledger_records_nothing(tmp_path):
+    """测试未开启账本时不记录"""
+    assert usage.current_ledger() is None
+    UnifiedLLMClient(MeteredClient(), use_cache=False).analyze_structured("text")
+
+
+def test_stats_aggregates(ledger, capsys):
+    """测试 stats 命令按模式和模板汇总，并统计混合模式升级率"""
+    client = UnifiedLLMClient(MeteredClient(), use_cache=False)
+    with usage.labels(mode="hybrid"):
+        client.analyze_structured("a")
+        ledger.record_event("hybrid", source="llm")
+        ledger.record_event("hybrid", source="rule")
+        ledger.record_event("hybrid", source="rule")
+    with usage.labels(mode="llm"):
+        client.classify_intent("b")
+        client.plan_citation_types("b", "method_technique")
+
+    records = list(ledger.records())
+    by_mode = {row["mode"]: row for row in usage.aggregate(records, "mode")}
+    assert by_mode["llm"]["calls"] == 2 and by_mode["hybrid"]["calls"] == 1
+    assert by_mode["llm"]["prompt_tokens"] == 2000
+    assert {row["template"] for row in usage.aggregate(records, "template")} == {
+        "analyze_structured", "classify_intent", "plan_citation_types"
+    }
+    assert usage.hybrid_escalation(records) == {"decisions": 3, "escalated": 1, "rate": 0.3333}
+
+    usage.main(["stats", "--ledger", ledger.path, "--json"])
+    report = json.loads(capsys.readouterr().out)
+    assert report["hybrid"]["escalated"] == 1
+    assert {row["mode"] for row in report["mode"]} == {"llm", "hybrid"}
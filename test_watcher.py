@@ -0,0 +1,99 @@
+"""
+测试监视模式的增量分析
+"""
+
+import threading
+
+from whatshouldicite import CitationAgent
+from whatshouldicite.watcher import IncrementalScanner, SentenceResultCache, DocumentWatcher
+
+
+class CountingAgent(CitationAgent):
+    """记录实际分析次数的 Agent"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def analyze_structured(self, selected_text):
+        self.calls += 1
+        return super().analyze_structured(selected_text)
+
+
+def test_only_changed_sentences_reanalyzed(tmp_path):
+    """测试只重新分析改动过的句子"""
+    doc = tmp_path / "paper.md"
+    doc.write_text("Deep learning works well. Our method beats baselines.\n"
+                   "Recent surveys cover this.\n", encoding="utf-8")
+    agent = CountingAgent()
+    scanner = IncrementalScanner(agent)
+
+    first = scanner.scan(str(doc))
+    assert first["stats"]["analyzed"] == 3
+    assert agent.calls == 3
+
+    doc.write_text("Deep learning works well. Our method clearly beats baselines.\n"
+                   "Recent surveys cover this.\n", encoding="utf-8")
+    second = scanner.scan(str(doc))
+    assert second["stats"]["analyzed"] == 1
+    assert second["stats"]["reused"] == 2
+    assert agent.calls == 4
+    assert [v["cached"] for v in second["verdicts"]] == [True, False, True]
+    assert second["verdicts"][2]["line"] == 2
+
+
+def test_adding_or_removing_citation_is_not_reused(tmp_path):
+    """测试增删引用标记后重新判断（遮蔽后文本相同，不能复用旧结果）"""
+    doc = tmp_path / "paper.tex"
+    scanner = IncrementalScanner(CountingAgent())
+    claim = "Our method outperforms prior work"
+
+    doc.write_text(f"{claim} \\cite{{x}}.\n", encoding="utf-8")
+    cited = scanner.scan(str(doc))["verdicts"][0]
+    assert cited["already_cited"] and cited["intent"] == "already_cited"
+
+    doc.write_text(f"{claim}.\n", encoding="utf-8")
+    uncited = scanner.scan(str(doc))["verdicts"][0]
+    assert not uncited["cached"] and not uncited["already_cited"]
+    assert uncited["needs_citation"] == "Yes"
+
+    doc.write_text(f"{claim} \\cite{{x}}.\n", encoding="utf-8")
+    assert scanner.scan(str(doc))["verdicts"][0]["already_cited"]
+
+
+def test_cache_persists(tmp_path):
+    """测试结果缓存持久化到磁盘"""
+    doc = tmp_path / "paper.txt"
+    doc.write_text("Our method beats baselines.\n", encoding="utf-8")
+    cache_path = str(tmp_path / "cache.json")
+
+    IncrementalScanner(CountingAgent(), SentenceResultCache(cache_path)).scan(str(doc))
+    agent = CountingAgent()
+    update = IncrementalScanner(agent, SentenceResultCache(cache_path)).scan(str(doc))
+
+    assert agent.calls == 0
+    assert update["verdicts"][0]["needs_citation"] == "Yes"
+
+
+def test_watcher_rescans_on_save(tmp_path):
+    """测试保存文件后触发重新扫描"""
+    doc = tmp_path / "paper.txt"
+    doc.write_text("Our method beats baselines.\n", encoding="utf-8")
+    updates = []
+    changed = threading.Event()
+
+    def on_update(update):
+        updates.append(update)
+        if len(updates) > 1:
+            changed.set()
+
+    watcher = DocumentWatcher(str(doc), on_update, debounce=0.05)
+    watcher.start()
+    try:
+        doc.write_text("Our method beats baselines. Recent work agrees.\n", encoding="utf-8")
+        assert changed.wait(5)
+    finally:
+        watcher.stop()
+
+    assert updates[-1]["stats"]["sentences"] == 2
+    assert updates[-1]["stats"]["analyzed"] == 1
@@ -0,0 +1,287 @@
+"""
+分阶段追踪 - 记录流水线各阶段（分析、意图分类、规划、关键词、LLM 调用、解析、格式化）的耗时
+
+默认关闭：未注册导出器时 span() 返回同一个空操作对象，开销只有一次全局变量检查。
+
+用法：
+    from whatshouldicite import tracing
+
+    ring = tracing.RingBufferExporter()
+    tracing.enable(ring)
+    agent.analyze(text)
+    for span in ring.spans():
+        print(span.name, span.duration_ms)
+
+也可以通过环境变量开启：
+    WHATSHOULDICITE_TRACE=ring | jsonl:/path/to/trace.jsonl | otel
+"""
+
+import contextvars
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from .utils import user_data_dir
+
+
+class Span:
+    """一个阶段的计时记录"""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_time_ns",
+                 "_start_ns", "duration_ns", "attributes", "error", "_token")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else self.span_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.duration_ns: Optional[int] = None
+        self._token = None
+        # 墙钟时间只用于导出时对齐，耗时一律用单调时钟
+        self.start_time_ns = time.time_ns()
+        self._start_ns = time.perf_counter_ns()
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return self.duration_ns / 1e6 if self.duration_ns is not None else None
+
+    def set(self, key: str, value: Any):
+        """设置属性（如 mode、model、token 数、cache_hit）"""
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        """结束计时并导出（重复调用无效）"""
+        if self.duration_ns is not None:
+            return
+        self.duration_ns = time.perf_counter_ns() - self._start_ns
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        _export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_time_ns,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ns is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.end(exc)
+        return False
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空操作 span"""
+
+    __slots__ = ()
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def end(self, error: Optional[BaseException] = None):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_ids = itertools.count(1)
+_current: contextvars.ContextVar = contextvars.ContextVar("whatshouldicite_span", default=None)
+_exporters: tuple = ()
+_lock = threading.Lock()
+
+
+def span(name: str, **attributes: Any):
+    """
+    创建一个阶段 span（上下文管理器），父 span 为当前活动的 span
+
+    追踪关闭时返回 NOOP_SPAN。不用 with 时不会成为活动 span，需要手动调用 end()
+    （用于生成器等跨越 yield 的阶段，避免把活动 span 泄漏给调用方）。
+    注意：活动 span 保存在 contextvars 中，线程池中的任务不会继承父 span。
+    """
+    if not _exporters:
+        return NOOP_SPAN
+    new = Span(name, _current.get(), attributes)
+    for exporter in _exporters:
+        try:
+            exporter.on_start(new)
+        except Exception:
+            pass
+    return new
+
+
+def current_span():
+    """当前活动的 span（追踪关闭或没有活动 span 时返回 NOOP_SPAN）"""
+    if not _exporters:
+        return NOOP_SPAN
+    return _current.get() or NOOP_SPAN
+
+
+def enabled() -> bool:
+    return bool(_exporters)
+
+
+def enable(*exporters: "SpanExporter"):
+    """注册导出器并开启追踪（可多次调用追加）"""
+    global _exporters
+    with _lock:
+        _exporters = _exporters + tuple(exporters)
+
+
+def disable():
+    """关闭追踪并关闭所有导出器"""
+    global _exporters
+    with _lock:
+        exporters, _exporters = _exporters, ()
+    for exporter in exporters:
+        exporter.close()
+
+
+def _export(finished: Span):
+    for exporter in _exporters:
+        try:
+            exporter.export(finished)
+        except Exception:
+            # 追踪失败不能影响分析结果
+            pass
+
+
+class SpanExporter:
+    """导出器基类"""
+
+    def on_start(self, span: Span):
+        """span 开始时调用（默认不处理）"""
+
+    def export(self, span: Span):
+        """span 结束时调用"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class RingBufferExporter(SpanExporter):
+    """进程内环形缓冲区，保留最近 capacity 个 span"""
+
+    def __init__(self, capacity: int = 1024):
+        self._spans: deque = deque(maxlen=capacity)
+
+    def export(self, span: Span):
+        self._spans.append(span)
+
+    def spans(self, name: Optional[str] = None) -> List[Span]:
+        """已结束的 span（按结束顺序），可按名称过滤"""
+        spans = list(self._spans)
+        if name is not None:
+            spans = [s for s in spans if s.name == name]
+        return spans
+
+    def clear(self):
+        self._spans.clear()
+
+
+class JSONLExporter(SpanExporter):
+    """每个 span 一行 JSON，追加写入文件"""
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        import json
+
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """
+    转发到 OpenTelemetry（需要 pip install opentelemetry-api，
+    以及配置好 TracerProvider 和 exporter 的 opentelemetry-sdk）
+    """
+
+    def __init__(self, tracer_name: str = "whatshouldicite"):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError(
+                "OpenTelemetry 未安装。请运行: pip install opentelemetry-api opentelemetry-sdk"
+            )
+        self._trace = trace
+        self._tracer = trace.get_tracer(tracer_name)
+        self._live: Dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span):
+        with self._lock:
+            parent = self._live.get(span.parent_id)
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=span.start_time_ns)
+        with self._lock:
+            self._live[span.span_id] = otel_span
+
+    def export(self, span: Span):
+        with self._lock:
+            otel_span = self._live.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        for key, value in span.attributes.items():
+            if value is not None:
+                otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+        if span.error:
+            from opentelemetry.trace import Status, StatusCode
+            otel_span.set_status(Status(StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.start_time_ns + span.duration_ns)
+
+
+def enable_from_env(variable: str = "WHATSHOULDICITE_TRACE") -> Optional[SpanExporter]:
+    """
+    按环境变量开启追踪：ring、jsonl:<路径> 或 otel
+
+    Returns:
+        创建的导出器，未设置时返回 None
+    """
+    spec = os.getenv(variable, "").strip()
+    if not spec:
+        return None
+    kind, _, arg = spec.partition(":")
+    if kind == "ring":
+        exporter: SpanExporter = RingBufferExporter(int(arg) if arg else 1024)
+    elif kind == "jsonl":
+        exporter = JSONLExporter(arg or os.path.join(user_data_dir(), "trace.jsonl"))
+    elif kind == "otel":
+        exporter = OpenTelemetryExporter()
+    else:
+        raise ValueError(f"未知的追踪导出器: {spec}")
+    enable(exporter)
+    return exporter
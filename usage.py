@@ -0,0 +1,570 @@
+"""
+LLM 用量账本 - 记录每次调用的 token 数、延迟、重试次数、模型和估算费用
+
+- 提供方客户端（OpenAIClient / AnthropicClient）上报响应中的 usage
+- ResilientLLMClient 上报重试和对冲次数，CachedLLMClient 上报磁盘缓存命中
+- UnifiedLLMClient 在每次调用结束后汇总为一条记录：写入滚动直方图和持久化账本（JSONL）
+
+用法：
+    python -m whatshouldicite.usage stats              # 按模式、提示词模板汇总
+    python -m whatshouldicite.usage stats --since 7d --by model
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .utils import user_data_dir
+
+
+# 每百万 token 的价格（美元）：(输入, 输出)。按模型名前缀匹配，最长前缀优先
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "claude-3-haiku": (0.25, 1.25),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-sonnet": (3.00, 15.00),
+    "claude-3-opus": (15.00, 75.00),
+}
+
+
+class PriceTable:
+    """模型价格表（可用 JSON 文件覆盖：{"模型前缀": [输入价, 输出价]}，单位为美元 / 百万 token）"""
+
+    def __init__(self, prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.prices = dict(DEFAULT_PRICES if prices is None else prices)
+
+    @classmethod
+    def load(cls, path: str) -> "PriceTable":
+        """从 JSON 文件读取，并覆盖默认价格中的同名条目"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        table = cls()
+        for model, price in data.items():
+            if isinstance(price, dict):
+                price = (price["input"], price["output"])
+            table.prices[model] = (float(price[0]), float(price[1]))
+        return table
+
+    def lookup(self, model: Optional[str]) -> Optional[Tuple[float, float]]:
+        if not model:
+            return None
+        matches = [prefix for prefix in self.prices if model.startswith(prefix)]
+        return self.prices[max(matches, key=len)] if matches else None
+
+    def cost(self, model: Optional[str], prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        """估算费用（美元），未知模型返回 None"""
+        price = self.lookup(model)
+        if price is None:
+            return None
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+class Histogram:
+    """
+    HDR 风格的对数-线性直方图
+
+    小于 2^bits 的值逐个计数；更大的值按二进制数量级分段，每段再线性细分为
+    2^(bits-1) 个桶，相对误差不超过 2^-(bits-1)（bits=8 时小于 1%）。
+    只保存非空桶，合并直方图就是桶计数相加。
+    """
+
+    def __init__(self, bits: int = 8):
+        self.bits = bits
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value: int) -> int:
+        size = 1 << self.bits
+        if value < size:
+            return value
+        shift = value.bit_length() - self.bits
+        half = size >> 1
+        return size + (shift - 1) * half + ((value >> shift) - half)
+
+    def _value(self, index: int) -> int:
+        """桶内的代表值（桶的中点）"""
+        size = 1 << self.bits
+        if index < size:
+            return index
+        half = size >> 1
+        shift, offset = divmod(index - size, half)
+        shift += 1
+        low = (half + offset) << shift
+        return low + ((1 << shift) >> 1)
+
+    def record(self, value: float, count: int = 1):
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> Optional[int]:
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * p // 100))
+        if target >= self.count:
+            return self.max
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class RollingHistogram:
+    """最近 window 秒的直方图（按 interval 秒分槽，过期的槽整体丢弃）"""
+
+    def __init__(self, window: float = 3600.0, interval: float = 60.0, bits: int = 8):
+        self.window = window
+        self.interval = interval
+        self.bits = bits
+        self._slots: deque = deque()
+
+    def record(self, value: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        slot = now - now % self.interval
+        if not self._slots or self._slots[-1][0] != slot:
+            self._slots.append((slot, Histogram(self.bits)))
+        self._slots[-1][1].record(value)
+        self._expire(now)
+
+    def _expire(self, now: float):
+        while self._slots and self._slots[0][0] + self.interval <= now - self.window:
+            self._slots.popleft()
+
+    def snapshot(self, now: Optional[float] = None) -> Histogram:
+        """窗口内的合并直方图"""
+        self._expire(time.time() if now is None else now)
+        merged = Histogram(self.bits)
+        for _, histogram in self._slots:
+            merged.merge(histogram)
+        return merged
+
+
+class CallUsage:
+    """一次逻辑调用（含重试和对冲请求）收集到的用量"""
+
+    __slots__ = ("provider", "model", "prompt_tokens", "completion_tokens",
+                 "retries", "hedges", "cached")
+
+    def __init__(self):
+        self.provider: Optional[str] = None
+        self.model: Optional[str] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.retries = 0
+        self.hedges = 0
+        self.cached = False
+
+
+_current_call: contextvars.ContextVar = contextvars.ContextVar("whatshouldicite_usage", default=None)
+_labels: contextvars.ContextVar = contextvars.ContextVar("whatshouldicite_usage_labels", default=None)
+_ledger: Optional["UsageLedger"] = None
+_report_lock = threading.Lock()
+
+
+def report_tokens(provider: str, model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    """提供方客户端上报一次响应的 usage（对冲请求各自上报，费用累加）"""
+    call = _current_call.get()
+    if call is None:
+        return
+    with _report_lock:
+        call.provider = provider
+        call.model = model
+        if prompt_tokens is not None:
+            call.prompt_tokens = (call.prompt_tokens or 0) + prompt_tokens
+        if completion_tokens is not None:
+            call.completion_tokens = (call.completion_tokens or 0) + completion_tokens
+
+
+def report_sdk_usage(provider: str, model: str, sdk_usage: Any):
+    """
+    从 SDK 响应的 usage 对象上报
+
+    兼容 OpenAI（prompt_tokens / completion_tokens）和 Anthropic（input_tokens / output_tokens）。
+    """
+    if sdk_usage is None or _current_call.get() is None:
+        return
+    prompt_tokens = getattr(sdk_usage, "prompt_tokens", None)
+    if prompt_tokens is None:
+        prompt_tokens = getattr(sdk_usage, "input_tokens", None)
+    completion_tokens = getattr(sdk_usage, "completion_tokens", None)
+    if completion_tokens is None:
+        completion_tokens = getattr(sdk_usage, "output_tokens", None)
+    report_tokens(provider, model, prompt_tokens, completion_tokens)
+
+
+def report_retry():
+    call = _current_call.get()
+    if call is not None:
+        call.retries += 1
+
+
+def report_hedge():
+    call = _current_call.get()
+    if call is not None:
+        call.hedges += 1
+
+
+def report_cache_hit():
+    call = _current_call.get()
+    if call is not None:
+        call.cached = True
+
+
+class labels:
+    """
+    为范围内的 LLM 调用附加标签（如 mode），可嵌套
+
+        with usage.labels(mode="llm"):
+            agent.analyze(text)
+    """
+
+    def __init__(self, **values: Any):
+        self.values = values
+        self._token = None
+
+    def __enter__(self):
+        self._token = _labels.set(dict(_labels.get() or {}, **self.values))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _labels.reset(self._token)
+        return False
+
+
+def enable(ledger: "UsageLedger") -> "UsageLedger":
+    """设置全局账本，之后所有 UnifiedLLMClient 调用都会记录"""
+    global _ledger
+    _ledger = ledger
+    return ledger
+
+
+def disable():
+    global _ledger
+    ledger, _ledger = _ledger, None
+    if ledger is not None:
+        ledger.close()
+
+
+def current_ledger() -> Optional["UsageLedger"]:
+    return _ledger
+
+
+class track:
+    """
+    记录一次逻辑 LLM 调用（UnifiedLLMClient 内部使用）
+
+    未设置账本时什么都不做。范围内的提供方、重试、缓存上报都汇总到这一次调用上；
+    结束时计算延迟，提供方没有上报 usage 时按字符数估算 token。
+    """
+
+    __slots__ = ("ledger", "template", "prompt", "call", "response_chars", "cancelled", "_start", "_token")
+
+    def __init__(self, template: Optional[str], prompt: str, model: Optional[str] = None):
+        self.ledger = _ledger
+        self.template = template
+        self.prompt = prompt
+        self.call = CallUsage()
+        self.call.model = model
+        self.response_chars = 0
+        self.cancelled = False
+        self._token = None
+
+    def __enter__(self) -> "track":
+        if self.ledger is not None:
+            self._token = _current_call.set(self.call)
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.ledger is None:
+            return False
+        latency = time.perf_counter() - self._start
+        try:
+            _current_call.reset(self._token)
+        except ValueError:
+            # 生成器在其他上下文中被关闭
+            pass
+        if exc_type is GeneratorExit:
+            self.cancelled = True
+            exc = None
+        self.ledger.record_call(self, latency, exc)
+        return False
+
+
+def _ms(microseconds: Optional[int]) -> Optional[float]:
+    return round(microseconds / 1000, 1) if microseconds is not None else None
+
+
+def _estimate(chars: int) -> int:
+    return chars // 4 + 1
+
+
+class UsageLedger:
+    """
+    用量账本
+
+    - 内存中按 provider/model 维护延迟（微秒）、token 的滚动直方图（最近 window 秒）
+    - 每条调用记录追加写入 JSONL 文件，stats 命令从文件汇总
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        prices: Optional[PriceTable] = None,
+        persist: bool = True,
+        window: float = 3600.0
+    ):
+        """
+        Args:
+            path: 账本文件路径（默认位于用户数据目录下的 usage.jsonl）
+            prices: 价格表（默认 DEFAULT_PRICES，可用 WHATSHOULDICITE_PRICES 指定 JSON 文件）
+            persist: 是否写入账本文件
+            window: 滚动直方图的时间窗口（秒）
+        """
+        self.path = path or os.path.join(user_data_dir(), "usage.jsonl")
+        if prices is None:
+            price_file = os.getenv("WHATSHOULDICITE_PRICES")
+            prices = PriceTable.load(price_file) if price_file else PriceTable()
+        self.prices = prices
+        self.persist = persist
+        self.window = window
+        self._lock = threading.Lock()
+        self._file = None
+        self.latency_us: Dict[str, RollingHistogram] = {}
+        self.tokens: Dict[str, RollingHistogram] = {}
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def _write(self, record: Dict[str, Any]):
+        if not self.persist:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def record_call(self, tracked: track, latency: float, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """汇总一次调用并写入直方图和账本"""
+        call = tracked.call
+        estimated = call.prompt_tokens is None or call.completion_tokens is None
+        if call.cached:
+            prompt_tokens = completion_tokens = 0
+            estimated = False
+        else:
+            prompt_tokens = call.prompt_tokens if call.prompt_tokens is not None else _estimate(len(tracked.prompt))
+            completion_tokens = (call.completion_tokens if call.completion_tokens is not None
+                                 else _estimate(tracked.response_chars) if tracked.response_chars else 0)
+        cost = self.prices.cost(call.model, prompt_tokens, completion_tokens)
+        record = dict(_labels.get() or {})
+        record.update({
+            "ts": round(time.time(), 3),
+            "kind": "llm",
+            "provider": call.provider,
+            "model": call.model,
+            "template": tracked.template,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "estimated": estimated,
+            "latency_ms": round(latency * 1000, 1),
+            "retries": call.retries,
+            "hedges": call.hedges,
+            "cached": call.cached,
+            "cancelled": tracked.cancelled,
+            "cost_usd": round(cost, 8) if cost is not None else None,
+            "error": f"{type(error).__name__}: {error}" if error is not None else None,
+        })
+        key = f"{call.provider or '-'}/{call.model or '-'}"
+        with self._lock:
+            if key not in self.latency_us:
+                self.latency_us[key] = RollingHistogram(self.window)
+                self.tokens[key] = RollingHistogram(self.window)
+                self.totals[key] = {"calls": 0, "cost_usd": 0.0}
+            self.latency_us[key].record(latency * 1e6)
+            self.tokens[key].record(prompt_tokens + completion_tokens)
+            self.totals[key]["calls"] += 1
+            self.totals[key]["cost_usd"] += cost or 0.0
+        self._write(record)
+        return record
+
+    def record_event(self, kind: str, **fields: Any) -> Dict[str, Any]:
+        """记录非调用事件（如混合模式的取舍：kind="hybrid", source="rule"/"llm"）"""
+        record = dict(_labels.get() or {})
+        record.update({"ts": round(time.time(), 3), "kind": kind})
+        record.update(fields)
+        self._write(record)
+        return record
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """内存中各 provider/model 最近窗口内的延迟和 token 分布"""
+        result = {}
+        with self._lock:
+            for key, rolling in self.latency_us.items():
+                latency = rolling.snapshot()
+                tokens = self.tokens[key].snapshot()
+                result[key] = {
+                    "calls": int(self.totals[key]["calls"]),
+                    "cost_usd": round(self.totals[key]["cost_usd"], 6),
+                    "window_calls": latency.count,
+                    "p50_ms": _ms(latency.percentile(50)),
+                    "p95_ms": _ms(latency.percentile(95)),
+                    "p99_ms": _ms(latency.percentile(99)),
+                    "max_ms": _ms(latency.max),
+                    "mean_tokens": round(tokens.mean, 1) if tokens.mean is not None else None,
+                }
+        return result
+
+    def records(self, since: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """读取账本文件中的记录（跳过损坏的行）"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or record.get("ts", 0) >= since:
+                    yield record
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def aggregate(records: Iterable[Dict[str, Any]], by: str = "mode") -> List[Dict[str, Any]]:
+    """
+    按字段汇总调用记录
+
+    Args:
+        records: 账本记录
+        by: 分组字段（mode / template / model / provider）
+
+    Returns:
+        每组的调用数、错误数、缓存命中数、重试数、token 数、费用和延迟百分位，按费用降序
+    """
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for record in records:
+        if record.get("kind", "llm") != "llm":
+            continue
+        key = record.get(by) or "-"
+        group = groups.setdefault(key, {
+            by: key, "calls": 0, "errors": 0, "cached": 0, "retries": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+            "_latency": Histogram()
+        })
+        group["calls"] += 1
+        group["errors"] += 1 if record.get("error") else 0
+        group["cached"] += 1 if record.get("cached") else 0
+        group["retries"] += record.get("retries") or 0
+        group["prompt_tokens"] += record.get("prompt_tokens") or 0
+        group["completion_tokens"] += record.get("completion_tokens") or 0
+        group["cost_usd"] += record.get("cost_usd") or 0.0
+        group["_latency"].record((record.get("latency_ms") or 0) * 1000)
+
+    rows = []
+    for group in groups.values():
+        latency = group.pop("_latency")
+        group["cost_usd"] = round(group["cost_usd"], 6)
+        for p in (50, 95, 99):
+            group[f"p{p}_ms"] = _ms(latency.percentile(p))
+        rows.append(group)
+    rows.sort(key=lambda row: (-row["cost_usd"], -row["calls"]))
+    return rows
+
+
+def hybrid_escalation(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """混合模式中采用 LLM 结果的比例"""
+    decisions = [r for r in records if r.get("kind") == "hybrid"]
+    escalated = sum(1 for r in decisions if r.get("source") == "llm")
+    return {
+        "decisions": len(decisions),
+        "escalated": escalated,
+        "rate": round(escalated / len(decisions), 4) if decisions else None,
+    }
+
+
+def _parse_since(value: Optional[str]) -> Optional[float]:
+    """"30m" / "24h" / "7d" -> 起始时间戳"""
+    if not value:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    unit = value[-1].lower()
+    if unit not in units:
+        raise ValueError(f"无效的时间范围: {value}")
+    return time.time() - float(value[:-1]) * units[unit]
+
+
+def main(argv: Optional[List[str]] = None):
+    """命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite LLM 用量统计")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stats = sub.add_parser("stats", help="按模式、提示词模板等汇总账本")
+    stats.add_argument("--ledger", help="账本文件路径（默认位于用户数据目录）")
+    stats.add_argument("--since", help="只统计最近一段时间，如 30m、24h、7d")
+    stats.add_argument("--by", nargs="+", default=["mode", "template"],
+                       choices=["mode", "template", "model", "provider"])
+    stats.add_argument("--json", action="store_true", help="输出 JSON")
+    args = parser.parse_args(argv)
+
+    ledger = UsageLedger(args.ledger, persist=False)
+    records = list(ledger.records(_parse_since(args.since)))
+    report = {by: aggregate(records, by) for by in args.by}
+    report["hybrid"] = hybrid_escalation(records)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"账本: {ledger.path}（{len(records)} 条记录）")
+    for by in args.by:
+        print(f"\n按 {by}:")
+        print(f"  {by:<24} {'调用':>6} {'错误':>5} {'缓存':>5} {'重试':>5} "
+              f"{'输入 tok':>9} {'输出 tok':>9} {'费用 $':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for row in report[by]:
+            print(f"  {str(row[by]):<24} {row['calls']:>6} {row['errors']:>5} {row['cached']:>5} "
+                  f"{row['retries']:>5} {row['prompt_tokens']:>9} {row['completion_tokens']:>9} "
+                  f"{row['cost_usd']:>10.4f} {row['p50_ms'] or 0:>8} {row['p95_ms'] or 0:>8} "
+                  f"{row['p99_ms'] or 0:>8}")
+    hybrid = report["hybrid"]
+    if hybrid["decisions"]:
+        print(f"\n混合模式: {hybrid['decisions']} 次判断，{hybrid['escalated']} 次采用 LLM"
+              f"（升级率 {hybrid['rate']:.1%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@
 工具函数
 """
 
+import os
 import re
+import sys
 from typing import Optional
 
 
@@ -63,6 +65,16 @@ def format_output(
     return "\n".join(output)
 
 
+def format_result(result: dict) -> str:
+    """按 format_output 格式化结构化结果（CitationAgent.analyze_structured 等的返回值）"""
+    return format_output(
+        needs_citation=result["needs_citation"],
+        reason=result["reason"],
+        citation_types=result["citation_types"],
+        keywords=result["keywords"]
+    )
+
+
 def parse_llm_response(response: str) -> dict:
     """
     解析 LLM 响应（如果使用结构化输出）
@@ -75,3 +87,25 @@ def parse_llm_response(response: str) -> dict:
         "citation_types": [],
         "keywords": []
     }
+
+
+def user_data_dir() -> str:
+    """
+    用户数据目录（缓存、账本等持久化文件存放位置）
+
+    Windows: %APPDATA%\\WhatShouldICite
+    macOS:   ~/Library/Application Support/WhatShouldICite
+    其他:    $XDG_DATA_HOME/whatshouldicite（默认 ~/.local/share/whatshouldicite）
+    """
+    override = os.environ.get("WHATSHOULDICITE_DATA_DIR")
+    if override:
+        path = override
+    elif sys.platform == "win32":
+        path = os.path.join(os.environ.get("APPDATA", os.path.expanduser("~")), "WhatShouldICite")
+    elif sys.platform == "darwin":
+        path = os.path.expanduser("~/Library/Application Support/WhatShouldICite")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        path = os.path.join(base, "whatshouldicite")
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,375 @@
+"""
+文档监视模式 - 手稿保存后只重新分析改动过的句子
+"""
+
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable, Iterable
+
+from .scanner import Sentence, iter_sentences, make_verdict
+from .utils import clean_text
+
+
+def sentence_key(text: str, namespace: str = "", cited: bool = False) -> str:
+    """
+    计算句子的归一化内容哈希
+
+    Args:
+        text: 句子文本（引用标记已被遮蔽）
+        namespace: 命名空间（如分析模式），不同命名空间的结果互不复用
+        cited: 原文中是否带有引用标记（遮蔽后文本相同，但判断结果不同）
+    """
+    normalized = clean_text(text).lower()
+    return hashlib.sha1(f"{namespace}\0{int(cited)}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class SentenceResultCache:
+    """句子哈希 -> 分析结果 的映射，可选持久化到 JSON 文件"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 持久化文件路径（None 则只保存在内存中）
+        """
+        self.path = path
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._results = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  读取结果缓存失败，将重新分析: {e}")
+                self._results = {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._results.get(key)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._results[key] = result
+
+    def retain(self, keys: Iterable[str]):
+        """只保留给定的键，丢弃文档中已删除句子的结果"""
+        keep = set(keys)
+        with self._lock:
+            self._results = {k: v for k, v in self._results.items() if k in keep}
+
+    def save(self):
+        """写回磁盘（原子替换）"""
+        if not self.path:
+            return
+        with self._lock:
+            data = dict(self._results)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
+class IncrementalScanner:
+    """增量扫描器：只分析内容哈希发生变化的句子"""
+
+    # 与句子位置相关、不应从缓存中复用的字段
+    POSITION_FIELDS = ("sentence", "line", "column", "end_line", "end_column")
+
+    def __init__(
+        self,
+        agent: Optional[Any] = None,
+        cache: Optional[SentenceResultCache] = None,
+        namespace: Optional[str] = None
+    ):
+        """
+        Args:
+            agent: CitationAgent 实例（默认使用规则判断）
+            cache: 结果缓存（默认仅内存）
+            namespace: 缓存命名空间（默认根据 agent 是否使用 LLM 区分）
+        """
+        if agent is None:
+            from .agent import CitationAgent
+            agent = CitationAgent()
+        self.agent = agent
+        self.cache = cache if cache is not None else SentenceResultCache()
+        if namespace is None:
+            namespace = "llm" if getattr(agent, "llm_client", None) else "rule"
+        self.namespace = namespace
+
+    def scan(self, source: Any, syntax: Optional[str] = None) -> Dict[str, Any]:
+        """
+        扫描文档，复用未改动句子的结果
+
+        Args:
+            source: 文件路径或文本流
+            syntax: "tex" / "md" / "text"（默认根据扩展名推断）
+
+        Returns:
+            {"verdicts": [...], "stats": {...}}，stats 中 analyzed 为本次实际分析的句子数
+        """
+        return self.scan_sentences(iter_sentences(source, syntax))
+
+    def scan_sentences(
+        self,
+        sentences: Iterable[Sentence],
+        cancel: Optional[threading.Event] = None
+    ) -> Dict[str, Any]:
+        """
+        分析已切分好的句子，复用未改动句子的结果
+
+        Args:
+            sentences: Sentence 序列
+            cancel: 设置后在下一句之前停止（结果不完整，stats 中 cancelled 为 True，
+                缓存中已删除句子的结果也不会被清理）
+
+        Returns:
+            同 scan
+        """
+        start = time.perf_counter()
+        verdicts: List[Dict[str, Any]] = []
+        keys = []
+        analyzed = 0
+        cancelled = False
+
+        for sentence in sentences:
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+                break
+            key = sentence_key(sentence.text, self.namespace, sentence.cited)
+            keys.append(key)
+            cached = self.cache.get(key)
+            if cached is not None:
+                verdict = dict(cached)
+                verdict["sentence"] = sentence.text
+                verdict["line"] = sentence.line
+                verdict["column"] = sentence.column
+                verdict["end_line"] = sentence.end_line
+                verdict["end_column"] = sentence.end_column
+                verdict["cached"] = True
+            else:
+                verdict = make_verdict(sentence, self.agent)
+                if "error" not in verdict:
+                    self.cache.put(key, {k: v for k, v in verdict.items()
+                                         if k not in self.POSITION_FIELDS})
+                verdict["cached"] = False
+                analyzed += 1
+            verdicts.append(verdict)
+
+        if not cancelled:
+            self.cache.retain(keys)
+            self.cache.save()
+        return {
+            "verdicts": verdicts,
+            "stats": {
+                "sentences": len(verdicts),
+                "analyzed": analyzed,
+                "reused": len(verdicts) - analyzed,
+                "elapsed": time.perf_counter() - start,
+                "cancelled": cancelled
+            }
+        }
+
+
+class _InotifyWatch:
+    """基于 Linux inotify 的目录监视（通过 ctypes 调用 libc）"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, path: str):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        # 监视所在目录：很多编辑器保存时先写临时文件再重命名
+        directory = os.path.dirname(os.path.abspath(path)) or "."
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self._fd, directory.encode(), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f"无法监视目录: {directory}")
+        self._name = os.path.basename(path).encode()
+
+    def wait(self, timeout: float) -> bool:
+        """等待目标文件的事件，返回是否发生了变化"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        header = self._EVENT_HEADER
+        while offset + header.size <= len(data):
+            _, _, _, length = header.unpack_from(data, offset)
+            name = data[offset + header.size:offset + header.size + length].rstrip(b"\0")
+            if name == self._name:
+                changed = True
+            offset += header.size + length
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingWatch:
+    """轮询文件修改时间（非 Linux 平台的后备方案）"""
+
+    def __init__(self, path: str, interval: float = 0.5):
+        self.path = path
+        self.interval = interval
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(min(timeout, self.interval))
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            return True
+        return False
+
+    def close(self):
+        pass
+
+
+class DocumentWatcher:
+    """
+    手稿监视器
+
+    文件保存后（去抖动）重新扫描，未改动的句子直接复用缓存结果，
+    重新分析的开销只与改动量成正比。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        on_update: Callable[[Dict[str, Any]], None],
+        agent: Optional[Any] = None,
+        cache_path: Optional[str] = None,
+        debounce: float = 0.5,
+        syntax: Optional[str] = None
+    ):
+        """
+        Args:
+            path: 手稿路径
+            on_update: 每次扫描完成后的回调，参数为 IncrementalScanner.scan 的返回值
+            agent: CitationAgent 实例（默认使用规则判断）
+            cache_path: 结果缓存文件路径（None 则只缓存在内存中）
+            debounce: 去抖动时间（秒），连续保存只触发一次扫描
+            syntax: "tex" / "md" / "text"（默认根据扩展名推断）
+        """
+        self.path = path
+        self.on_update = on_update
+        self.debounce = debounce
+        self.syntax = syntax
+        self.scanner = IncrementalScanner(agent, SentenceResultCache(cache_path))
+        self.running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _create_watch(self):
+        if sys.platform.startswith("linux"):
+            try:
+                return _InotifyWatch(self.path)
+            except (OSError, AttributeError) as e:
+                print(f"⚠️  inotify 不可用，改用轮询: {e}")
+        return _PollingWatch(self.path)
+
+    def rescan(self) -> Dict[str, Any]:
+        """立即重新扫描并触发回调"""
+        update = self.scanner.scan(self.path, self.syntax)
+        self.on_update(update)
+        return update
+
+    def start(self):
+        """启动监视（后台线程），先做一次完整扫描"""
+        if self.running:
+            return
+        self.running = True
+        # 先注册监视再做首次扫描，避免漏掉扫描期间的保存
+        watch = self._create_watch()
+        self.rescan()
+        self._thread = threading.Thread(target=self._run, args=(watch,), daemon=True)
+        self._thread.start()
+
+    def _run(self, watch):
+        try:
+            while self.running:
+                if not watch.wait(0.5):
+                    continue
+                # 去抖动：直到 debounce 时间内没有新的写入
+                while self.running and watch.wait(self.debounce):
+                    pass
+                if not self.running:
+                    break
+                try:
+                    self.rescan()
+                except OSError as e:
+                    # 保存过程中文件可能暂时不存在
+                    print(f"⚠️  重新扫描失败: {e}")
+        finally:
+            watch.close()
+
+    def stop(self):
+        """停止监视"""
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+
+def main():
+    """命令行入口：监视手稿，每次保存后输出可能缺少引用的句子"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WhatShouldICite 文档监视模式")
+    parser.add_argument("path", help="手稿路径（.tex / .md / 纯文本）")
+    parser.add_argument("--cache", help="结果缓存文件（默认只缓存在内存中）")
+    parser.add_argument("--debounce", type=float, default=0.5, help="去抖动时间（秒）")
+    args = parser.parse_args()
+
+    def on_update(update):
+        stats = update["stats"]
+        print(f"\n[{time.strftime('%H:%M:%S')}] {stats['sentences']} 句，"
+              f"重新分析 {stats['analyzed']} 句，复用 {stats['reused']} 句，"
+              f"耗时 {stats['elapsed'] * 1000:.1f} ms")
+        for verdict in update["verdicts"]:
+            if verdict["already_cited"] or verdict["needs_citation"] == "No":
+                continue
+            print(f"  {verdict['line']}:{verdict['column']}  [{verdict['needs_citation']}] "
+                  f"{verdict['sentence'][:80]}")
+
+    watcher = DocumentWatcher(args.path, on_update, cache_path=args.cache, debounce=args.debounce)
+    watcher.start()
+    print(f"👀 正在监视 {args.path}，按 Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()